@@ -0,0 +1,65 @@
+'''
+Compares two benchmark result files, typically from two revisions.
+
+    python -m benchmarks.compare base.json head.json [--threshold 1.1]
+
+Prints the ratio head / base of every metric, and exits with status 1 when
+a time or memory metric grew by more than the threshold.
+'''
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# The metrics compared, lower is better for all of them.
+METRICS = ('build_s', 'serialize_s', 'element_tree_s', 'export_s', 'peak_bytes', 'output_bytes')
+
+
+def compare(base: dict, head: dict, threshold=1.1) -> tuple:
+    """Compares two results documents. Returns the lines of the report and
+    the regressions, as (model, size, metric, ratio) tuples.
+    Arguments:
+        base: the reference results
+        head: the new results
+        threshold: the ratio above which a metric is a regression
+    """
+    reference = {(r['model'], r['size']): r for r in base['results']}
+    lines = [f"{'model':<16} {'size':>8} " + ' '.join(f'{m:>14}' for m in METRICS)]
+    regressions = []
+    for result in head['results']:
+        key = (result['model'], result['size'])
+        if key not in reference:
+            continue
+        cells = []
+        for metric in METRICS:
+            old, new = reference[key].get(metric), result.get(metric)
+            if not old or new is None:
+                cells.append(f"{'-':>14}")
+                continue
+            ratio = new / old
+            cells.append(f'{ratio:>14.2f}')
+            if ratio > threshold:
+                regressions.append(key + (metric, ratio))
+        lines.append(f'{key[0]:<16} {key[1]:>8} ' + ' '.join(cells))
+    return lines, regressions
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Compares two pysomo benchmark results.')
+    parser.add_argument('base', help='the reference results')
+    parser.add_argument('head', help='the new results')
+    parser.add_argument('--threshold', type=float, default=1.1, help='the ratio above which a metric regressed')
+    options = parser.parse_args(arguments)
+
+    base = json.loads(Path(options.base).read_text())
+    head = json.loads(Path(options.head).read_text())
+    lines, regressions = compare(base, head, options.threshold)
+    print(f"{base['revision'][:12]} -> {head['revision'][:12]}")
+    print('\n'.join(lines))
+    for model, size, metric, ratio in regressions:
+        print(f'regression: {model} {size} {metric} x{ratio:.2f}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+'''
+Synthetic models of a given size, for the benchmarks. Every builder takes
+the size n and returns a Root.
+'''
+from math import cos, pi, sin, sqrt
+
+import pysomo as somo
+
+
+def stairs(n):
+    """n steps and their stringers, like examples/stairs.py."""
+    width, riser, tread = 0.9, 0.19, 0.28
+    step = somo.Cuboid(width, riser, tread, center='false')
+    steps = step
+    for i in range(1, n):
+        steps += step.translate(0, riser * i, tread * i)
+
+    height = riser * n
+    depth = tread * n
+    stringers = somo.Polyhedron([
+        (width, 0, 0), (width, 0, tread), (width, height, depth), (width, height - riser, depth),
+        (0, 0, 0), (0, 0, tread), (0, height, depth), (0, height - riser, depth)])
+    return somo.Root(steps + stringers)
+
+
+def polyhedron(n):
+    """A polyhedron of n vertices spread over a sphere, without faces."""
+    golden = pi * (3 - sqrt(5))
+    vertices = []
+    for i in range(n):
+        z = 1 - 2 * (i + 0.5) / n
+        r = sqrt(1 - z * z)
+        vertices.append((r * cos(golden * i), r * sin(golden * i), z))
+    return somo.Root(somo.Polyhedron(vertices))
+
+
+def transform_chain(n):
+    """A cube going through n translations, rotations and scales."""
+    solid = somo.Cube(1)
+    for i in range(n):
+        if i % 3 == 0:
+            solid = solid.translate(0.1, 0, 0)
+        elif i % 3 == 1:
+            solid = solid.rotate(z=0.01)
+        else:
+            solid = solid.scale(1.001, 1, 1)
+    return somo.Root(solid)
+
+
+def wide_union(n):
+    """A union of n spheres on a square grid."""
+    side = max(int(sqrt(n)), 1)
+    spheres = (somo.Sphere(0.4).translate(i % side, i // side, 0) for i in range(n))
+    return somo.Root(somo.union_all(spheres))
+
+
+MODELS = {
+    'stairs': stairs,
+    'polyhedron': polyhedron,
+    'transform_chain': transform_chain,
+    'wide_union': wide_union,
+}
+
+# The sizes run by default, per model.
+SIZES = {
+    'stairs': (100, 1000, 10000),
+    'polyhedron': (1000, 10000, 100000),
+    'transform_chain': (100, 1000, 10000),
+    'wide_union': (100, 1000, 10000),
+}
@@ -0,0 +1,149 @@
+'''
+Runs the benchmarks and writes the results as JSON.
+
+    python -m benchmarks.run [--models stairs,wide_union] [--sizes 100,1000]
+                             [--repeat 3] [--no-export] [--output results.json]
+
+For every model and size, it measures the time to build the model, to
+stream it as xcsg with Root.write_xcsg, to build it with Root.to_xcsg and
+ET.tostring, and to export it with a stub xcsg executable, so the suite
+runs offline and only measures pysomo. Peak memory of build and
+serialization is measured with tracemalloc in a separate run, since tracing
+slows everything down. Times are the best of --repeat runs.
+
+Compare two result files with benchmarks.compare.
+'''
+import argparse
+import functools
+import io
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import pysomo as somo
+
+from .models import MODELS, SIZES
+
+STUB = [sys.executable, str(Path(__file__).resolve().with_name('xcsg_stub.py'))]
+
+
+def _best(function, repeat):
+    """The shortest time of repeat calls to function, and its last result."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _peak_memory(build):
+    """Peak traced memory, in bytes, to build a model and stream it."""
+    tracemalloc.start()
+    try:
+        root = build()
+        root.write_xcsg(io.BytesIO())
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _export(root, directory):
+    exporter = somo.Exporter(str(Path(directory) / 'model.obj'), executable=STUB)
+    exporter.export(root, 'obj')
+
+
+def measure(model, size, repeat=3, export=True) -> dict:
+    """Runs the benchmarks of one model at one size.
+    Arguments:
+        model: the name of the model, see benchmarks.models.MODELS
+        size: the size of the model
+        repeat: the number of runs timed
+        export: whether to time the export with the stub xcsg
+    """
+    build = functools.partial(MODELS[model], size)
+    build_time, root = _best(build, repeat)
+
+    def stream():
+        output = io.BytesIO()
+        root.write_xcsg(output)
+        return output
+
+    serialize_time, output = _best(stream, repeat)
+    element_tree_time, _ = _best(lambda: ET.tostring(root.to_xcsg(), encoding='utf8'), repeat)
+
+    result = {
+        'model': model,
+        'size': size,
+        'nodes': root.stats().nodes,
+        'build_s': build_time,
+        'serialize_s': serialize_time,
+        'element_tree_s': element_tree_time,
+        'output_bytes': len(output.getvalue()),
+        'peak_bytes': _peak_memory(build),
+    }
+    if export:
+        with tempfile.TemporaryDirectory() as directory:
+            result['export_s'], _ = _best(lambda: _export(root, directory), repeat)
+    return result
+
+
+def _revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=Path(__file__).parent,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout.decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(models=None, sizes=None, repeat=3, export=True) -> dict:
+    """Runs the benchmarks and returns the results document.
+    Arguments:
+        models: the names of the models, all of them by default
+        sizes: the sizes of every model, see benchmarks.models.SIZES by
+            default
+        repeat: the number of runs timed
+        export: whether to time the export with the stub xcsg
+    """
+    results = []
+    for model in models or MODELS:
+        for size in sizes or SIZES[model]:
+            results.append(measure(model, size, repeat, export))
+    return {
+        'revision': _revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Runs the pysomo benchmarks.')
+    parser.add_argument('--models', help='comma-separated model names, all by default')
+    parser.add_argument('--sizes', help='comma-separated sizes, instead of the default ones')
+    parser.add_argument('--repeat', type=int, default=3, help='runs timed, the best one is kept')
+    parser.add_argument('--no-export', action='store_true', help='skip the export with the stub xcsg')
+    parser.add_argument('--output', help='the JSON file to write, standard output by default')
+    options = parser.parse_args(arguments)
+
+    models = options.models.split(',') if options.models else None
+    sizes = [int(s) for s in options.sizes.split(',')] if options.sizes else None
+    document = run(models, sizes, options.repeat, not options.no_export)
+
+    text = json.dumps(document, indent=2)
+    if options.output:
+        Path(options.output).write_text(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
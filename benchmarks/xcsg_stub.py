@@ -0,0 +1,72 @@
+"""A stand-in for the xcsg application, used by the benchmarks and the tests
+of the exporter to run offline.
+
+It accepts the same command line as xcsg and writes, next to the input file,
+a tetrahedron in every requested format. Documents with a <fail> element
+fail, and documents with a <sleep> element hang for 30 seconds. Every
+invocation is appended to the file named by the XCSG_STUB_LOG environment
+variable, when it is set.
+"""
+import hashlib
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+
+VERTICES = [(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1)]
+FACES = [(0, 2, 1), (0, 1, 3), (1, 2, 3), (0, 3, 2)]
+
+
+def obj(digest):
+    lines = [f'# {digest}']
+    lines += [f'v {x} {y} {z}' for x, y, z in VERTICES]
+    lines += ['f ' + ' '.join(str(i + 1) for i in f) for f in FACES]
+    return ('\n'.join(lines) + '\n').encode('ascii')
+
+
+def stl(digest):
+    header = digest.encode('ascii')[:80].ljust(80, b' ')
+    records = b''.join(
+        struct.pack('<12fH', 0, 0, 0, *(c for i in f for c in VERTICES[i]), 0)
+        for f in FACES)
+    return header + struct.pack('<I', len(FACES)) + records
+
+
+def main(args):
+    if '--version' in args:
+        print('xcsg stub 1.0')
+        return 0
+
+    source = Path(args[-1])
+    document = source.read_bytes()
+    digest = hashlib.sha256(document).hexdigest()
+
+    log = os.environ.get('XCSG_STUB_LOG')
+    if log:
+        with open(log, 'a') as o:
+            o.write(' '.join(args) + '\n')
+
+    if b'<sleep' in document:
+        time.sleep(30)
+
+    if b'<fail' in document:
+        print('stub: failing on request', file=sys.stderr)
+        return 1
+
+    for flag in args[:-1]:
+        file_type = flag.lstrip('-')
+        if file_type == 'obj':
+            content = obj(digest)
+        elif file_type == 'stl':
+            content = stl(digest)
+        else:
+            content = f'{file_type} {digest}\n'.encode('ascii')
+        source.with_suffix(f'.{file_type}').write_bytes(content)
+
+    print(f'xcsg stub: {source.name}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
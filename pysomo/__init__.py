@@ -1,3 +1,5 @@
 from .tree import Root
 from .figures import Circle, Square, Rectangle, Polygon, Cone, Sphere, Cube, Cuboid, Cylinder, Polyhedron
+from .figures import union, union_all, intersection, intersection_all
 from .export import Exporter
+from .reader import load_xcsg, load_binary
@@ -0,0 +1,131 @@
+from array import array
+from collections import namedtuple
+
+from .buffers import FaceArray
+from .figures import Pattern, Polygon, Polyhedron, rewrite
+
+try:
+    import numpy
+except ImportError:  # numpy is optional
+    numpy = None
+
+
+BakeReport = namedtuple('BakeReport', ['baked', 'vertices', 'skipped'])
+BakeReport.__doc__ = '''
+The result of Root.bake_transforms().
+    baked: the number of polyhedra and polygons whose transform was applied
+        to their vertices
+    vertices: the number of vertices transformed
+    skipped: the number of transformed polyhedra and polygons left as they
+        were: projective transforms, polygon transforms that leave the XY
+        plane and solids marked for the mesh cache, whose placements share
+        one mesh
+'''
+
+
+class _Baker(object):
+    def __init__(self):
+        self.baked = 0
+        self.vertices = 0
+        self.skipped = 0
+
+    def replace(self, figure):
+        """The figure with its transform baked, for rewrite()."""
+        if isinstance(figure, Pattern):
+            # The instances share the base, their matrices stay.
+            return figure
+        if not isinstance(figure, (Polyhedron, Polygon)) or figure.matrix is None:
+            return None
+
+        m = figure.matrix
+        affine = m[12] == 0 and m[13] == 0 and m[14] == 0 and m[15] == 1
+        if isinstance(figure, Polyhedron):
+            bakeable = affine and not figure.cacheable
+        else:
+            # The polygon must stay in the XY plane, with its own z axis.
+            bakeable = affine and m[2] == m[6] == m[8] == m[9] == m[11] == 0 and m[10] == 1
+        if not bakeable:
+            self.skipped += 1
+            return figure
+
+        vertices = figure.children[0].vertices
+        self.baked += 1
+        self.vertices += len(vertices)
+        if isinstance(figure, Polygon):
+            data = _transform_2d(vertices.data, m)
+            if m[0] * m[5] - m[1] * m[4] < 0:
+                # Mirrored, keep the vertices counterclockwise.
+                data = _reversed(data, 2)
+            return Polygon(data)
+
+        data = _transform_3d(vertices.data, m)
+        if len(figure.children) < 2:
+            return Polyhedron(data)
+        faces = figure.children[1].faces
+        if _determinant(m) < 0:
+            # Mirrored, keep the faces pointing outwards.
+            faces = _reversed_faces(faces)
+        return Polyhedron(data, faces)
+
+
+def bake_transforms(figures) -> tuple:
+    """Applies the transform of every polyhedron and polygon to its
+    vertices. Returns the new figures and the BakeReport."""
+    baker = _Baker()
+    figures = [rewrite(f, baker.replace) for f in figures]
+    return figures, BakeReport(baker.baked, baker.vertices, baker.skipped)
+
+
+def _transform_3d(data, m):
+    if numpy is not None:
+        matrix = numpy.asarray(m, dtype=float).reshape(4, 4)
+        points = numpy.asarray(data, dtype=float).reshape(-1, 3)
+        return (points @ matrix[:3, :3].T + matrix[:3, 3]).reshape(-1)
+    m0, m1, m2, m3, m4, m5, m6, m7, m8, m9, m10, m11 = m[:12]
+    result = array('d', bytes(8 * len(data)))
+    for i in range(0, len(data), 3):
+        x, y, z = data[i], data[i + 1], data[i + 2]
+        result[i] = m0 * x + m1 * y + m2 * z + m3
+        result[i + 1] = m4 * x + m5 * y + m6 * z + m7
+        result[i + 2] = m8 * x + m9 * y + m10 * z + m11
+    return result
+
+
+def _transform_2d(data, m):
+    if numpy is not None:
+        matrix = numpy.asarray(m, dtype=float).reshape(4, 4)
+        points = numpy.asarray(data, dtype=float).reshape(-1, 2)
+        return (points @ matrix[:2, :2].T + matrix[:2, 3]).reshape(-1)
+    m0, m1, m3, m4, m5, m7 = m[0], m[1], m[3], m[4], m[5], m[7]
+    result = array('d', bytes(8 * len(data)))
+    for i in range(0, len(data), 2):
+        x, y = data[i], data[i + 1]
+        result[i] = m0 * x + m1 * y + m3
+        result[i + 1] = m4 * x + m5 * y + m7
+    return result
+
+
+def _reversed(data, dimension):
+    """The vertices of a flat buffer in reverse order."""
+    if numpy is not None:
+        return numpy.asarray(data, dtype=float).reshape(-1, dimension)[::-1].reshape(-1)
+    result = array('d')
+    for i in range(len(data) - dimension, -1, -dimension):
+        result.extend(data[i:i + dimension])
+    return result
+
+
+def _reversed_faces(faces: FaceArray) -> FaceArray:
+    """The faces with their vertices in reverse order."""
+    if faces.offsets is None:
+        if numpy is not None:
+            indices = numpy.asarray(faces.indices, dtype=numpy.int64).reshape(-1, faces.arity)[:, ::-1]
+            return FaceArray(indices.reshape(-1), arity=faces.arity)
+        return FaceArray([f[::-1] for f in faces])
+    return FaceArray(array('q', (i for f in faces for i in reversed(f))), faces.offsets)
+
+
+def _determinant(m) -> float:
+    return (m[0] * (m[5] * m[10] - m[6] * m[9])
+            - m[1] * (m[4] * m[10] - m[6] * m[8])
+            + m[2] * (m[4] * m[9] - m[5] * m[8]))
@@ -0,0 +1,139 @@
+from collections import namedtuple
+from math import inf
+
+
+class BoundingBox(namedtuple('BoundingBox', ['min', 'max'])):
+    '''
+    An axis-aligned box, from its min corner to its max corner. Boxes are
+    conservative: the figure they bound fits inside, but may be smaller.
+    The empty box, BoundingBox.EMPTY, bounds figures with no volume at all.
+    '''
+    __slots__ = ()
+
+    @property
+    def empty(self) -> bool:
+        return any(lo > hi for lo, hi in zip(self.min, self.max))
+
+    @property
+    def size(self) -> tuple:
+        return tuple(hi - lo for lo, hi in zip(self.min, self.max))
+
+    def union(self, other: 'BoundingBox') -> 'BoundingBox':
+        if self.empty:
+            return other
+        if other.empty:
+            return self
+        return BoundingBox(
+            tuple(map(min, self.min, other.min)),
+            tuple(map(max, self.max, other.max)))
+
+    def intersection(self, other: 'BoundingBox') -> 'BoundingBox':
+        box = BoundingBox(
+            tuple(map(max, self.min, other.min)),
+            tuple(map(min, self.max, other.max)))
+        return BoundingBox.EMPTY if box.empty else box
+
+    def overlaps(self, other: 'BoundingBox') -> bool:
+        """Whether the interiors of the boxes overlap. Boxes that only touch
+        do not overlap, except along an axis where a box is flat, such as z
+        for the boxes of shapes, which have no interior along it."""
+        return all(
+            (lo < other_hi and other_lo < hi)
+            or ((lo == hi or other_lo == other_hi) and lo <= other_hi and other_lo <= hi)
+            for lo, hi, other_lo, other_hi in zip(self.min, self.max, other.min, other.max))
+
+    def intersects(self, other: 'BoundingBox') -> bool:
+        """Whether the boxes overlap or touch."""
+        return all(
+            lo <= other_hi and other_lo <= hi
+            for lo, hi, other_lo, other_hi in zip(self.min, self.max, other.min, other.max))
+
+    def expanded(self, dx, dy=None, dz=None) -> 'BoundingBox':
+        if self.empty:
+            return self
+        delta = (dx, dx if dy is None else dy, dx if dz is None else dz)
+        return BoundingBox(
+            tuple(lo - d for lo, d in zip(self.min, delta)),
+            tuple(hi + d for hi, d in zip(self.max, delta)))
+
+    def minkowski(self, other: 'BoundingBox') -> 'BoundingBox':
+        if self.empty or other.empty:
+            return BoundingBox.EMPTY
+        return BoundingBox(
+            tuple(map(sum, zip(self.min, other.min))),
+            tuple(map(sum, zip(self.max, other.max))))
+
+    def transformed(self, matrix) -> 'BoundingBox':
+        """Bounds the box transformed by a 4x4 matrix stored row by row.
+        Returns None for projective matrices."""
+        if self.empty:
+            return self
+        if matrix[12] or matrix[13] or matrix[14] or not matrix[15]:
+            return None
+
+        lo = []
+        hi = []
+        for r in range(0, 12, 4):
+            low = high = matrix[r + 3]
+            for c in range(3):
+                a = matrix[r + c] * self.min[c]
+                b = matrix[r + c] * self.max[c]
+                low += min(a, b)
+                high += max(a, b)
+            lo.append(low)
+            hi.append(high)
+
+        w = matrix[15]
+        if w == 1:
+            return BoundingBox(tuple(lo), tuple(hi))
+        lo, hi = [v / w for v in lo], [v / w for v in hi]
+        return BoundingBox(tuple(map(min, lo, hi)), tuple(map(max, lo, hi)))
+
+    @staticmethod
+    def of_points(coordinates, dimension) -> 'BoundingBox':
+        """Bounds points stored in a flat buffer of x, y[, z] values."""
+        if not len(coordinates):
+            return BoundingBox.EMPTY
+        axes = [coordinates[i::dimension] for i in range(dimension)]
+        if hasattr(coordinates, 'min'):
+            # A numpy array, reduce it without iterating in Python.
+            lo = [float(a.min()) for a in axes]
+            hi = [float(a.max()) for a in axes]
+        else:
+            lo = [float(min(a)) for a in axes]
+            hi = [float(max(a)) for a in axes]
+        lo += [0.0] * (3 - dimension)
+        hi += [0.0] * (3 - dimension)
+        return BoundingBox(tuple(lo), tuple(hi))
+
+    @staticmethod
+    def centered(dx, dy, dz, center) -> 'BoundingBox':
+        """Bounds a box of size dx, dy, dz centered on the origin, or with
+        its min corner on the origin."""
+        if center:
+            return BoundingBox((-dx / 2, -dy / 2, -dz / 2), (dx / 2, dy / 2, dz / 2))
+        return BoundingBox((0, 0, 0), (dx, dy, dz))
+
+
+BoundingBox.EMPTY = BoundingBox((inf, inf, inf), (-inf, -inf, -inf))
+
+
+def disjoint(boxes, touching=True) -> bool:
+    """Whether no two of the boxes overlap, with a sweep along the x axis.
+    Arguments:
+        boxes: the boxes
+        touching: whether boxes that only touch count as disjoint
+    """
+    boxes = sorted((b for b in boxes if not b.empty), key=lambda b: b.min[0])
+    active = []
+    for box in boxes:
+        if touching:
+            active = [a for a in active if a.max[0] > box.min[0]]
+            if any(a.overlaps(box) for a in active):
+                return False
+        else:
+            active = [a for a in active if a.max[0] >= box.min[0]]
+            if any(a.intersects(box) for a in active):
+                return False
+        active.append(box)
+    return True
@@ -0,0 +1,344 @@
+from array import array
+from decimal import Decimal
+from hashlib import blake2b
+
+try:
+    import numpy
+except ImportError:  # numpy is optional
+    numpy = None
+
+
+# Number of items formatted per chunk when serializing buffers in bulk.
+CHUNK = 4096
+
+
+def format_number(value) -> str:
+    """Formats a float the shortest way that reads back to the same value,
+    dropping the redundant '.0' of integral values."""
+    text = repr(float(value))
+    return text[:-2] if text.endswith('.0') else text
+
+
+class NumberFormat(object):
+    '''
+    How floats are written in xcsg. By default they are written the
+    shortest way that reads back to the same value, without the redundant
+    '.0' of integral values. A precision keeps that many significant
+    digits, and a grid snaps every value to a multiple of a step such as
+    1e-6; both make documents smaller and faster to write and to parse.
+    NumberFormat.DEFAULT is the default format.
+    '''
+
+    def __init__(self, precision=None, grid=None):
+        """
+        Arguments:
+            precision: the number of significant digits written
+            grid: the step that values are rounded to a multiple of
+        """
+        if precision is not None and precision < 1:
+            raise ValueError('The precision must be at least 1 digit.')
+        if grid is not None and not grid > 0:
+            raise ValueError('The grid step must be positive.')
+        self.precision = precision
+        self.grid = grid
+        self._spec = None if precision is None else f'%.{precision}g'
+        # Snapped values are rounded to the decimals of the step, to drop
+        # the binary noise of the multiplication, as in 3 * 0.1.
+        self._decimals = None if grid is None else max(0, -Decimal(repr(float(grid))).as_tuple().exponent)
+
+    def snap(self, values) -> list:
+        """Rounds values to the grid. Returns a list of floats."""
+        grid, decimals = self.grid, self._decimals
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            return numpy.round(numpy.round(values / grid) * grid, decimals).tolist()
+        return [round(round(v / grid) * grid, decimals) for v in values]
+
+    def format(self, value) -> str:
+        return self.format_values((value,))[0]
+
+    # Attributes that are not geometry, such as tolerances, which are not
+    # rounded: a grid coarser than a tolerance would write it as 0.
+    EXACT = frozenset(('secant_tolerance',))
+    # Attributes that are not lengths, such as angles, which keep the
+    # precision but are not snapped to the grid.
+    UNSNAPPED = frozenset(('angle',))
+
+    def attribute(self, value, name=None) -> str:
+        """Formats an attribute value: floats with this format, unless the
+        attribute is one of EXACT or UNSNAPPED, anything else with str()."""
+        if not isinstance(value, float):
+            return str(value)
+        if name in self.EXACT:
+            return format_number(value)
+        if name in self.UNSNAPPED:
+            return self._format([value])[0]
+        return self.format(value)
+
+    def format_values(self, values) -> list:
+        """Formats a sequence or a flat buffer of floats."""
+        if self.grid is not None:
+            values = self.snap(values)
+        return self._format(values)
+
+    def format_matrix(self, values) -> list:
+        """Formats 4x4 matrices stored row by row, one or several in a flat
+        buffer. Only their translation is snapped to the grid: rotations
+        and scales are not lengths, and snapping them would change the
+        geometry."""
+        if self.grid is not None:
+            values = values.tolist() if hasattr(values, 'tolist') else list(values)
+            for i in (3, 7, 11):
+                values[i::16] = self.snap(values[i::16])
+        return self._format(values)
+
+    def _format(self, values) -> list:
+        """Formats values with the precision, without the grid."""
+        if not isinstance(values, (list, tuple)):
+            values = values.tolist()
+        if self._spec is not None:
+            spec = self._spec
+            return [spec % v for v in values]
+        return [format_number(v) for v in values]
+
+    def fill(self, template: str, values) -> str:
+        """Formats a chunk of values into as many copies of template as
+        needed, all at once.
+        Arguments:
+            template: the text for a group of values, with one %s per value
+            values: a flat buffer or a sequence of floats
+        """
+        count = len(values) // template.count('%s')
+        if self.grid is not None:
+            values = self.snap(values)
+        elif not isinstance(values, list):
+            values = values.tolist()
+        if self._spec is not None:
+            return template.replace('%s', self._spec) * count % tuple(values)
+        text = template * count % tuple(map(repr, values))
+        # Every value is followed by a quote, so this only drops the
+        # redundant '.0' of integral values, as format_number does.
+        return text.replace('.0"', '"')
+
+
+NumberFormat.DEFAULT = NumberFormat()
+
+
+def _flat_buffer(data, typecode):
+    """Returns data as a flat buffer of typecode items, without copying when
+    it already is one. Returns None if data is not a buffer."""
+    if isinstance(data, array):
+        return data if data.typecode == typecode else array(typecode, data)
+    if numpy is not None and isinstance(data, numpy.ndarray):
+        return numpy.ascontiguousarray(data, dtype=typecode).reshape(-1)
+    try:
+        view = memoryview(data)
+    except TypeError:
+        return None
+
+    if view.format == typecode and view.ndim == 1:
+        return view
+    flat = view.cast('B')
+    if view.format in ('B', 'b', 'c', typecode):
+        # Raw bytes (a file, an mmap, ...) or a multi-dimensional view.
+        return flat.cast(typecode)
+    return array(typecode, flat.cast(view.format).tolist())
+
+
+def _as_bytes(data):
+    """The raw bytes of a flat buffer, as a buffer."""
+    if isinstance(data, memoryview) and not data.c_contiguous:
+        return data.tobytes()
+    return memoryview(data).cast('B')
+
+
+def _flatten(items, size):
+    for item in items:
+        if len(item) != size:
+            raise ValueError(f'Expected {size} values, got {len(item)}: {item}')
+        yield from item
+
+
+class VertexArray(object):
+    '''
+    Compact storage for the vertices of a polygon or a polyhedron. The
+    coordinates are kept in a single flat float64 buffer: an array('d'), a
+    memoryview (over bytes, an mmap, ...) or a numpy array. Buffers of that
+    type are used as is, without copying.
+    '''
+
+    def __init__(self, vertices, dimension):
+        """
+        Arguments:
+            vertices: a sequence of coordinate tuples, a flat float64 buffer
+                or a numpy array of shape (N, dimension)
+            dimension: 2 for polygons, 3 for polyhedra
+        """
+        self.dimension = dimension
+        if isinstance(vertices, VertexArray):
+            vertices = vertices.data
+
+        data = _flat_buffer(vertices, 'd')
+        if data is None:
+            data = array('d', _flatten(vertices, dimension))
+        if len(data) % dimension:
+            raise ValueError(f'The vertex buffer does not hold {dimension}d vertices.')
+        self.data = data
+
+    def __len__(self):
+        return len(self.data) // self.dimension
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        i = index * self.dimension
+        return tuple(self.data[i:i + self.dimension].tolist())
+
+    def __iter__(self):
+        d = self.dimension
+        for i in range(0, len(self.data), CHUNK * d):
+            values = self.data[i:i + CHUNK * d].tolist()
+            yield from zip(*(values[j::d] for j in range(d)))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) * 8
+
+    def tolist(self) -> list:
+        return list(self)
+
+    def digest(self) -> bytes:
+        h = blake2b(b'vertices%d' % self.dimension, digest_size=16)
+        h.update(_as_bytes(self.data))
+        return h.digest()
+
+    def format_chunks(self, template: str, numbers=NumberFormat.DEFAULT):
+        """Yields the vertices formatted with template, a chunk at a time.
+        Arguments:
+            template: the text for one vertex, with one %s per coordinate
+            numbers: the NumberFormat of the coordinates
+        """
+        size = CHUNK * self.dimension
+        for i in range(0, len(self.data), size):
+            yield numbers.fill(template, self.data[i:i + size])
+
+
+class FaceArray(object):
+    '''
+    Compact storage for the faces of a polyhedron. The vertex indices of all
+    faces are kept in one flat int64 buffer. Faces of varying sizes are
+    delimited by an offsets buffer, where face i is
+    indices[offsets[i]:offsets[i + 1]]; faces that all have the same number
+    of vertices (triangles, quads) need no offsets.
+    '''
+
+    def __init__(self, faces, offsets=None, arity=3):
+        """
+        Arguments:
+            faces: a sequence of index sequences, a flat int64 buffer of
+                indices or a numpy array of shape (N, 3)
+            offsets: the start of every face in a flat faces buffer,
+                optionally followed by the total number of indices
+            arity: the number of vertices of every face in a flat faces
+                buffer without offsets
+        """
+        if isinstance(faces, FaceArray):
+            self.indices, self.offsets, self.arity = faces.indices, faces.offsets, faces.arity
+            return
+
+        self.offsets = None
+        self.arity = arity
+        indices = _flat_buffer(faces, 'q')
+
+        if offsets is not None:
+            if indices is None:
+                indices = array('q', faces)
+            buffer = _flat_buffer(offsets, 'q')
+            offsets = buffer if buffer is not None else array('q', offsets)
+            if len(offsets) == 0 or offsets[-1] != len(indices):
+                offsets = array('q', offsets) + array('q', [len(indices)])
+            self.offsets = offsets
+            self.arity = None
+        elif indices is not None:
+            if numpy is not None and isinstance(faces, numpy.ndarray) and faces.ndim == 2:
+                self.arity = faces.shape[1]
+        else:
+            faces = [tuple(f) for f in faces]
+            sizes = {len(f) for f in faces}
+            indices = array('q', (i for f in faces for i in f))
+            if len(sizes) > 1:
+                self.offsets = array('q', [0])
+                for f in faces:
+                    self.offsets.append(self.offsets[-1] + len(f))
+                self.arity = None
+            elif sizes:
+                self.arity = sizes.pop()
+
+        if self.arity is not None and len(indices) % self.arity:
+            raise ValueError(f'The face buffer does not hold faces of {self.arity} vertices.')
+        self.indices = indices
+
+    def __len__(self):
+        if self.arity is None:
+            return len(self.offsets) - 1
+        return len(self.indices) // self.arity
+
+    def __iter__(self):
+        if self.arity is None:
+            indices = self.indices.tolist()
+            offsets = self.offsets.tolist()
+            for start, end in zip(offsets, offsets[1:]):
+                yield tuple(indices[start:end])
+        else:
+            a = self.arity
+            for i in range(0, len(self.indices), CHUNK * a):
+                values = self.indices[i:i + CHUNK * a].tolist()
+                yield from zip(*(values[j::a] for j in range(a)))
+
+    @property
+    def nbytes(self) -> int:
+        size = len(self.indices) if self.offsets is None else len(self.indices) + len(self.offsets)
+        return size * 8
+
+    def digest(self) -> bytes:
+        h = blake2b(b'faces%d' % (self.arity or 0), digest_size=16)
+        h.update(_as_bytes(self.indices))
+        if self.offsets is not None:
+            h.update(b'offsets')
+            h.update(_as_bytes(self.offsets))
+        return h.digest()
+
+    def max_index(self) -> int:
+        """The largest vertex index, -1 without faces."""
+        if not len(self.indices):
+            return -1
+        if numpy is not None:
+            return int(numpy.asarray(self.indices).max())
+        return max(self.indices)
+
+    def min_index(self) -> int:
+        """The smallest vertex index, 0 without faces."""
+        if not len(self.indices):
+            return 0
+        if numpy is not None:
+            return int(numpy.asarray(self.indices).min())
+        return min(self.indices)
+
+    def format_chunks(self, fv_template: str):
+        """Yields the faces formatted as <face> elements, a chunk at a time.
+        Arguments:
+            fv_template: the text for one face vertex, with one %d
+        """
+        if self.arity is not None:
+            face = '<face>' + fv_template * self.arity + '</face>'
+            size = CHUNK * self.arity
+            for i in range(0, len(self.indices), size):
+                values = self.indices[i:i + size].tolist()
+                yield face * (len(values) // self.arity) % tuple(values)
+            return
+
+        faces = iter(self)
+        while True:
+            chunk = [f for _, f in zip(range(CHUNK), faces)]
+            if not chunk:
+                return
+            yield ''.join('<face>' + fv_template * len(f) % f + '</face>' for f in chunk)
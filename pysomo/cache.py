@@ -0,0 +1,221 @@
+import copy
+import hashlib
+import os
+import shutil
+import stat
+import threading
+from pathlib import Path
+
+from .export import xcsg_version
+from .figures import Polyhedron, rewrite
+from .meshio import read_obj
+from .tree import Root
+
+
+def default_cache_directory() -> Path:
+    """The cache directory from the PYSOMO_CACHE_DIR environment variable,
+    or ~/.cache/pysomo."""
+    directory = os.environ.get('PYSOMO_CACHE_DIR')
+    if directory:
+        return Path(directory)
+    return Path.home() / '.cache' / 'pysomo'
+
+
+class ExportCache(object):
+    '''
+    A content-addressed cache of exported meshes. Entries are keyed by the
+    hash of the xcsg document, the output format and the xcsg version, so a
+    model that has not changed since a previous export does not go through
+    xcsg again. The least recently used entries are evicted once the cache
+    grows past max_size bytes.
+    '''
+
+    def __init__(self, directory=None, max_size=1 << 30, link=True):
+        """
+        Arguments:
+            directory: where the meshes are stored, see
+                default_cache_directory()
+            max_size: the maximum total size of the cached meshes, in bytes
+            link: hardlink cached meshes into place instead of copying them,
+                when the file system allows it. The exported file then shares
+                its content with the cache, so it must be replaced rather
+                than modified in place.
+        """
+        self.directory = Path(directory) if directory else default_cache_directory()
+        self.max_size = max_size
+        self.link = link
+
+    @staticmethod
+    def key(document_hash: str, file_type: str, version: str) -> str:
+        """The cache key of an export.
+        Arguments:
+            document_hash: the hash of the serialized xcsg document
+            file_type: the output format
+            version: the version of the xcsg application
+        """
+        h = hashlib.sha256()
+        for part in (document_hash, file_type, version):
+            h.update(part.encode('utf8'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def entry(self, key: str, file_type: str) -> Path:
+        return self.directory / f'{key}.{file_type}'
+
+    def fetch(self, key: str, file_type: str, destination: Path) -> bool:
+        """Places the cached mesh at destination. Returns False on a miss."""
+        entry = self.entry(key, file_type)
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            return False
+
+        destination = Path(destination)
+        if destination.exists():
+            destination.unlink()
+        if self.link:
+            try:
+                os.link(entry, destination)
+                return True
+            except OSError:
+                pass
+        try:
+            shutil.copyfile(entry, destination)
+        except FileNotFoundError:
+            # Evicted by another process in the meantime.
+            return False
+        return True
+
+    def put(self, key: str, file_type: str, source: Path):
+        """Stores a copy of the mesh at source, then evicts old entries."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = self.entry(key, file_type)
+        temp = _temp_path(entry)
+        shutil.copyfile(source, temp)
+        os.replace(temp, entry)
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used meshes until the cache fits in
+        max_size bytes. Subdirectories, such as the default directory of the
+        MeshCache, are left alone."""
+        entries = []
+        total = 0
+        for e in self.directory.iterdir():
+            if e.suffix == '.tmp':
+                continue
+            try:
+                status = e.stat()
+            except FileNotFoundError:
+                continue
+            if not stat.S_ISREG(status.st_mode):
+                continue
+            entries.append((status.st_mtime, status.st_size, e))
+            total += status.st_size
+
+        entries.sort()
+        for _, size, e in entries:
+            if total <= self.max_size:
+                break
+            try:
+                e.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def read(self, key: str, file_type: str):
+        """Returns the cached mesh as bytes, or None on a miss."""
+        entry = self.entry(key, file_type)
+        try:
+            os.utime(entry)
+            return entry.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def write(self, key: str, file_type: str, data: bytes):
+        """Stores a mesh, then evicts old entries."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = self.entry(key, file_type)
+        temp = _temp_path(entry)
+        temp.write_bytes(data)
+        os.replace(temp, entry)
+        self.evict()
+
+    def clear(self):
+        if self.directory.exists():
+            for e in self.directory.iterdir():
+                if e.is_file():
+                    e.unlink()
+
+
+class MeshCache(ExportCache):
+    '''
+    A cache of the meshes of solids marked with Solid.cached(). When a model
+    is exported, every such solid is evaluated once by xcsg and stored under
+    its structural digest; it is then replaced by an equivalent Polyhedron,
+    so xcsg only pays for the rest of the model.
+
+    The mesh is stored without the solid's own transform, which is carried
+    over to the polyhedron, so every placement of a part shares one entry.
+    '''
+
+    def __init__(self, directory=None, max_size=1 << 30):
+        super().__init__(Path(directory) if directory else default_cache_directory() / 'meshes', max_size)
+        self._polyhedra = dict()
+
+    def splice(self, root, exporter):
+        """Returns a copy of root in which the cacheable solids are replaced
+        by their cached mesh, evaluating the ones that are not cached yet.
+        Arguments:
+            root: the model
+            exporter: the Exporter used to evaluate the solids
+        """
+        def replace(figure):
+            if not figure.cacheable:
+                return None
+            solid = figure._untransformed()
+            solid.cacheable = False
+            polyhedron = self.polyhedron(solid, exporter, root)
+            if figure.matrix is None:
+                return polyhedron
+            return polyhedron._transform(figure.matrix)
+
+        children = [rewrite(c, replace) for c in root.children]
+        if all(a is b for a, b in zip(children, root.children)):
+            return root
+        spliced = copy.copy(root)
+        spliced.children = children
+        return spliced
+
+    def polyhedron(self, solid, exporter, root=None):
+        """The mesh of solid as a Polyhedron.
+        Arguments:
+            solid: the solid, without its transform
+            exporter: the Exporter used to evaluate the solid
+            root: the model the solid is part of, whose number format and
+                secant tolerance the solid is evaluated with
+        """
+        model = Root(solid, secant_tolerance=root.secant_tolerance if root is not None else None)
+        if root is not None:
+            model.numbers = root.numbers
+        numbers = model.numbers
+        document_hash = f'{solid.digest.hex()}:{model.secant_tolerance}:{numbers.precision}:{numbers.grid}'
+        key = self.key(document_hash, 'obj', xcsg_version(exporter.command))
+        if key in self._polyhedra:
+            return self._polyhedra[key]
+
+        mesh = self.read(key, 'obj')
+        if mesh is None:
+            mesh = exporter.export_bytes(model, ['obj'])['obj']
+            self.write(key, 'obj', mesh)
+
+        polyhedron = Polyhedron(*read_obj(mesh))
+        self._polyhedra[key] = polyhedron
+        return polyhedron
+
+
+def _temp_path(entry: Path) -> Path:
+    """The temporary file an entry is written to before it is moved in
+    place. It is named after the process and the thread, so concurrent
+    writers of the same entry cannot tear it."""
+    return entry.with_name(f'{entry.name}.{os.getpid()}.{threading.get_ident()}.tmp')
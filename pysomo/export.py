@@ -1,35 +1,675 @@
+import asyncio
+import hashlib
+import io
+import mmap
+import os
+import shutil
 import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 
+from . import mesh
+from .bounds import disjoint
+
+
+class _HashingStream(object):
+    '''Forwards writes to a stream while hashing and counting them.'''
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.hash.update(data)
+        self.size += len(data)
+        return self.stream.write(data)
 
-class Exporter(object):
-    def __init__(self, path):
-        self.path = Path.cwd() / path
 
-    def export(self, root, file_type):
-        with open('temp.xcsg', 'w') as o:
-            o.write(root.dump_xcsg())
+# The secant tolerance of the resolution profiles, see Exporter.
+PROFILES = {
+    'preview': 0.1,
+    'final': 0.001,
+}
 
-        process = subprocess.Popen(
-            ['xcsg', f'--{file_type}', 'temp.xcsg'],
+
+@lru_cache(maxsize=None)
+def xcsg_version(command: tuple) -> str:
+    """Identifies the xcsg application run by command, from what it reports
+    for --version and from the size and date of its executable."""
+    try:
+        process = subprocess.run(
+            list(command) + ['--version'],
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE)
+            stderr=subprocess.STDOUT,
+            timeout=30)
+        output = process.stdout.decode('utf8', 'replace').strip()
+    except (OSError, subprocess.SubprocessError):
+        return 'unavailable'
+
+    executable = shutil.which(command[0])
+    if executable:
+        stat = Path(executable).stat()
+        output += f'\n{stat.st_size} {stat.st_mtime_ns}'
+    return output
+
+
+class Exporter(object):
+    def __init__(self, path=None, cache=None, executable='xcsg', mesh_cache=None, fast_path=False, callbacks=(),
+                 profiles=None):
+        """
+        Arguments:
+            path: the file to export to, relative to the working directory.
+                Only export_bytes() can be used without a path.
+            cache: an ExportCache to reuse the meshes of models that were
+                already exported
+            executable: the xcsg application, as a path or as a command line
+                prefix such as [python, script]
+            mesh_cache: a MeshCache to replace the solids marked with
+                Solid.cached() by their mesh
+            fast_path: mesh models that are unions of primitives that do
+                not touch each other in process, without xcsg, when numpy is
+                available. See pysomo.mesh.
+            callbacks: callables called with the ExportReport of every
+                export, including failed ones, to feed metrics elsewhere
+            profiles: the secant tolerance of every resolution profile that
+                the exports can pick, see PROFILES for the default ones
+        """
+        self.path = Path.cwd() / path if path is not None else None
+        self.cache = cache
+        self.executable = executable
+        self.mesh_cache = mesh_cache
+        self.fast_path = fast_path
+        self.callbacks = list(callbacks)
+        self.profiles = dict(PROFILES if profiles is None else profiles)
+        # The fingerprint and meshes of every part of the last assembly
+        # exported, by part name.
+        self._parts = dict()
+
+    @property
+    def command(self) -> tuple:
+        if isinstance(self.executable, (str, Path)):
+            return (str(self.executable),)
+        return tuple(str(e) for e in self.executable)
+
+    def export(self, root, file_type=None, formats=None, profile=None) -> 'ExportReport':
+        """Exports the model with xcsg.
+        Arguments:
+            root: the model
+            file_type: the output format, written to the exporter's path
+            formats: several output formats, all produced by a single xcsg
+                run and written to the exporter's path with the suffix of
+                each format
+            profile: the name of a resolution profile, such as 'preview' or
+                'final', whose secant tolerance replaces the one of the
+                model. Figures with their own tolerance keep it.
+
+        Returns the ExportReport of the export.
+        """
+        root = self._profiled(root, profile)
+        destinations = self._destinations(file_type, formats)
+        report = ExportReport(destinations)
+        with self._reporting(report):
+            if self._write_fast_mesh(root, destinations, report):
+                return report
+
+            # Every export works in its own temporary directory, next to the
+            # destination so that the result can be moved in place atomically.
+            with self._workdir(self.path.parent) as workdir:
+                source, keys = self._write_source(root, destinations, workdir, report)
+                missing = self._fetch(keys, destinations, report)
+                if missing:
+                    with report.phase('xcsg'):
+                        process = subprocess.Popen(
+                            self._arguments(missing, source),
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+                        stdout, stderr = process.communicate()
+                    report.finished(process.returncode, stdout, stderr)
+                    self._place(source, {f: destinations[f] for f in missing}, report)
+
+            self._store(keys, missing, destinations, report)
+        return report
+
+    def export_assembly(self, root, file_type=None, formats=None, workers=None, profile=None) -> 'ExportReport':
+        """Exports an assembly part by part, see Root.assembly(). Every part
+        is exported with its own xcsg run, in parallel, and its meshes are
+        kept under the fingerprint of the part. The next export of the
+        assembly only runs xcsg for the parts whose fingerprint changed, then
+        concatenates the meshes of all the parts. The meshes are not joined
+        by a CSG union, so the parts must not overlap.
+
+        Models that are not assemblies, assemblies whose parts overlap or
+        touch (or whose bounds are not known), formats the mesh backend does
+        not write (see pysomo.mesh.FORMATS) and a missing numpy fall back to
+        export().
+        Arguments:
+            root: the assembly
+            file_type, formats: the output formats, see export()
+            workers: the number of parts exported at the same time, the
+                number of processors by default
+            profile: the name of a resolution profile, see export()
+
+        Returns the ExportReport of the export, whose parts tell which parts
+        were exported, taken from the ExportCache or reused.
+        """
+        root = self._profiled(root, profile)
+        destinations = self._destinations(file_type, formats)
+        if root.parts is None or mesh.numpy is None or not all(f in mesh.FORMATS for f in destinations):
+            return self.export(root, file_type, formats)
+        boxes = [part.bounds for part in root.parts.values()]
+        if None in boxes or not disjoint(boxes, touching=False):
+            # Concatenated meshes of overlapping parts would intersect.
+            return self.export(root, file_type, formats)
+
+        report = ExportReport(destinations)
+        with self._reporting(report):
+            parts = root.part_roots()
+            with report.phase('fingerprint'):
+                version = xcsg_version(self.command)
+                fingerprints = {name: self._fingerprint(part, version) for name, part in parts.items()}
+            for name in set(self._parts) - set(parts):
+                del self._parts[name]
+
+            changed = []
+            for name, fingerprint in fingerprints.items():
+                known, meshes = self._parts.get(name, (None, {}))
+                if known == fingerprint and all(f in meshes for f in destinations):
+                    report.parts[name] = 'reused'
+                elif self._fetch_part(name, fingerprint, version, destinations, report):
+                    report.parts[name] = 'cached'
+                else:
+                    changed.append(name)
 
-        if self.path.exists():
-            self.path.unlink()
+            if changed:
+                self._export_parts({name: parts[name] for name in changed}, fingerprints, version,
+                                   list(destinations), workers, report)
+
+            with report.phase('merge'):
+                merged = {f: mesh.merge(self._parts[name][1][f] for name in parts) for f in destinations}
+            with report.phase('write'):
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                for f, p in destinations.items():
+                    _write_replacing(p, merged[f], f)
+                    report.output_bytes[f] = p.stat().st_size
+        return report
+
+    def _fingerprint(self, root, version) -> str:
+        """Identifies the meshes of a part: its structure, number format,
+        resolution and the xcsg application."""
+        h = hashlib.sha256(root.children[0].digest)
+        h.update(repr((root.numbers.precision, root.numbers.grid, root.secant_tolerance, version)).encode('utf8'))
+        return h.hexdigest()
+
+    def _fetch_part(self, name, fingerprint, version, formats, report) -> bool:
+        """Takes the meshes of a part from the ExportCache, if they are all
+        there."""
+        if self.cache is None:
+            return False
+        with report.phase('cache'):
+            meshes = dict()
+            for f in formats:
+                data = self.cache.read(self.cache.key(fingerprint, f, version), f)
+                if data is None:
+                    return False
+                meshes[f] = mesh.read(data, f)
+        self._parts[name] = (fingerprint, meshes)
+        return True
+
+    def _export_parts(self, parts, fingerprints, version, formats, workers, report):
+        """Exports parts in parallel and keeps their meshes. Raises the first
+        error once all the parts are done, keeping the meshes of the parts
+        that succeeded."""
+        def export_part(part):
+            part_report = ExportReport({f: None for f in formats})
+            return self._export_bytes(part, formats, False, part_report), part_report
+
+        with report.phase('parts'):
+            with ThreadPoolExecutor(max_workers=min(len(parts), workers or os.cpu_count() or 1)) as executor:
+                futures = {name: executor.submit(export_part, part) for name, part in parts.items()}
+
+        error = None
+        outcomes = []
+        for name, future in futures.items():
+            try:
+                data, part_report = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            outcomes.append(part_report)
+            meshes = {f: mesh.read(data[f], f) for f in formats}
+            self._parts[name] = (fingerprints[name], meshes)
+            report.parts[name] = 'exported'
+            if self.cache is not None:
+                with report.phase('cache'):
+                    for f in formats:
+                        self.cache.write(self.cache.key(fingerprints[name], f, version), f, data[f])
+
+        ran = [r for r in outcomes if r.returncode is not None]
+        if ran:
+            report.finished(
+                max(r.returncode for r in ran), b''.join(r.stdout for r in ran), b''.join(r.stderr for r in ran))
+        report.nodes = sum(r.nodes or 0 for r in outcomes)
+        report.document_bytes = sum(r.document_bytes or 0 for r in outcomes)
+        if error is not None:
+            raise error
+
+    async def export_async(self, root, file_type=None, formats=None, timeout=None, semaphore=None, profile=None):
+        """Exports without blocking the event loop, running xcsg as an
+        asyncio subprocess. If the export is cancelled or times out, the
+        xcsg process is killed.
+        Arguments:
+            root: the model
+            file_type, formats: the output formats, see export()
+            timeout: the maximum time in seconds to wait for xcsg, after
+                which asyncio.TimeoutError is raised
+            semaphore: an asyncio.Semaphore shared by exports to limit how
+                many xcsg processes run at the same time
+            profile: the name of a resolution profile, see export()
+
+        Returns the ExportReport of the export.
+        """
+        root = self._profiled(root, profile)
+        if semaphore is None:
+            return await self._export_async(root, file_type, formats, timeout)
+        async with semaphore:
+            return await self._export_async(root, file_type, formats, timeout)
+
+    async def _export_async(self, root, file_type, formats, timeout):
+        destinations = self._destinations(file_type, formats)
+        report = ExportReport(destinations)
+        loop = asyncio.get_running_loop()
+        with self._reporting(report):
+            # Meshing or serializing a large model takes a while, keep it
+            # off the loop.
+            if await loop.run_in_executor(None, self._write_fast_mesh, root, destinations, report):
+                return report
+
+            with self._workdir(self.path.parent) as workdir:
+                source, keys = await loop.run_in_executor(
+                    None, self._write_source, root, destinations, workdir, report)
+                missing = self._fetch(keys, destinations, report)
+                if missing:
+                    with report.phase('xcsg'):
+                        process = await asyncio.create_subprocess_exec(
+                            *self._arguments(missing, source),
+                            stdout=asyncio.subprocess.PIPE,
+                            stderr=asyncio.subprocess.PIPE)
+                        try:
+                            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+                        except BaseException:
+                            if process.returncode is None:
+                                process.kill()
+                                await asyncio.shield(process.wait())
+                            raise
+                    report.finished(process.returncode, stdout, stderr)
+                    self._place(source, {f: destinations[f] for f in missing}, report)
+
+            self._store(keys, missing, destinations, report)
+        return report
+
+    def export_bytes(self, root, formats, mmap=False, profile=None) -> dict:
+        """Evaluates the model with a single xcsg run and returns the meshes
+        instead of writing them next to the exporter's path.
+        Arguments:
+            root: the model
+            formats: the output formats
+            mmap: return read-only memory maps of the meshes instead of
+                reading them into bytes
+            profile: the name of a resolution profile, see export()
+
+        Returns a dictionary of the mesh of every format.
+        """
+        root = self._profiled(root, profile)
+        formats = list(formats)
+        report = ExportReport({f: None for f in formats})
+        with self._reporting(report):
+            return self._export_bytes(root, formats, mmap, report)
+
+    def _export_bytes(self, root, formats, mmap, report) -> dict:
+        fast = self._fast_mesh(root, formats, report)
+        if fast is not None:
+            meshes = dict()
+            with report.phase('write'):
+                for f in formats:
+                    stream = io.BytesIO()
+                    fast.write(stream, f)
+                    meshes[f] = stream.getvalue()
+                    report.output_bytes[f] = len(meshes[f])
+            return meshes
+
+        workdir = self._workdir(None)
+        try:
+            source, _ = self._write_source(root, {}, workdir.name, report)
+            with report.phase('xcsg'):
+                process = subprocess.Popen(
+                    self._arguments(formats, source),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE)
+                stdout, stderr = process.communicate()
+            report.finished(process.returncode, stdout, stderr)
+            outputs = {f: source.with_suffix(f'.{f}') for f in formats}
+            with report.phase('read'):
+                self._check(outputs, report)
+                meshes = {f: _read(p, mmap) for f, p in outputs.items()}
+            report.output_bytes = {f: len(m) for f, m in meshes.items()}
+            return meshes
+        finally:
+            # A memory map outlives its file on POSIX systems, but not on
+            # Windows, where the directory is then left for the system.
+            try:
+                workdir.cleanup()
+            except OSError:
+                pass
+
+    def export_obj(self, root):
+        self.export(root, 'obj')
 
-        p = Path.cwd() / f'temp.{file_type}'
-        stdout, stderr = process.communicate()
+    def _profiled(self, root, profile):
+        """The model with the secant tolerance of a resolution profile."""
+        if profile is None:
+            return root
+        if profile not in self.profiles:
+            raise ValueError(f'Unknown resolution profile {profile!r}, expected one of {sorted(self.profiles)}.')
+        return root.with_secant_tolerance(self.profiles[profile])
 
-        if not p.exists():
-            raise Exception(
+    @contextmanager
+    def _reporting(self, report):
+        """Records the error of a failed export in its report, then passes
+        the report to the callbacks."""
+        try:
+            yield report
+        except BaseException as e:
+            report.error = e
+            raise
+        finally:
+            for callback in self.callbacks:
+                callback(report)
+
+    def _fast_mesh(self, root, formats, report):
+        if not self.fast_path or not all(f in mesh.FORMATS for f in formats):
+            return None
+        with report.phase('fast_mesh'):
+            fast = mesh.fast_mesh(root)
+        report.fast_path = fast is not None
+        return fast
+
+    def _write_fast_mesh(self, root, destinations, report) -> bool:
+        fast = self._fast_mesh(root, destinations, report)
+        if fast is None:
+            return False
+        with report.phase('write'):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            for f, p in destinations.items():
+                _write_replacing(p, fast, f)
+                report.output_bytes[f] = p.stat().st_size
+        return True
+
+    def _destinations(self, file_type, formats) -> dict:
+        if self.path is None:
+            raise ValueError('The exporter has no path to export to.')
+        if (file_type is None) == (formats is None):
+            raise ValueError('Either a file type or formats must be given.')
+        if file_type is not None:
+            return {file_type: self.path}
+        return {f: self.path.with_suffix(f'.{f}') for f in formats}
+
+    def _workdir(self, directory):
+        if directory is not None:
+            directory.mkdir(parents=True, exist_ok=True)
+        return tempfile.TemporaryDirectory(prefix='.pysomo-', dir=directory)
+
+    def _write_source(self, root, destinations, workdir, report) -> tuple:
+        """Writes the xcsg document in workdir. Returns its path and, if
+        there is a cache, the cache key of every format."""
+        if self.mesh_cache is not None:
+            with report.phase('mesh_cache'):
+                root = self.mesh_cache.splice(root, self)
+
+        source = Path(workdir) / 'model.xcsg'
+        with report.phase('serialize'):
+            with open(source, 'wb') as o:
+                stream = _HashingStream(o)
+                report.nodes = root.write_xcsg(stream)
+        report.document_bytes = stream.size
+
+        keys = dict()
+        if self.cache is not None:
+            with report.phase('cache'):
+                document_hash = stream.hash.hexdigest()
+                version = xcsg_version(self.command)
+                keys = {f: self.cache.key(document_hash, f, version) for f in destinations}
+        return source, keys
+
+    def _fetch(self, keys, destinations, report) -> list:
+        """Places the cached meshes. Returns the formats that were not
+        cached."""
+        if not keys:
+            return list(destinations)
+        with report.phase('cache'):
+            missing = [f for f, p in destinations.items()
+                       if f not in keys or not self.cache.fetch(keys[f], f, p)]
+        for f, p in destinations.items():
+            if f not in missing:
+                report.cached.append(f)
+                report.output_bytes[f] = p.stat().st_size
+        return missing
+
+    def _store(self, keys, formats, destinations, report):
+        if any(f in keys for f in formats):
+            with report.phase('cache'):
+                for f in formats:
+                    if f in keys:
+                        self.cache.put(keys[f], f, destinations[f])
+
+    def _arguments(self, formats, source) -> list:
+        return list(self.command) + [f'--{f}' for f in formats] + [str(source)]
+
+    @staticmethod
+    def _check(outputs, report):
+        if not all(p.exists() for p in outputs.values()):
+            raise ExportError(
                 'The exported file was not generated.',
                 {
-                    'stdout': stdout,
-                    'stderr': stderr
+                    'stdout': report.stdout,
+                    'stderr': report.stderr,
+                    'returncode': report.returncode
                 })
 
-        p.rename(self.path)
+    def _place(self, source, destinations, report):
+        outputs = {f: source.with_suffix(f'.{f}') for f in destinations}
+        with report.phase('place'):
+            self._check(outputs, report)
+            for f, p in outputs.items():
+                report.output_bytes[f] = p.stat().st_size
+                os.replace(p, destinations[f])
 
-    def export_obj(self, root):
-        self.export(root, 'obj')
+    @staticmethod
+    def export_many(jobs, workers=None, cache=None, executable='xcsg', executor=None, mesh_cache=None,
+                    profile=None, fast_path=False, callbacks=(), profiles=None) -> list:
+        """Exports several models at the same time, each in its own temporary
+        directory, with the xcsg processes running in parallel.
+        Arguments:
+            jobs: (root, path, file_type) tuples
+            workers: the number of exports to run at the same time, the
+                number of processors by default
+            cache: an ExportCache shared by the jobs
+            executable: the xcsg application, see Exporter
+            executor: a concurrent.futures executor to run the jobs on
+                instead of a thread pool, such as a ProcessPoolExecutor for
+                models that can be pickled
+            mesh_cache: a MeshCache shared by the jobs
+            profile: the name of a resolution profile for all the jobs, see
+                Exporter.export()
+            fast_path, profiles: see Exporter
+            callbacks: callables called with the ExportReport of every job,
+                including failed ones, in the order of the jobs. They run in
+                this process, whatever the executor.
+
+        Returns the ExportResult of every job, in the order of the jobs.
+        Failed jobs do not stop the others; their error is in their result.
+        """
+        jobs = list(jobs)
+        owned = executor is None
+        if owned:
+            executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+
+        try:
+            futures = [
+                executor.submit(
+                    _export_job, Exporter(path, cache, executable, mesh_cache, fast_path, profiles=profiles),
+                    root, file_type, profile)
+                for root, path, file_type in jobs]
+            results = []
+            for (root, path, file_type), future in zip(jobs, futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = ExportResult(Path.cwd() / path, file_type, e)
+                results.append(result)
+                if result.report is not None:
+                    for callback in callbacks:
+                        callback(result.report)
+            return results
+        finally:
+            if owned:
+                executor.shutdown()
+
+
+class ExportError(Exception):
+    pass
+
+
+class ExportReport(object):
+    '''
+    What an export did and where its time went, returned by
+    Exporter.export() and passed to the callbacks of the exporter.
+
+    phases maps each phase to its duration in seconds: mesh_cache (splicing
+    cached solids), serialize (writing the xcsg document), cache (looking
+    up and storing meshes in the ExportCache), xcsg (the subprocess), place
+    (checking and moving the meshes in place), fast_mesh and write for the
+    in-process mesh backend, and read for export_bytes().
+    Exporter.export_assembly() adds fingerprint (hashing the parts), parts
+    (exporting the changed parts) and merge (concatenating their meshes).
+    '''
+
+    def __init__(self, destinations):
+        self.formats = list(destinations)
+        self.paths = dict(destinations)
+        self.phases = dict()
+        # The figures in the document, counting every reuse of a subtree.
+        self.nodes = None
+        self.document_bytes = None
+        self.output_bytes = dict()
+        # The formats taken from the ExportCache instead of xcsg.
+        self.cached = []
+        self.fast_path = False
+        # What export_assembly() did for every part: 'exported', 'cached' or
+        # 'reused'.
+        self.parts = dict()
+        self.returncode = None
+        self.stdout = b''
+        self.stderr = b''
+        self.error = None
+
+    @contextmanager
+    def phase(self, name):
+        """Adds the time spent in the block to the phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+
+    def finished(self, returncode, stdout, stderr):
+        """Records the outcome of the xcsg process."""
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def duration(self) -> float:
+        return sum(self.phases.values())
+
+    def as_dict(self) -> dict:
+        """The report as plain values, for a metrics system or JSON."""
+        return {
+            'formats': self.formats,
+            'paths': {f: str(p) if p is not None else None for f, p in self.paths.items()},
+            'phases': dict(self.phases),
+            'duration': self.duration,
+            'nodes': self.nodes,
+            'document_bytes': self.document_bytes,
+            'output_bytes': dict(self.output_bytes),
+            'cached': list(self.cached),
+            'fast_path': self.fast_path,
+            'parts': dict(self.parts),
+            'returncode': self.returncode,
+            'stdout': self.stdout.decode('utf8', 'replace'),
+            'stderr': self.stderr.decode('utf8', 'replace'),
+            'error': repr(self.error) if self.error is not None else None,
+        }
+
+    def __repr__(self):
+        phases = ', '.join(f'{p}={d:.3f}s' for p, d in self.phases.items())
+        status = 'ok' if self.ok else repr(self.error)
+        return f'ExportReport({self.formats!r}, {phases}, {status})'
+
+
+class ExportResult(object):
+    '''
+    The outcome of one export of Exporter.export_many().
+    '''
+
+    def __init__(self, path: Path, file_type: str, error: Exception = None, report: ExportReport = None):
+        self.path = path
+        self.file_type = file_type
+        self.error = error
+        self.report = report
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        status = 'ok' if self.ok else repr(self.error)
+        return f'ExportResult({str(self.path)!r}, {self.file_type!r}, {status})'
+
+
+def _export_job(exporter, root, file_type, profile=None) -> ExportResult:
+    """Runs a job of export_many(). A failed export keeps its report, with
+    the timings of the phases that ran."""
+    reports = []
+    exporter.callbacks.append(reports.append)
+    try:
+        exporter.export(root, file_type, profile=profile)
+    except Exception as e:
+        return ExportResult(exporter.path, file_type, e, reports[-1] if reports else None)
+    return ExportResult(exporter.path, file_type, report=reports[-1])
+
+
+def _read(path, memory_map):
+    with open(path, 'rb') as f:
+        if memory_map and path.stat().st_size:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return f.read()
+
+
+def _write_replacing(path, mesh_, file_type):
+    """Writes a mesh to a temporary file next to path, then moves it over
+    path. A destination hardlinked to an ExportCache entry is replaced,
+    rather than the cached mesh being overwritten through the link."""
+    temp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    with open(temp, 'wb') as o:
+        mesh_.write(o, file_type)
+    os.replace(temp, path)
@@ -1,29 +1,187 @@
 from __future__ import annotations
 
-from math import cos, sin
+from array import array
+from hashlib import blake2b
+from math import cos, pi, sin
+from threading import Lock
+from types import MappingProxyType
 
 import xml.etree.ElementTree as ET
 
+from .bounds import BoundingBox
+from .buffers import CHUNK, FaceArray, NumberFormat, VertexArray, _as_bytes, _flat_buffer
+from .meshio import map_file, read_obj, read_stl
+
+try:
+    import numpy
+except ImportError:  # numpy is optional
+    numpy = None
+
 
 class Figure(object):
-    def __init__(self, type_, attributes=None):
+    '''
+    A node of the model. Figures are immutable once built: the attributes
+    are a tuple of (name, value) pairs, the children a tuple of figures and
+    the accumulated transform a flat array of 16 floats, row by row, or None
+    for the identity. Every figure class declares __slots__, so a node holds
+    no per-instance dict.
+    '''
+    __slots__ = ('type_', '_attributes', 'children', 'matrix', 'cacheable', '_digest', '_bounds')
+
+    # Bulk figures serialize themselves in chunks through xcsg_chunks()
+    # instead of as an element with child figures.
+    bulk = False
+
+    def __init__(self, type_, attributes=None, children=()):
+        """
+        Arguments:
+            type_: the xcsg element name
+            attributes: a dict or (name, value) pairs
+            children: the child figures
+        """
         self.type_ = type_
-        self.attributes = attributes if attributes else dict()
-        self.children = []
+        if isinstance(attributes, dict):
+            attributes = attributes.items()
+        self._attributes = tuple(attributes) if attributes else ()
+        self.children = tuple(children)
+        self.matrix = None
+        # Cacheable figures are replaced by their mesh by a MeshCache.
+        self.cacheable = False
+        self._digest = None
+        self._bounds = None
+
+    @property
+    def attributes(self) -> MappingProxyType:
+        """The attributes of the figure, as a read-only mapping."""
+        return MappingProxyType(dict(self._attributes))
+
+    def __eq__(self, other):
+        if not isinstance(other, Figure):
+            return NotImplemented
+        return self is other or self.digest == other.digest
+
+    def __hash__(self):
+        return int.from_bytes(self.digest[:8], 'little', signed=True)
+
+    @property
+    def digest(self) -> bytes:
+        """A structural hash of the figure over its type, attributes, matrix,
+        children and cache mark. Figures with the same digest produce the same
+        xcsg and are cached alike.
+
+        The digest is computed once and cached, so figures must not be
+        modified after it has been used.
+        """
+        if self._digest is None:
+            stack = [(self, False)]
+            while stack:
+                figure, ready = stack.pop()
+                if figure._digest is not None:
+                    continue
+                if ready:
+                    digest = figure._compute_digest()
+                    if figure.cacheable:
+                        digest = blake2b(digest + b'\0cacheable', digest_size=16).digest()
+                    figure._digest = digest
+                else:
+                    stack.append((figure, True))
+                    stack.extend((c, False) for c in figure.children)
+        return self._digest
+
+    @property
+    def bounds(self):
+        """A conservative axis-aligned BoundingBox of the figure, including
+        its matrix, or None when it is not known (sweeps, helical extrusions,
+        unknown types). Cached like the digest.
+        """
+        if self._bounds is None:
+            stack = [(self, False)]
+            while stack:
+                figure, ready = stack.pop()
+                if figure._bounds is not None:
+                    continue
+                if ready:
+                    box = figure._local_bounds([c._bounds[0] for c in figure.children])
+                    if box is not None and figure.matrix is not None:
+                        box = box.transformed(figure.matrix)
+                    figure._bounds = (box,)
+                else:
+                    stack.append((figure, True))
+                    stack.extend((c, False) for c in figure.children)
+        return self._bounds[0]
+
+    def _local_bounds(self, boxes):
+        """Bounds the figure before its matrix is applied, from the bounds
+        of its children."""
+        return None
+
+    def _compute_digest(self) -> bytes:
+        """Hashes the figure once the digests of its children are known."""
+        h = blake2b(self.type_.encode('utf8'), digest_size=16)
+        for a, v in self._attributes:
+            h.update(f'\0{a}={v}'.encode('utf8'))
+        if self.matrix is not None:
+            h.update(('\0tmatrix=' + ','.join(map(str, self.matrix))).encode('utf8'))
+        h.update(b'\0children=%d' % len(self.children))
+        for c in self.children:
+            h.update(c._digest)
+        return h.digest()
 
-    def __sub_element__(self, parent):
-        attr = dict()
-        for a in self.attributes.keys():
-            attr[a] = str(self.attributes[a])
+    def __sub_element__(self, parent, numbers=NumberFormat.DEFAULT):
+        attr = {a: numbers.attribute(v, a) for a, v in self._attributes}
         e = ET.SubElement(parent, self.type_, attr)
 
         for c in self.children:
-            c.__sub_element__(e)
+            c.__sub_element__(e, numbers)
+
+        if self.matrix is not None:
+            TMatrix.from_values(numbers.format_matrix(self.matrix)).__sub_element__(e)
+
+    def _copy(self) -> Figure:
+        """Returns a shallow copy of the figure, with its caches reset."""
+        cls = type(self)
+        figure = cls.__new__(cls)
+        for name in _slot_names(cls):
+            setattr(figure, name, getattr(self, name))
+        figure._digest = None
+        figure._bounds = None
+        return figure
+
+    def _with_children(self, children) -> Figure:
+        """Returns a copy of the figure with other children."""
+        figure = self._copy()
+        figure.children = tuple(children)
+        return figure
+
+    def _untransformed(self) -> Figure:
+        """Returns a copy of the figure without its matrix."""
+        figure = self._copy()
+        figure.matrix = None
+        return figure
+
+    def _transform(self, matrix) -> Figure:
+        """Returns a copy of the figure with matrix applied after any
+        transform the figure already has. The matrices are composed here so
+        that a figure never carries more than one tmatrix."""
+        figure = self._copy()
+        if self.matrix is None:
+            figure.matrix = array('d', matrix)
+        else:
+            figure.matrix = _multiply(matrix, self.matrix)
+        return figure
+
+
+# The children slot of figures, behind the children property of operations.
+_CHILDREN = Figure.children
+# Held while an operation node extends the operands of another one.
+_EXTEND_LOCK = Lock()
 
 
 class Shape(Figure):
-    def __init__(self, type_, attributes=None):
-        super().__init__(type_, attributes=attributes)
+    __slots__ = ()
+
+    def __init__(self, type_, attributes=None, children=()):
+        super().__init__(type_, attributes, children)
 
     def __add__(self, other: Shape) -> Shape:
         return Union2d(self, other)
@@ -34,6 +192,15 @@ class Shape(Figure):
     def __and__(self, other: Shape) -> Shape:
         return Intersection2d(self, other)
 
+    def resolution(self, secant_tolerance) -> Shape:
+        """Returns a copy of a circle tessellated with its own secant
+        tolerance, whatever the resolution of the model. See Root.
+        Arguments:
+            secant_tolerance: the largest distance between the circle and
+                the segments that approximate it
+        """
+        return _with_secant_tolerance(self, secant_tolerance)
+
     def linear_extrude(self, dz: float) -> Solid:
         """Extrudes linearly into a solid by dz.
 
@@ -93,17 +260,11 @@ class Shape(Figure):
 
     def translate(self, x, y) -> Shape:
         """Translates a shape in 2d"""
-        shape = Shape(self.type_, self.attributes)
-        shape.children += self.children
-        shape.children.append(Translation3d(x, y, 0, 1))
-        return shape
+        return self._transform(_translation(x, y, 0, 1))
 
     def scale(self, x=1, y=1) -> Shape:
         """Scales a shape in 2d"""
-        shape = Shape(self.type_, self.attributes)
-        shape.children += self.children
-        shape.children.append(Scale3d(x, y, 1, 1))
-        return shape
+        return self._transform(_scale(x, y, 1, 1))
 
 
 class Solid(Figure):
@@ -111,9 +272,10 @@ class Solid(Figure):
     The base shape for any solid, including the results of operations. This
     shouldn't have to be used directly.
     '''
+    __slots__ = ()
 
-    def __init__(self, type_, attributes=None):
-        super().__init__(type_, attributes=attributes)
+    def __init__(self, type_, attributes=None, children=()):
+        super().__init__(type_, attributes, children)
 
     def __add__(self, other: Solid) -> Solid:
         return Union3d(self, other)
@@ -124,6 +286,16 @@ class Solid(Figure):
     def __and__(self, other: Solid) -> Solid:
         return Intersection3d(self, other)
 
+    def resolution(self, secant_tolerance) -> Solid:
+        """Returns a copy of a sphere, cylinder, cone or rotate extrusion
+        tessellated with its own secant tolerance, whatever the resolution of
+        the model. See Root.
+        Arguments:
+            secant_tolerance: the largest distance between the curved
+                surfaces and the facets that approximate them
+        """
+        return _with_secant_tolerance(self, secant_tolerance)
+
     def hull(self, other: Solid) -> Solid:
         """Hull of two figures.
         Arguments:
@@ -138,164 +310,367 @@ class Solid(Figure):
         """
         return Minkowski3d(self, other)
 
+    def cached(self) -> Solid:
+        """Marks the solid for the mesh cache of the exporter: it is evaluated
+        once by xcsg, then replaced by the resulting polyhedron in every
+        later export. See pysomo.cache.MeshCache."""
+        solid = self._copy()
+        solid.cacheable = True
+        return solid
+
     def project(self) -> Shape:
         """Projects onto the XY plane."""
         return Projection2d(self)
 
+    def pattern(self, transforms) -> Solid:
+        """Union of copies of the solid, one per transform. The copies share
+        the solid and their matrices are kept in a single buffer, see
+        Pattern.
+        Arguments:
+            transforms: 4x4 matrices stored row by row, as a numpy array of
+                shape (N, 4, 4), a flat float64 buffer of N * 16 values or
+                a sequence of 16-value sequences
+        """
+        return Pattern(self, transforms)
+
+    def linear_array(self, n, dx, dy=0, dz=0) -> Solid:
+        """Union of n copies of the solid, each one translated by dx, dy, dz
+        from the previous one, starting in place."""
+        return Pattern(self, _translations([(dx * i, dy * i, dz * i) for i in range(n)]))
+
+    def grid_array(self, nx, ny, dx, dy, nz=1, dz=0) -> Solid:
+        """Union of nx * ny * nz copies of the solid on a grid of spacing dx,
+        dy, dz, starting in place."""
+        return Pattern(self, _translations([
+            (dx * i, dy * j, dz * k) for k in range(nz) for j in range(ny) for i in range(nx)]))
+
+    def polar_array(self, n, axis='z', angle=2 * pi) -> Solid:
+        """Union of n copies of the solid rotated about an axis through the
+        origin by multiples of angle / n, starting in place.
+        Arguments:
+            n: the number of copies
+            axis: 'x', 'y' or 'z'
+            angle: the angle covered by the copies, a full turn by default
+        """
+        if axis not in ('x', 'y', 'z'):
+            raise ValueError(f'Unknown axis {axis}.')
+        if n < 1:
+            raise ValueError('A pattern needs at least one transform.')
+        step = angle / n
+        return Pattern(self, [_axis_rotation(axis, step * i) for i in range(n)])
+
     def translate(self, x, y, z) -> Solid:
         """Translates a solid in 3d"""
-        solid = Solid(self.type_, self.attributes)
-        solid.children += self.children
-        solid.children.append(Translation3d(x, y, z, 1))
-        return solid
+        return self._transform(_translation(x, y, z, 1))
 
     def scale(self, x=1, y=1, z=1) -> Solid:
         """Scales a solid in 3d"""
-        solid = Solid(self.type_, self.attributes)
-        solid.children += self.children
-        solid.children.append(Scale3d(x, y, z, 1))
-        return solid
+        return self._transform(_scale(x, y, z, 1))
 
     def rotate(self, x=0, y=0, z=0) -> Solid:
         """Rotates a shape in 2d"""
         if (x != 0 and (y != 0 or z != 0)) or (y != 0 and z != 0):
             raise Exception("Only one axis should be set at a time.")
 
-        solid = Solid(self.type_, self.attributes)
-        solid.children += self.children
         if x != 0:
-            solid.children.append(RotateX3d(x))
+            return self._transform(_rotation_x(x))
         elif y != 0:
-            solid.children.append(RotateY3d(y))
-        else:
-            solid.children.append(RotateZ3d(z))
-        return solid
+            return self._transform(_rotation_y(y))
+        return self._transform(_rotation_z(z))
 
 
 class LinearExtrude(Solid):
+    __slots__ = ()
+
     def __init__(self, a: Shape, dz):
-        super().__init__('linear_extrude')
-        self.children.append(a)
-        self.attributes['dz'] = dz
+        super().__init__('linear_extrude', {'dz': dz}, (a,))
+
+    def _local_bounds(self, boxes):
+        box = boxes[0]
+        if box is None or box.empty:
+            return box
+        dz = self.attributes['dz']
+        return BoundingBox(box.min[:2] + (min(0, dz),), box.max[:2] + (max(0, dz),))
 
 
 class RotateExtrude(Solid):
+    __slots__ = ()
+
     def __init__(self, a: Shape, angle, pitch):
-        super().__init__('rotate_extrude')
-        self.children.append(a)
-        self.attributes['angle'] = angle
-        self.attributes['pitch'] = pitch
+        super().__init__('rotate_extrude', {'angle': angle, 'pitch': pitch}, (a,))
+
+    def _local_bounds(self, boxes):
+        box = boxes[0]
+        if box is None or box.empty or self.attributes['pitch']:
+            return None
+        # Revolving the profile keeps every point within its distance to the
+        # axis, bounded by the largest coordinate of the profile.
+        r = max(max(map(abs, box.min[:2])), max(map(abs, box.max[:2])))
+        return BoundingBox((-r, -r, -r), (r, r, r))
 
 
 class TransformExtrude(Solid):
+    __slots__ = ()
+
     def __init__(self, a: Shape, b: Shape):
-        super().__init__('transform_extrude')
-        self.children.append(a)
-        self.children.append(b)
+        super().__init__('transform_extrude', children=(a, b))
+
+    def _local_bounds(self, boxes):
+        return _union(boxes)
 
 
 class Sweep(Solid):
+    __slots__ = ()
+
     def __init__(self, a: Shape, spline_path):
-        super().__init__('sweep')
-        self.children.append(a)
-        self.children.append(spline_path)
+        super().__init__('sweep', children=(a, spline_path))
 
 
 class Fill2d(Shape):
+    __slots__ = ()
+
     def __init__(self, a: Shape):
-        super().__init__('fill2d')
-        self.children.append(a)
+        super().__init__('fill2d', children=(a,))
+
+    def _local_bounds(self, boxes):
+        return _union(boxes)
 
 
 class Offset2d(Shape):
+    __slots__ = ()
+
     def __init__(self, a: Shape, delta, round_, chamfer):
-        super().__init__('offset2d')
-        self.children.append(a)
-        self.attributes['delta'] = delta
-        self.attributes['round'] = round_
-        self.attributes['chamfer'] = chamfer
+        super().__init__('offset2d', {'delta': delta, 'round': round_, 'chamfer': chamfer}, (a,))
+
+    # How far a sharp corner reaches, in multiples of delta, before xcsg
+    # squares it off, when the offset is not round.
+    MITER_LIMIT = 2
+
+    def _local_bounds(self, boxes):
+        box = boxes[0]
+        attributes = self.attributes
+        delta = attributes['delta']
+        if box is None or delta <= 0:
+            return box
+        if attributes['round'] not in (True, 'true'):
+            delta *= self.MITER_LIMIT
+        return box.expanded(delta, delta, 0)
 
 
 class Hull2d(Shape):
+    __slots__ = ()
+
     def __init__(self, a: Shape, b: Shape):
-        super().__init__('hull2d')
-        self.children.append(a)
-        self.children.append(b)
+        super().__init__('hull2d', children=(a, b))
+
+    def _local_bounds(self, boxes):
+        return _union(boxes)
 
 
 class Minkowski2d(Shape):
+    __slots__ = ()
+
     def __init__(self, a: Shape, b: Shape):
-        super().__init__('minkowski2d')
-        self.children.append(a)
-        self.children.append(b)
+        super().__init__('minkowski2d', children=(a, b))
+
+    def _local_bounds(self, boxes):
+        a, b = boxes
+        if a is None or b is None:
+            return None
+        return a.minkowski(b)
 
 
 class Projection2d(Shape):
+    __slots__ = ()
+
     def __init__(self, a: Shape):
-        super().__init__('projection2d')
-        self.children.append(a)
+        super().__init__('projection2d', children=(a,))
 
+    def _local_bounds(self, boxes):
+        box = boxes[0]
+        if box is None or box.empty:
+            return box
+        return BoundingBox(box.min[:2] + (0,), box.max[:2] + (0,))
 
-class Operation2d(Shape):
-    def __init__(self, shape_type, a: Shape, b: Shape):
-        super().__init__(shape_type)
-        self.children.append(a)
-        self.children.append(b)
+
+class _Operation(object):
+    '''
+    The n-ary operations. Chained operators splice the operands of nested
+    nodes of the same operation into a single node. So that a union built
+    with += in a loop takes linear time, a node keeps its operands in a list
+    that it shares with the node it extends, of which it uses the first
+    _count: extending the last node of a chain appends to the list instead
+    of copying it. The children tuple is made on first use.
+    '''
+    __slots__ = ()
+
+    @property
+    def children(self) -> tuple:
+        children = _CHILDREN.__get__(self)
+        if children is None:
+            children = tuple(self._operands[:self._count])
+            _CHILDREN.__set__(self, children)
+        return children
+
+    @children.setter
+    def children(self, children):
+        _CHILDREN.__set__(self, children)
+        self._operands = None
+        self._count = 0
+
+    def _set_operands(self, operation, figures, first_only=False):
+        """Sets the operands of the node, splicing those of the figures that
+        are `operation` nodes, or only of the first one."""
+        first = figures[0] if figures else None
+        spliced = _spliced(operation, first)
+        rest = []
+        for f in figures[1:] if spliced else figures:
+            if not first_only and _spliced(operation, f):
+                rest += f.children
+            else:
+                rest.append(f)
+
+        if spliced:
+            with _EXTEND_LOCK:
+                operands = first._operands
+                if operands is None:
+                    operands = first._operands = list(first.children)
+                    first._count = len(operands)
+                elif len(operands) != first._count:
+                    # Another node extends them already.
+                    operands = operands[:first._count]
+                operands += rest
+        else:
+            operands = rest
+        _CHILDREN.__set__(self, None)
+        self._operands = operands
+        self._count = len(operands)
+
+
+class Operation2d(_Operation, Shape):
+    __slots__ = ('_operands', '_count')
+
+    def __init__(self, shape_type, *shapes: Shape):
+        super().__init__(shape_type, children=shapes)
 
 
 class Intersection2d(Operation2d):
-    def __init__(self, a: Shape, b: Shape):
-        super().__init__('intersection2d', a, b)
+    __slots__ = ()
+
+    def __init__(self, *shapes: Shape, flatten=True):
+        super().__init__('intersection2d')
+        self._set_operands(Intersection2d if flatten else None, shapes)
+
+    def _local_bounds(self, boxes):
+        if any(b is None for b in boxes):
+            return _first_empty(boxes)
+        box = boxes[0]
+        for b in boxes[1:]:
+            box = box.intersection(b)
+        return box
 
 
 class Difference2d(Operation2d):
-    def __init__(self, a: Shape, b: Shape):
-        super().__init__('difference2d', a, b)
+    __slots__ = ()
+
+    def __init__(self, *shapes: Shape, flatten=True):
+        super().__init__('difference2d')
+        self._set_operands(Difference2d if flatten else None, shapes, first_only=True)
+
+    def _local_bounds(self, boxes):
+        return boxes[0]
 
 
 class Union2d(Operation2d):
-    def __init__(self, a: Shape, b: Shape):
-        super().__init__('union2d', a, b)
+    __slots__ = ()
+
+    def __init__(self, *shapes: Shape, flatten=True):
+        super().__init__('union2d')
+        self._set_operands(Union2d if flatten else None, shapes)
+
+    def _local_bounds(self, boxes):
+        return _union(boxes)
 
 
 class Circle(Shape):
+    __slots__ = ()
+
     def __init__(self, radius):
-        super().__init__('circle')
-        self.attributes['r'] = radius
+        super().__init__('circle', {'r': radius})
+
+    def _local_bounds(self, boxes):
+        r = self.attributes['r']
+        return BoundingBox((-r, -r, 0), (r, r, 0))
 
 
 class Square(Shape):
+    __slots__ = ()
+
     def __init__(self, size, center='true'):
-        super().__init__('square')
-        self.attributes['size'] = size
-        self.attributes['center'] = center
+        super().__init__('square', {'size': size, 'center': center})
+
+    def _local_bounds(self, boxes):
+        size = self.attributes['size']
+        return BoundingBox.centered(size, size, 0, _centered(self))
 
 
 class Rectangle(Shape):
+    __slots__ = ()
+
     def __init__(self, dx: float, dy: float, center='true'):
-        super().__init__('rectangle')
-        self.attributes['dx'] = dx
-        self.attributes['dy'] = dy
-        self.attributes['center'] = center
+        super().__init__('rectangle', {'dx': dx, 'dy': dy, 'center': center})
+
+    def _local_bounds(self, boxes):
+        a = self.attributes
+        return BoundingBox.centered(a['dx'], a['dy'], 0, _centered(self))
 
 
 class Polygon(Shape):
+    __slots__ = ()
+
     def __init__(self, vertices):
-        super().__init__('polygon')
-        self.children.append(Vertices2d(vertices))
+        """
+        Arguments:
+            vertices: (x, y) tuples, a flat float64 buffer of x, y values or
+                a numpy array of shape (N, 2)
+        """
+        super().__init__('polygon', children=(Vertices2d(vertices),))
+
+    def _local_bounds(self, boxes):
+        return _union(boxes)
 
 
 class Vertices2d(Shape):
+    __slots__ = ('vertices',)
+    bulk = True
+
     def __init__(self, vertices):
         super().__init__('vertices')
-        self.children += [Vertex2d.from_tuple(v) for v in vertices]
+        self.vertices = VertexArray(vertices, 2)
+
+    def __sub_element__(self, parent, numbers=NumberFormat.DEFAULT):
+        e = ET.SubElement(parent, self.type_)
+        values = numbers.format_values(self.vertices.data)
+        for i in range(0, len(values), 2):
+            ET.SubElement(e, 'vertex', {'x': values[i], 'y': values[i + 1]})
+
+    def _compute_digest(self) -> bytes:
+        return self.vertices.digest()
+
+    def xcsg_chunks(self, numbers=NumberFormat.DEFAULT):
+        yield '<vertices>'
+        yield from self.vertices.format_chunks('<vertex x="%s" y="%s" />', numbers)
+        yield '</vertices>'
+
+    def _local_bounds(self, boxes):
+        return BoundingBox.of_points(self.vertices.data, 2)
 
 
 class Vertex2d(Figure):
+    __slots__ = ()
+
     def __init__(self, x: float, y: float):
-        super().__init__('vertex')
-        self.attributes['x'] = x
-        self.attributes['y'] = y
+        super().__init__('vertex', {'x': x, 'y': y})
 
     @staticmethod
     def from_tuple(vertex):
@@ -303,99 +678,317 @@ class Vertex2d(Figure):
         return Vertex2d(x, y)
 
 
-class Operation3d(Solid):
-    def __init__(self, solid_type, a: Solid, b: Solid):
-        super().__init__(solid_type)
-        self.children.append(a)
-        self.children.append(b)
+class Operation3d(_Operation, Solid):
+    __slots__ = ('_operands', '_count')
+
+    def __init__(self, solid_type, *solids: Solid):
+        super().__init__(solid_type, children=solids)
 
 
 class Intersection3d(Operation3d):
-    def __init__(self, a: Solid, b: Solid):
-        super().__init__('intersection3d', a, b)
+    __slots__ = ()
+
+    def __init__(self, *solids: Solid, flatten=True):
+        super().__init__('intersection3d')
+        self._set_operands(Intersection3d if flatten else None, solids)
+
+    def _local_bounds(self, boxes):
+        if any(b is None for b in boxes):
+            return _first_empty(boxes)
+        box = boxes[0]
+        for b in boxes[1:]:
+            box = box.intersection(b)
+        return box
 
 
 class Difference3d(Operation3d):
-    def __init__(self, a: Solid, b: Solid):
-        super().__init__('difference3d', a, b)
+    __slots__ = ()
+
+    def __init__(self, *solids: Solid, flatten=True):
+        super().__init__('difference3d')
+        self._set_operands(Difference3d if flatten else None, solids, first_only=True)
+
+    def _local_bounds(self, boxes):
+        return boxes[0]
 
 
 class Union3d(Operation3d):
-    def __init__(self, a: Solid, b: Solid):
-        super().__init__('union3d', a, b)
+    __slots__ = ()
+
+    def __init__(self, *solids: Solid, flatten=True):
+        super().__init__('union3d')
+        self._set_operands(Union3d if flatten else None, solids)
+
+    def _local_bounds(self, boxes):
+        return _union(boxes)
 
 
 class Hull3d(Solid):
+    __slots__ = ()
+
     def __init__(self, a: Solid, b: Solid):
-        super().__init__('hull3d')
-        self.children.append(a)
-        self.children.append(b)
+        super().__init__('hull3d', children=(a, b))
+
+    def _local_bounds(self, boxes):
+        return _union(boxes)
 
 
 class Minkowski3d(Solid):
+    __slots__ = ()
+
     def __init__(self, a: Solid, b: Solid):
-        super().__init__('minkowski3d')
-        self.children.append(a)
-        self.children.append(b)
+        super().__init__('minkowski3d', children=(a, b))
+
+    def _local_bounds(self, boxes):
+        a, b = boxes
+        if a is None or b is None:
+            return None
+        return a.minkowski(b)
+
+
+class Pattern(Solid):
+    '''
+    A union of instances of one solid, each placed by its own matrix. The
+    solid is the only child and the matrices are kept in one flat float64
+    buffer, so a pattern costs one figure whatever its size. It is written
+    as a union3d of copies of the solid; the solid is serialized once and
+    the matrices are formatted a chunk at a time.
+    '''
+    __slots__ = ('matrices',)
+
+    def __init__(self, base: Solid, transforms):
+        """
+        Arguments:
+            base: the solid
+            transforms: the matrix of every instance, see Solid.pattern()
+        """
+        matrices = _flat_buffer(transforms, 'd')
+        if matrices is None:
+            matrices = array('d')
+            for m in transforms:
+                if len(m) != 16:
+                    raise ValueError('A transform must be a 4x4 matrix.')
+                matrices.extend(m)
+        if len(matrices) % 16:
+            raise ValueError('The transforms buffer does not hold 4x4 matrices.')
+        if not len(matrices):
+            raise ValueError('A pattern needs at least one transform.')
+
+        # The matrix of the solid goes into every instance matrix.
+        if base.matrix is not None:
+            if numpy is not None:
+                composed = numpy.matmul(
+                    numpy.asarray(matrices, dtype=float).reshape(-1, 4, 4),
+                    numpy.asarray(base.matrix, dtype=float).reshape(4, 4))
+                matrices = composed.reshape(-1)
+            else:
+                composed = array('d')
+                for i in range(0, len(matrices), 16):
+                    composed.extend(_multiply(matrices[i:i + 16], base.matrix))
+                matrices = composed
+            base = base._untransformed()
+
+        super().__init__('union3d', children=(base,))
+        self.matrices = matrices
+
+    def __len__(self):
+        return len(self.matrices) // 16
+
+    @property
+    def base(self) -> Solid:
+        return self.children[0]
+
+    def instance_matrices(self):
+        """Yields the matrix of every instance, as a tuple."""
+        for i in range(0, len(self.matrices), 16 * CHUNK):
+            values = self.matrices[i:i + 16 * CHUNK].tolist()
+            for j in range(0, len(values), 16):
+                yield tuple(values[j:j + 16])
+
+    def instances(self):
+        """Yields every instance as a figure of its own."""
+        base = self.base
+        for m in self.instance_matrices():
+            yield base._transform(m)
+
+    def __sub_element__(self, parent, numbers=NumberFormat.DEFAULT):
+        e = ET.SubElement(parent, self.type_)
+        for instance in self.instances():
+            instance.__sub_element__(e, numbers)
+        if self.matrix is not None:
+            TMatrix.from_values(numbers.format_matrix(self.matrix)).__sub_element__(e)
+
+    def _compute_digest(self) -> bytes:
+        h = blake2b(b'pattern', digest_size=16)
+        h.update(self.base._digest)
+        h.update(_as_bytes(self.matrices))
+        if self.matrix is not None:
+            h.update(('\0tmatrix=' + ','.join(map(str, self.matrix))).encode('utf8'))
+        return h.digest()
+
+    def _local_bounds(self, boxes):
+        box = boxes[0]
+        if box is None or box.empty:
+            return box
+        if numpy is not None:
+            m = numpy.asarray(self.matrices, dtype=float).reshape(-1, 4, 4)
+            if not m[:, 3, :3].any() and (m[:, 3, 3] == 1).all():
+                # Transform the center and the half size of the box of every
+                # instance at once.
+                lo, hi = numpy.array(box.min), numpy.array(box.max)
+                centers = m[:, :3, :3] @ ((lo + hi) / 2) + m[:, :3, 3]
+                extents = numpy.abs(m[:, :3, :3]) @ ((hi - lo) / 2)
+                return BoundingBox(
+                    tuple((centers - extents).min(axis=0).tolist()),
+                    tuple((centers + extents).max(axis=0).tolist()))
+        return _union(box.transformed(m) for m in self.instance_matrices())
 
 
 class Cone(Solid):
+    __slots__ = ()
+
     def __init__(self, r1: float,  r2: float,  h: float,  center='true'):
-        super().__init__('cone')
-        self.attributes['r1'] = r1
-        self.attributes['r2'] = r2
-        self.attributes['h'] = h
-        self.attributes['center'] = center
+        super().__init__('cone', {'r1': r1, 'r2': r2, 'h': h, 'center': center})
+
+    def _local_bounds(self, boxes):
+        a = self.attributes
+        r = max(a['r1'], a['r2'])
+        box = BoundingBox.centered(2 * r, 2 * r, a['h'], _centered(self))
+        return box if _centered(self) else box.transformed(_translation(-r, -r, 0, 1))
 
 
 class Sphere(Solid):
+    __slots__ = ()
+
     def __init__(self, radius):
-        super().__init__('sphere')
-        self.attributes['r'] = radius
+        super().__init__('sphere', {'r': radius})
+
+    def _local_bounds(self, boxes):
+        r = self.attributes['r']
+        return BoundingBox((-r, -r, -r), (r, r, r))
 
 
 class Cube(Solid):
+    __slots__ = ()
+
     def __init__(self, size, center='true'):
-        super().__init__('cube')
-        self.attributes['size'] = size
-        self.attributes['center'] = center
+        super().__init__('cube', {'size': size, 'center': center})
+
+    def _local_bounds(self, boxes):
+        size = self.attributes['size']
+        return BoundingBox.centered(size, size, size, _centered(self))
 
 
 class Cuboid(Solid):
+    __slots__ = ()
+
     def __init__(self, dx: float, dy: float, dz: float, center='true'):
-        super().__init__('cuboid')
-        self.attributes['dx'] = dx
-        self.attributes['dy'] = dy
-        self.attributes['dz'] = dz
-        self.attributes['center'] = center
+        super().__init__('cuboid', {'dx': dx, 'dy': dy, 'dz': dz, 'center': center})
+
+    def _local_bounds(self, boxes):
+        a = self.attributes
+        return BoundingBox.centered(a['dx'], a['dy'], a['dz'], _centered(self))
 
 
 class Cylinder(Solid):
+    __slots__ = ()
+
     def __init__(self, r: float,  h: float,  center='true'):
-        super().__init__('cylinder')
-        self.attributes['r'] = r
-        self.attributes['h'] = h
-        self.attributes['center'] = center
+        super().__init__('cylinder', {'r': r, 'h': h, 'center': center})
+
+    def _local_bounds(self, boxes):
+        a = self.attributes
+        r = a['r']
+        box = BoundingBox.centered(2 * r, 2 * r, a['h'], _centered(self))
+        return box if _centered(self) else box.transformed(_translation(-r, -r, 0, 1))
 
 
 class Polyhedron(Solid):
-    def __init__(self, vertices):
-        super().__init__('polyhedron')
-        self.children.append(Vertices3d(vertices))
+    __slots__ = ()
+
+    def __init__(self, vertices, faces=None, offsets=None):
+        """
+        Arguments:
+            vertices: (x, y, z) tuples, a flat float64 buffer of x, y, z
+                values or a numpy array of shape (N, 3)
+            faces: index sequences, a flat int64 buffer of indices or a
+                numpy array of shape (N, 3). Without offsets, a flat buffer
+                holds triangles. When omitted, xcsg builds the faces.
+            offsets: the start of every face in a flat faces buffer
+        """
+        children = (Vertices3d(vertices),)
+        if faces is not None:
+            f = Faces(faces, offsets)
+            if f.faces.min_index() < 0 or f.faces.max_index() >= len(children[0].vertices):
+                raise ValueError('A face refers to a vertex that does not exist.')
+            children += (f,)
+        super().__init__('polyhedron', children=children)
+
+    @staticmethod
+    def from_stl(path, weld=True) -> Polyhedron:
+        """Imports a binary or ASCII STL mesh.
+        Arguments:
+            path: the path of the STL file
+            weld: whether identical vertices are merged into one, so that
+                neighbouring triangles share their vertices
+        """
+        return Polyhedron._read(path, read_stl, weld)
+
+    @staticmethod
+    def from_obj(path, weld=False) -> Polyhedron:
+        """Imports a Wavefront OBJ mesh. Only the vertices and faces are
+        read.
+        Arguments:
+            path: the path of the OBJ file
+            weld: whether identical vertices are merged into one
+        """
+        return Polyhedron._read(path, read_obj, weld)
+
+    @staticmethod
+    def _read(path, reader, weld) -> Polyhedron:
+        data = map_file(path)
+        try:
+            vertices, faces = reader(data, weld)
+        finally:
+            if not isinstance(data, bytes):
+                data.close()
+        return Polyhedron(vertices, faces)
+
+    def _local_bounds(self, boxes):
+        return _union(boxes)
 
 
 class Vertices3d(Figure):
+    __slots__ = ('vertices',)
+    bulk = True
+
     def __init__(self, vertices):
         super().__init__('vertices')
-        self.children += [Vertex3d.from_tuple(v) for v in vertices]
+        self.vertices = VertexArray(vertices, 3)
+
+    def __sub_element__(self, parent, numbers=NumberFormat.DEFAULT):
+        e = ET.SubElement(parent, self.type_)
+        values = numbers.format_values(self.vertices.data)
+        for i in range(0, len(values), 3):
+            ET.SubElement(e, 'vertex', {'x': values[i], 'y': values[i + 1], 'z': values[i + 2]})
+
+    def _compute_digest(self) -> bytes:
+        return self.vertices.digest()
+
+    def xcsg_chunks(self, numbers=NumberFormat.DEFAULT):
+        yield '<vertices>'
+        yield from self.vertices.format_chunks('<vertex x="%s" y="%s" z="%s" />', numbers)
+        yield '</vertices>'
+
+    def _local_bounds(self, boxes):
+        return BoundingBox.of_points(self.vertices.data, 3)
 
 
 class Vertex3d(Figure):
+    __slots__ = ()
+
     def __init__(self, x, y, z):
-        super().__init__('vertex')
-        self.attributes['x'] = x
-        self.attributes['y'] = y
-        self.attributes['z'] = z
+        super().__init__('vertex', {'x': x, 'y': y, 'z': z})
 
     @staticmethod
     def from_tuple(vertex):
@@ -403,84 +996,356 @@ class Vertex3d(Figure):
         return Vertex3d(x, y, z)
 
 
+class Faces(Figure):
+    __slots__ = ('faces',)
+    bulk = True
+
+    def __init__(self, faces, offsets=None, arity=3):
+        super().__init__('faces')
+        self.faces = FaceArray(faces, offsets, arity)
+
+    def __sub_element__(self, parent, numbers=NumberFormat.DEFAULT):
+        e = ET.SubElement(parent, self.type_)
+        for f in self.faces:
+            face = ET.SubElement(e, 'face')
+            for i in f:
+                ET.SubElement(face, 'fv', {'index': str(i)})
+
+    def _compute_digest(self) -> bytes:
+        return self.faces.digest()
+
+    def xcsg_chunks(self, numbers=NumberFormat.DEFAULT):
+        yield '<faces>'
+        yield from self.faces.format_chunks('<fv index="%d" />')
+        yield '</faces>'
+
+    def _local_bounds(self, boxes):
+        return BoundingBox.EMPTY
+
+
 class Face(Figure):
+    __slots__ = ()
+
     def __init__(self, indexes):
-        super().__init__()
-        for i in indexes:
-            self.children.append(Fv(i))
+        super().__init__('face', children=(Fv(i) for i in indexes))
 
 
 class Fv(Figure):
+    __slots__ = ()
+
     def __init__(self, index):
-        super().__init__()
-        self.attributes['index'] = index
+        super().__init__('fv', {'index': index})
 
 
 class TMatrix(Figure):
+    __slots__ = ()
+
     def __init__(self, rows):
-        super().__init__('tmatrix')
-        self.children += rows
+        super().__init__('tmatrix', children=rows)
+
+    @property
+    def values(self) -> tuple:
+        """The 16 coefficients of the matrix, row by row."""
+        return tuple(r.attributes[c]
+                     for r in self.children
+                     for c in ('c0', 'c1', 'c2', 'c3'))
+
+    @staticmethod
+    def from_values(values) -> TMatrix:
+        return TMatrix(_rows(values))
 
 
 class TRow(Figure):
+    __slots__ = ()
+
     def __init__(self, c0, c1, c2, c3):
-        super().__init__('trow')
-        self.attributes['c0'] = c0
-        self.attributes['c1'] = c1
-        self.attributes['c2'] = c2
-        self.attributes['c3'] = c3
+        super().__init__('trow', {'c0': c0, 'c1': c1, 'c2': c2, 'c3': c3})
 
 
 class Translation3d(TMatrix):
+    __slots__ = ()
+
     def __init__(self, x, y, z, w):
-        rows = (
-            TRow(1, 0, 0, x),
-            TRow(0, 1, 0, y),
-            TRow(0, 0, 1, z),
-            TRow(0, 0, 0, w)
-        )
-        super().__init__(rows)
+        super().__init__(_rows(_translation(x, y, z, w)))
 
 
 class Scale3d(TMatrix):
+    __slots__ = ()
+
     def __init__(self, x, y, z, w):
-        rows = (
-            TRow(x, 0, 0, 0),
-            TRow(0, y, 0, 0),
-            TRow(0, 0, z, 0),
-            TRow(0, 0, 0, w)
-        )
-        super().__init__(rows)
+        super().__init__(_rows(_scale(x, y, z, w)))
 
 
 class RotateX3d(TMatrix):
+    __slots__ = ()
+
     def __init__(self, angle):
-        rows = (
-            TRow(0, cos(angle), -sin(angle), 0),
-            TRow(0, sin(angle),  cos(angle), 0),
-            TRow(1,          0,           0, 0),
-            TRow(0,          0,           0, 1)
-        )
-        super().__init__(rows)
+        super().__init__(_rows(_rotation_x(angle)))
 
 
 class RotateY3d(TMatrix):
+    __slots__ = ()
+
     def __init__(self, angle):
-        rows = (
-            TRow(-sin(angle), 0, cos(angle), 0),
-            TRow( cos(angle), 0, sin(angle), 0),  # noqa: E201
-            TRow(          0, 1,          0, 0),  # noqa: E201
-            TRow(          0, 0,          0, 1)   # noqa: E201
-        )
-        super().__init__(rows)
+        super().__init__(_rows(_rotation_y(angle)))
 
 
 class RotateZ3d(TMatrix):
+    __slots__ = ()
+
     def __init__(self, angle):
-        rows = (
-            TRow(cos(angle), -sin(angle), 0, 0),
-            TRow(sin(angle),  cos(angle), 0, 0),
-            TRow(         0,          0,  1, 0),  # noqa: E201
-            TRow(         0,          0,  0, 1)   # noqa: E201
-        )
-        super().__init__(rows)
+        super().__init__(_rows(_rotation_z(angle)))
+
+
+# The figure class of every xcsg element, see _restore().
+_TYPES = {cls.__name__.lower(): cls for cls in (
+    Circle, Cone, Cube, Cuboid, Cylinder, Difference2d, Difference3d, Fill2d, Hull2d, Hull3d,
+    Intersection2d, Intersection3d, Minkowski2d, Minkowski3d, Offset2d, Polygon, Polyhedron,
+    Projection2d, Rectangle, Sphere, Square, Sweep, Union2d, Union3d)}
+_TYPES.update({
+    'linear_extrude': LinearExtrude,
+    'rotate_extrude': RotateExtrude,
+    'transform_extrude': TransformExtrude,
+})
+
+
+def _restore(type_, attributes, children, matrix=None) -> Figure:
+    """Builds a figure of an xcsg element type as it was saved, without
+    calling its constructor, so operations are not flattened again.
+    Unknown types become plain figures."""
+    cls = _TYPES.get(type_, Figure)
+    figure = cls.__new__(cls)
+    Figure.__init__(figure, type_, attributes, children)
+    figure.matrix = matrix
+    return figure
+
+
+# The figures with curved surfaces, which take a secant tolerance.
+CURVED = frozenset(('circle', 'sphere', 'cylinder', 'cone', 'rotate_extrude'))
+
+
+def _with_secant_tolerance(figure, secant_tolerance) -> Figure:
+    if figure.type_ not in CURVED:
+        raise ValueError(f'A {figure.type_} has no curved surface to tessellate.')
+    if not secant_tolerance > 0:
+        raise ValueError('The secant tolerance must be positive.')
+    copy = figure._copy()
+    copy._attributes = tuple(a for a in figure._attributes if a[0] != 'secant_tolerance') + (
+        ('secant_tolerance', secant_tolerance),)
+    return copy
+
+
+def _rows(values):
+    return tuple(TRow(*values[i:i + 4]) for i in range(0, 16, 4))
+
+
+def _multiply(a, b) -> array:
+    """Product a * b of two 4x4 matrices stored row by row."""
+    (a0, a1, a2, a3, a4, a5, a6, a7,
+     a8, a9, a10, a11, a12, a13, a14, a15) = a
+    (b0, b1, b2, b3, b4, b5, b6, b7,
+     b8, b9, b10, b11, b12, b13, b14, b15) = b
+    return array('d', (
+        a0 * b0 + a1 * b4 + a2 * b8 + a3 * b12,
+        a0 * b1 + a1 * b5 + a2 * b9 + a3 * b13,
+        a0 * b2 + a1 * b6 + a2 * b10 + a3 * b14,
+        a0 * b3 + a1 * b7 + a2 * b11 + a3 * b15,
+        a4 * b0 + a5 * b4 + a6 * b8 + a7 * b12,
+        a4 * b1 + a5 * b5 + a6 * b9 + a7 * b13,
+        a4 * b2 + a5 * b6 + a6 * b10 + a7 * b14,
+        a4 * b3 + a5 * b7 + a6 * b11 + a7 * b15,
+        a8 * b0 + a9 * b4 + a10 * b8 + a11 * b12,
+        a8 * b1 + a9 * b5 + a10 * b9 + a11 * b13,
+        a8 * b2 + a9 * b6 + a10 * b10 + a11 * b14,
+        a8 * b3 + a9 * b7 + a10 * b11 + a11 * b15,
+        a12 * b0 + a13 * b4 + a14 * b8 + a15 * b12,
+        a12 * b1 + a13 * b5 + a14 * b9 + a15 * b13,
+        a12 * b2 + a13 * b6 + a14 * b10 + a15 * b14,
+        a12 * b3 + a13 * b7 + a14 * b11 + a15 * b15))
+
+
+_SLOT_NAMES = dict()
+
+
+def _slot_names(cls) -> tuple:
+    """All the slots of a figure class, including inherited ones."""
+    names = _SLOT_NAMES.get(cls)
+    if names is None:
+        names = tuple(n for c in cls.__mro__ for n in getattr(c, '__slots__', ()))
+        _SLOT_NAMES[cls] = names
+    return names
+
+
+def _translations(offsets) -> array:
+    """The flat buffer of the translation matrices of offsets."""
+    matrices = array('d')
+    for x, y, z in offsets:
+        matrices.extend((1, 0, 0, x, 0, 1, 0, y, 0, 0, 1, z, 0, 0, 0, 1))
+    return matrices
+
+
+def _axis_rotation(axis, angle) -> tuple:
+    """The rotation by angle about the x, y or z axis."""
+    c, s = cos(angle), sin(angle)
+    if axis == 'x':
+        return (1, 0, 0, 0, 0, c, -s, 0, 0, s, c, 0, 0, 0, 0, 1)
+    if axis == 'y':
+        return (c, 0, s, 0, 0, 1, 0, 0, -s, 0, c, 0, 0, 0, 0, 1)
+    return _rotation_z(angle)
+
+
+def _translation(x, y, z, w):
+    return (
+        1, 0, 0, x,
+        0, 1, 0, y,
+        0, 0, 1, z,
+        0, 0, 0, w
+    )
+
+
+def _scale(x, y, z, w):
+    return (
+        x, 0, 0, 0,
+        0, y, 0, 0,
+        0, 0, z, 0,
+        0, 0, 0, w
+    )
+
+
+def _rotation_x(angle):
+    return (
+        0, cos(angle), -sin(angle), 0,
+        0, sin(angle),  cos(angle), 0,
+        1,          0,           0, 0,
+        0,          0,           0, 1
+    )
+
+
+def _rotation_y(angle):
+    return (
+        -sin(angle), 0, cos(angle), 0,
+         cos(angle), 0, sin(angle), 0,  # noqa: E131
+                  0, 1,          0, 0,  # noqa: E131
+                  0, 0,          0, 1   # noqa: E131
+    )
+
+
+def _rotation_z(angle):
+    return (
+        cos(angle), -sin(angle), 0, 0,
+        sin(angle),  cos(angle), 0, 0,
+                 0,           0, 1, 0,  # noqa: E131
+                 0,           0, 0, 1   # noqa: E131
+    )
+
+
+def _spliced(operation, figure) -> bool:
+    """Whether the operands of figure are spliced into those of an
+    `operation` node, so chained operators build one n-ary node instead of
+    a deep binary tree. Nodes marked for the mesh cache keep their
+    operands."""
+    return type(figure) is operation and figure.matrix is None and not figure.cacheable
+
+
+def _balanced(operation, figures, fanout):
+    if fanout is None or len(figures) <= fanout:
+        return operation(*figures)
+
+    level = figures
+    while len(level) > fanout:
+        level = [operation(*level[i:i + fanout], flatten=False)
+                 for i in range(0, len(level), fanout)]
+    return operation(*level, flatten=False)
+
+
+def _operation_all(operation2d, operation3d, figures, fanout):
+    figures = list(figures)
+    if not figures:
+        raise ValueError('At least one figure is required.')
+    if fanout is not None and fanout < 2:
+        raise ValueError('The fanout must be at least 2.')
+    if len(figures) == 1:
+        return figures[0]
+
+    operation = operation2d if isinstance(figures[0], Shape) else operation3d
+    return _balanced(operation, figures, fanout)
+
+
+def union(*figures, fanout=None) -> Figure:
+    """Union of any number of shapes or solids.
+    Arguments:
+        figures: the shapes or solids to combine
+        fanout: when set, the maximum number of children per union node; the
+            figures are then grouped into a balanced tree
+    """
+    return union_all(figures, fanout=fanout)
+
+
+def union_all(figures, fanout=None) -> Figure:
+    """Union of an iterable of shapes or solids. See union()."""
+    return _operation_all(Union2d, Union3d, figures, fanout)
+
+
+def intersection(*figures, fanout=None) -> Figure:
+    """Intersection of any number of shapes or solids.
+    Arguments:
+        figures: the shapes or solids to intersect
+        fanout: when set, the maximum number of children per intersection
+            node; the figures are then grouped into a balanced tree
+    """
+    return intersection_all(figures, fanout=fanout)
+
+
+def intersection_all(figures, fanout=None) -> Figure:
+    """Intersection of an iterable of shapes or solids. See intersection()."""
+    return _operation_all(Intersection2d, Intersection3d, figures, fanout)
+
+
+def rewrite(figure: Figure, replace) -> Figure:
+    """Returns a copy of figure in which every subtree for which replace()
+    returns a figure is swapped for that figure. replace() returns None to
+    keep a subtree and look into its children. Only the figures above a
+    replaced subtree are copied, the rest of the tree is shared.
+    """
+    results = dict()
+    stack = [(figure, False)]
+    while stack:
+        f, ready = stack.pop()
+        if id(f) in results:
+            continue
+
+        if ready:
+            children = [results[id(c)] for c in f.children]
+            changed = any(a is not b for a, b in zip(children, f.children))
+            results[id(f)] = f._with_children(children) if changed else f
+            continue
+
+        replacement = replace(f)
+        if replacement is not None:
+            results[id(f)] = replacement
+        else:
+            stack.append((f, True))
+            stack.extend((c, False) for c in f.children if id(c) not in results)
+    return results[id(figure)]
+
+
+def _centered(figure) -> bool:
+    return figure.attributes.get('center') in (True, 'true')
+
+
+def _union(boxes):
+    """The union of boxes, unknown if any of them is."""
+    box = BoundingBox.EMPTY
+    for b in boxes:
+        if b is None:
+            return None
+        box = box.union(b)
+    return box
+
+
+def _first_empty(boxes):
+    """EMPTY if any of boxes is, since that makes an intersection empty,
+    otherwise unknown."""
+    if any(b is not None and b.empty for b in boxes):
+        return BoundingBox.EMPTY
+    return None
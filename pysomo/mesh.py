@@ -0,0 +1,299 @@
+'''
+An in-process mesh backend for models that do not need a CSG kernel: unions
+of primitives that do not touch each other. The primitives are tessellated
+with numpy, instances of the same primitive share one tessellation that is
+transformed for all of them at once, and the meshes are concatenated.
+
+numpy is optional: without it, fast_mesh() returns None and the exporter
+falls back to xcsg.
+'''
+from math import acos, ceil, pi
+
+from .bounds import BoundingBox, disjoint
+from .figures import Cone, Cube, Cuboid, Cylinder, Pattern, Polyhedron, Sphere, Union3d, _centered, _multiply
+from .meshio import read_obj, read_stl
+
+try:
+    import numpy
+except ImportError:  # numpy is optional
+    numpy = None
+
+
+# The formats the backend writes.
+FORMATS = ('obj', 'stl')
+
+# Number of segments around the circles of curved primitives.
+SEGMENTS = 32
+# The most segments a secant tolerance can ask for.
+MAX_SEGMENTS = 1024
+
+_IDENTITY = (
+    1, 0, 0, 0,
+    0, 1, 0, 0,
+    0, 0, 1, 0,
+    0, 0, 0, 1
+)
+
+
+class Mesh(object):
+    '''
+    A triangle mesh: an (N, 3) float64 array of vertices and an (M, 3) int64
+    array of counterclockwise triangles.
+    '''
+
+    def __init__(self, vertices, triangles):
+        self.vertices = vertices
+        self.triangles = triangles
+
+    def write(self, stream, file_type):
+        if file_type == 'obj':
+            self.write_obj(stream)
+        elif file_type == 'stl':
+            self.write_stl(stream)
+        else:
+            raise ValueError(f'The mesh backend cannot write {file_type}.')
+
+    def write_obj(self, stream):
+        numpy.savetxt(stream, self.vertices, fmt='v %.9g %.9g %.9g')
+        numpy.savetxt(stream, self.triangles + 1, fmt='f %d %d %d')
+
+    def write_stl(self, stream):
+        """Writes a binary STL."""
+        corners = self.vertices[self.triangles]
+        normals = numpy.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        lengths = numpy.linalg.norm(normals, axis=1, keepdims=True)
+        normals = numpy.divide(normals, lengths, out=numpy.zeros_like(normals), where=lengths > 0)
+
+        records = numpy.zeros(len(corners), dtype=[
+            ('normal', '<f4', (3,)),
+            ('corners', '<f4', (3, 3)),
+            ('attributes', '<u2')])
+        records['normal'] = normals
+        records['corners'] = corners
+        stream.write(b'pysomo'.ljust(80, b' '))
+        stream.write(numpy.array([len(records)], dtype='<u4').tobytes())
+        stream.write(records.tobytes())
+
+
+def read(data, file_type) -> Mesh:
+    """Reads an OBJ or STL mesh, such as one exported by xcsg. Polygons are
+    split into triangles."""
+    if file_type == 'obj':
+        vertices, faces = read_obj(data)
+    elif file_type == 'stl':
+        vertices, faces = read_stl(data, weld=False)
+    else:
+        raise ValueError(f'The mesh backend cannot read {file_type}.')
+    return Mesh(numpy.asarray(vertices, dtype=float).reshape(-1, 3), _triangles(faces))
+
+
+def merge(meshes) -> Mesh:
+    """Concatenates meshes that do not overlap into one mesh."""
+    meshes = list(meshes)
+    if not meshes:
+        return Mesh(numpy.zeros((0, 3)), numpy.zeros((0, 3), dtype=numpy.int64))
+    offsets = numpy.cumsum([0] + [len(m.vertices) for m in meshes[:-1]])
+    return Mesh(
+        numpy.concatenate([m.vertices for m in meshes]),
+        numpy.concatenate([m.triangles + offset for m, offset in zip(meshes, offsets)]))
+
+
+def fast_mesh(root, segments=SEGMENTS):
+    """Meshes the model without xcsg when it is a union of cuboids, cubes,
+    cylinders, cones, spheres and polyhedra with faces whose meshes do not
+    touch each other. Returns None for any other model, or without numpy.
+    Arguments:
+        root: the model
+        segments: the number of segments around curved primitives, when
+            neither the primitive nor the model has a secant tolerance
+    """
+    if numpy is None:
+        return None
+    instances = _instances(root.children)
+    if instances is None:
+        return None
+
+    # Group the instances of every distinct primitive, so that each one is
+    # tessellated once and transformed for all of its instances at once.
+    groups = dict()
+    for primitive, matrix in instances:
+        # The matrix of the primitive is in the instance matrix, so it is
+        # left out of the key.
+        key = (type(primitive), primitive._attributes, tuple(c.digest for c in primitive.children))
+        group = groups.setdefault(key, (primitive, []))
+        group[1].append(matrix)
+
+    parts = []
+    for primitive, matrices in groups.values():
+        mesh = _tessellate(primitive, segments, root.secant_tolerance)
+        if mesh is None:
+            return None
+        parts.append((mesh, _transform(mesh.vertices, matrices), _mirrored(matrices)))
+
+    boxes = [BoundingBox(tuple(v.min(axis=0)), tuple(v.max(axis=0)))
+             for _, vertices, _ in parts for v in vertices if len(v)]
+    if not disjoint(boxes, touching=False):
+        return None
+
+    vertices = []
+    triangles = []
+    offset = 0
+    for mesh, transformed, mirrored in parts:
+        n = len(mesh.vertices)
+        count = len(transformed)
+        tris = mesh.triangles[None, :, :] + (offset + n * numpy.arange(count))[:, None, None]
+        tris[mirrored] = tris[mirrored][:, :, ::-1]
+        vertices.append(transformed.reshape(-1, 3))
+        triangles.append(tris.reshape(-1, 3))
+        offset += n * count
+
+    if not vertices:
+        return None
+    return Mesh(numpy.concatenate(vertices), numpy.concatenate(triangles))
+
+
+def _instances(figures):
+    """Lists the primitives of a union with their accumulated matrix, or
+    returns None if the model is not only a union of primitives."""
+    instances = []
+    stack = [(f, _IDENTITY) for f in figures]
+    while stack:
+        figure, matrix = stack.pop()
+        if figure.matrix is not None:
+            matrix = _multiply(matrix, figure.matrix)
+        if isinstance(figure, Union3d):
+            stack.extend((c, matrix) for c in figure.children)
+        elif isinstance(figure, Pattern):
+            stack.extend((figure.base, _multiply(matrix, m)) for m in figure.instance_matrices())
+        elif isinstance(figure, _PRIMITIVES):
+            instances.append((figure, matrix))
+        else:
+            return None
+    return instances
+
+
+def _transform(vertices, matrices):
+    """Applies every matrix to the vertices. Returns an array of shape
+    (len(matrices), len(vertices), 3)."""
+    m = numpy.array(matrices, dtype=float).reshape(-1, 4, 4)
+    transformed = numpy.einsum('kij,nj->kni', m[:, :3, :3], vertices) + m[:, None, :3, 3]
+    w = m[:, 3, 3]
+    if numpy.any(w != 1):
+        transformed /= w[:, None, None]
+    return transformed
+
+
+def _mirrored(matrices):
+    """Whether each matrix mirrors space, which turns triangles inside out."""
+    m = numpy.array(matrices, dtype=float).reshape(-1, 4, 4)
+    return numpy.linalg.det(m[:, :3, :3]) * numpy.sign(m[:, 3, 3]) < 0
+
+
+def _box(dx, dy, dz, center):
+    corners = numpy.array([(x, y, z) for z in (0, dz) for y in (0, dy) for x in (0, dx)], dtype=float)
+    if center:
+        corners -= (dx / 2, dy / 2, dz / 2)
+    quads = [(0, 2, 3, 1), (4, 5, 7, 6), (0, 1, 5, 4), (2, 6, 7, 3), (0, 4, 6, 2), (1, 3, 7, 5)]
+    triangles = [t for a, b, c, d in quads for t in ((a, b, c), (a, c, d))]
+    return Mesh(corners, numpy.array(triangles, dtype=numpy.int64))
+
+
+def _frustum(r1, r2, h, center, segments):
+    """A cylinder, or a cone when r1 and r2 differ, along the z axis."""
+    angles = numpy.linspace(0, 2 * pi, segments, endpoint=False)
+    circle = numpy.stack([numpy.cos(angles), numpy.sin(angles)], axis=1)
+    z0 = -h / 2 if center else 0
+    bottom = numpy.column_stack([circle * r1, numpy.full(segments, z0)])
+    top = numpy.column_stack([circle * r2, numpy.full(segments, z0 + h)])
+    vertices = numpy.concatenate([bottom, top, [(0, 0, z0), (0, 0, z0 + h)]])
+
+    i = numpy.arange(segments)
+    j = (i + 1) % segments
+    t = i + segments
+    u = j + segments
+    bc = numpy.full(segments, 2 * segments)
+    tc = bc + 1
+    triangles = numpy.concatenate([
+        numpy.stack([i, j, u], axis=1),
+        numpy.stack([i, u, t], axis=1),
+        numpy.stack([bc, j, i], axis=1),
+        numpy.stack([tc, t, u], axis=1)])
+    return Mesh(vertices, triangles.astype(numpy.int64))
+
+
+def _sphere(r, segments):
+    rings = max(segments // 2, 2)
+    polar = numpy.linspace(0, pi, rings + 1)[1:-1]
+    angles = numpy.linspace(0, 2 * pi, segments, endpoint=False)
+    sin_p = numpy.sin(polar)[:, None]
+    ring_vertices = numpy.stack([
+        r * sin_p * numpy.cos(angles),
+        r * sin_p * numpy.sin(angles),
+        r * numpy.cos(polar)[:, None] * numpy.ones(segments)], axis=2).reshape(-1, 3)
+    north = len(ring_vertices)
+    south = north + 1
+    vertices = numpy.concatenate([ring_vertices, [(0, 0, r), (0, 0, -r)]])
+
+    i = numpy.arange(segments)
+    j = (i + 1) % segments
+    triangles = [
+        numpy.stack([numpy.full(segments, north), i, j], axis=1),
+        numpy.stack([numpy.full(segments, south), (rings - 2) * segments + j, (rings - 2) * segments + i], axis=1)]
+    for k in range(rings - 2):
+        a = k * segments + i
+        b = k * segments + j
+        c = (k + 1) * segments + j
+        d = (k + 1) * segments + i
+        triangles += [numpy.stack([a, d, c], axis=1), numpy.stack([a, c, b], axis=1)]
+    return Mesh(vertices, numpy.concatenate(triangles).astype(numpy.int64))
+
+
+def _polyhedron(polyhedron):
+    if len(polyhedron.children) < 2:
+        # Without faces, xcsg builds the mesh.
+        return None
+    vertices = numpy.asarray(polyhedron.children[0].vertices.data, dtype=float).reshape(-1, 3)
+    return Mesh(vertices, _triangles(polyhedron.children[1].faces))
+
+
+def _triangles(faces):
+    """The triangles of a FaceArray, splitting polygons into fans."""
+    if faces.offsets is None and faces.arity == 3:
+        return numpy.asarray(faces.indices, dtype=numpy.int64).reshape(-1, 3)
+    return numpy.array(
+        [(f[0], f[k], f[k + 1]) for f in faces for k in range(1, len(f) - 1)],
+        dtype=numpy.int64).reshape(-1, 3)
+
+
+def _tessellate(figure, segments, secant_tolerance=None):
+    """The mesh of a primitive, without its matrix. The secant tolerance of
+    the primitive, then the one given, decide the number of segments of
+    curved primitives."""
+    a = figure.attributes
+    secant_tolerance = a.get('secant_tolerance', secant_tolerance)
+    if isinstance(figure, Cuboid):
+        return _box(a['dx'], a['dy'], a['dz'], _centered(figure))
+    if isinstance(figure, Cube):
+        return _box(a['size'], a['size'], a['size'], _centered(figure))
+    if isinstance(figure, Cylinder):
+        n = _segments(a['r'], secant_tolerance, segments)
+        return _frustum(a['r'], a['r'], a['h'], _centered(figure), n)
+    if isinstance(figure, Cone):
+        n = _segments(max(a['r1'], a['r2']), secant_tolerance, segments)
+        return _frustum(a['r1'], a['r2'], a['h'], _centered(figure), n)
+    if isinstance(figure, Sphere):
+        return _sphere(a['r'], _segments(a['r'], secant_tolerance, segments))
+    return _polyhedron(figure)
+
+
+def _segments(r, secant_tolerance, segments) -> int:
+    """The number of segments around a circle of radius r that keeps the
+    segments within the secant tolerance of the circle."""
+    if secant_tolerance is None:
+        return segments
+    if secant_tolerance >= r:
+        return 3
+    return min(max(ceil(pi / acos(1 - secant_tolerance / r)), 3), MAX_SEGMENTS)
+
+
+_PRIMITIVES = (Cuboid, Cube, Cylinder, Cone, Sphere, Polyhedron)
@@ -0,0 +1,192 @@
+'''
+Readers of the mesh formats, for the exported meshes read back by the cache
+and for the meshes imported with Polyhedron.from_stl and from_obj.
+
+The readers take the whole file content as bytes or as an mmap and parse it
+in bulk. Binary STL records are interpreted in place, as packed float32,
+without copying the file. numpy is used when it is installed.
+'''
+import mmap
+import re
+import struct
+from array import array
+from itertools import accumulate, chain
+
+from .buffers import FaceArray
+
+try:
+    import numpy
+except ImportError:  # numpy is optional
+    numpy = None
+
+
+_STL_HEADER = 80
+_STL_COUNT = struct.Struct('<I')
+# A binary STL triangle: normal, 3 vertices and an attribute byte count.
+_STL_TRIANGLE = struct.Struct('<12x9f2x')
+_STL_RECORD = 50
+
+_STL_VERTEX = re.compile(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)')
+_OBJ_VERTEX = re.compile(rb'^[ \t]*v[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)', re.MULTILINE)
+_OBJ_FACE = re.compile(rb'^[ \t]*f[ \t]+([^\r\n]*)', re.MULTILINE)
+# The texture and normal indices of the v/vt/vn face vertices.
+_OBJ_SLASHES = re.compile(rb'/\S*')
+
+
+def map_file(path):
+    """Memory-maps a file for reading. Returns bytes for an empty file,
+    which cannot be mapped."""
+    with open(path, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return b''
+
+
+def read_stl(data, weld=True) -> tuple:
+    """Reads the vertices and faces of a binary or ASCII STL mesh.
+    Arguments:
+        data: the content of the file, as bytes or an mmap
+        weld: whether identical vertices are merged into one. STL stores
+            the 3 vertices of every triangle, so without welding no vertex
+            is shared between triangles.
+
+    Returns the flat float64 vertex buffer and the FaceArray of the mesh.
+    """
+    if _is_binary_stl(data):
+        vertices = _binary_stl_vertices(data)
+    elif data[:5].lower() == b'solid':
+        vertices = _floats(chain.from_iterable(_STL_VERTEX.findall(data)))
+    else:
+        raise ValueError('Not an STL file.')
+    if len(vertices) % 9:
+        raise ValueError('The STL file has an incomplete triangle.')
+
+    if weld:
+        return weld_vertices(vertices, _range(len(vertices) // 3))
+    return vertices, FaceArray(_range(len(vertices) // 3))
+
+
+def _is_binary_stl(data) -> bool:
+    # ASCII files start with 'solid', but so do the headers of some binary
+    # files: the size given by the triangle count decides.
+    if len(data) < _STL_HEADER + _STL_COUNT.size:
+        return False
+    count, = _STL_COUNT.unpack_from(data, _STL_HEADER)
+    return len(data) == _STL_HEADER + _STL_COUNT.size + count * _STL_RECORD
+
+
+def _binary_stl_vertices(data):
+    start = _STL_HEADER + _STL_COUNT.size
+    count, = _STL_COUNT.unpack_from(data, _STL_HEADER)
+    if numpy is not None:
+        record = numpy.dtype([('normal', '<f4', 3), ('vertices', '<f4', 9), ('attribute', '<u2')])
+        triangles = numpy.frombuffer(data, record, count, start)
+        return triangles['vertices'].astype(numpy.float64).reshape(-1)
+    view = memoryview(data)[start:]
+    try:
+        return array('d', chain.from_iterable(_STL_TRIANGLE.iter_unpack(view)))
+    finally:
+        view.release()
+
+
+def read_obj(data, weld=False) -> tuple:
+    """Reads the vertices and faces of a Wavefront OBJ mesh.
+    Arguments:
+        data: the content of the file, as bytes or an mmap
+        weld: whether identical vertices are merged into one
+
+    Returns the flat float64 vertex buffer and the FaceArray of the mesh.
+    """
+    vertices = _floats(chain.from_iterable(_OBJ_VERTEX.findall(data)))
+    text = b'\n'.join(_OBJ_FACE.findall(data))
+    if b'/' in text:
+        text = _OBJ_SLASHES.sub(b'', text)
+    faces = [f for f in map(bytes.split, text.split(b'\n')) if f]
+    indices = array('q', map(int, chain.from_iterable(faces)))
+
+    lowest = min(indices) if indices else 1
+    if lowest < 0:
+        # Negative indices count from the last vertex defined before the
+        # face, which only a line by line reading knows.
+        vertices, indices, offsets = _read_obj_lines(data)
+    elif lowest == 0:
+        raise ValueError('The OBJ file has a face with vertex index 0, indices start at 1.')
+    else:
+        # OBJ indices start at 1.
+        if numpy is not None:
+            indices = numpy.frombuffer(indices, dtype=numpy.int64) - 1
+        else:
+            indices = array('q', (i - 1 for i in indices))
+        offsets = array('q', [0])
+        offsets.extend(accumulate(map(len, faces)))
+
+    if all(b - a == 3 for a, b in zip(offsets, offsets[1:])):
+        faces = FaceArray(indices)
+    else:
+        faces = FaceArray(indices, offsets)
+    if weld:
+        return weld_vertices(vertices, faces)
+    return vertices, faces
+
+
+def _read_obj_lines(data) -> tuple:
+    vertices = array('d')
+    indices = array('q')
+    offsets = array('q', [0])
+
+    for line in bytes(data).splitlines():
+        line = line.strip()
+        if line.startswith(b'v '):
+            vertices.extend(float(v) for v in line.split()[1:4])
+        elif line.startswith(b'f '):
+            count = len(vertices) // 3
+            for token in line.split()[1:]:
+                i = int(token.split(b'/', 1)[0])
+                # OBJ indices start at 1, negative indices count from the end.
+                indices.append(i - 1 if i > 0 else count + i)
+            offsets.append(len(indices))
+
+    return vertices, indices, offsets
+
+
+def weld_vertices(vertices, faces) -> tuple:
+    """Merges identical vertices into one and renumbers the faces.
+    Arguments:
+        vertices: a flat float64 buffer of x, y, z values
+        faces: a FaceArray, or a flat buffer of triangle indices
+
+    Returns the flat float64 vertex buffer, with the vertices in the order
+    of their first occurrence, and the FaceArray of the mesh.
+    """
+    faces = FaceArray(faces)
+    if numpy is not None:
+        points = numpy.asarray(vertices, dtype=numpy.float64).reshape(-1, 3) + 0.0  # -0.0 is 0.0
+        keys = numpy.ascontiguousarray(points).view(numpy.dtype((numpy.void, 24))).reshape(-1)
+        _, first, inverse = numpy.unique(keys, return_index=True, return_inverse=True)
+        # Keep the vertices in the order of their first occurrence.
+        order = numpy.argsort(first)
+        rank = numpy.empty_like(order)
+        rank[order] = numpy.arange(len(order))
+        indices = rank[inverse.reshape(-1)][numpy.asarray(faces.indices, dtype=numpy.int64)]
+        return points[first[order]].reshape(-1), FaceArray(indices, faces.offsets, faces.arity)
+
+    index = dict()
+    welded = array('d')
+    remap = array('q')
+    for i in range(0, len(vertices), 3):
+        key = (vertices[i] + 0.0, vertices[i + 1] + 0.0, vertices[i + 2] + 0.0)
+        j = index.setdefault(key, len(index))
+        if j == len(welded) // 3:
+            welded.extend(key)
+        remap.append(j)
+    indices = array('q', (remap[i] for i in faces.indices))
+    return welded, FaceArray(indices, faces.offsets, faces.arity)
+
+
+def _floats(values):
+    return array('d', map(float, values))
+
+
+def _range(n):
+    return numpy.arange(n, dtype=numpy.int64) if numpy is not None else array('q', range(n))
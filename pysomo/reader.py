@@ -0,0 +1,133 @@
+import xml.etree.ElementTree as ET
+from array import array
+
+from .figures import Faces, Figure, Vertices2d, Vertices3d, _multiply, _restore
+from .snapshot import read_snapshot
+from .tree import Root
+
+
+class _Frame(object):
+    '''An element being loaded, until its end tag.'''
+    __slots__ = ('tag', 'attributes', 'children', 'values', 'offsets', 'matrix')
+
+    def __init__(self, tag, attributes):
+        self.tag = tag
+        self.attributes = attributes
+        self.children = []
+        self.matrix = None
+        if tag == 'faces':
+            self.values = array('q')
+            self.offsets = array('q', [0])
+        else:
+            self.values = array('d')
+
+
+def load_xcsg(source) -> Root:
+    """Loads an xcsg document back into a tree of figures.
+
+    The document is parsed incrementally and every element is dropped as
+    soon as its figure is built, so memory only grows with the model, not
+    with the xml. Vertices and faces go straight into flat buffers.
+    Arguments:
+        source: a path or a readable binary stream
+    """
+    frames = []
+    elements = []
+    figures = None
+    secant_tolerance = None
+
+    for event, element in ET.iterparse(source, events=('start', 'end')):
+        tag = element.tag
+        if event == 'start':
+            elements.append(element)
+            if tag not in ('vertex', 'fv', 'face', 'trow'):
+                if not frames and tag != 'xcsg':
+                    raise ValueError(f'Not an xcsg document: the root element is {tag}.')
+                frames.append(_Frame(tag, dict(element.attrib)))
+            continue
+
+        elements.pop()
+        frame = frames[-1]
+        if tag == 'vertex':
+            a = element.attrib
+            frame.values.append(float(a['x']))
+            frame.values.append(float(a['y']))
+            if 'z' in a:
+                frame.values.append(float(a['z']))
+        elif tag == 'fv':
+            frame.values.append(int(element.attrib['index']))
+        elif tag == 'face':
+            frame.offsets.append(len(frame.values))
+        elif tag == 'trow':
+            a = element.attrib
+            frame.values.extend(float(a[c]) for c in ('c0', 'c1', 'c2', 'c3'))
+        else:
+            frames.pop()
+            if tag == 'xcsg':
+                figures = frame.children
+                if 'secant_tolerance' in frame.attributes:
+                    secant_tolerance = _value(frame.attributes['secant_tolerance'])
+            elif tag == 'tmatrix':
+                if len(frame.values) != 16:
+                    raise ValueError('A tmatrix must have 4 rows of 4 values.')
+                parent = frames[-1]
+                # Each tmatrix applies after the ones read before it.
+                parent.matrix = frame.values if parent.matrix is None else _multiply(frame.values, parent.matrix)
+            else:
+                frames[-1].children.append(_figure(frame, frames[-1].tag))
+
+        # The figure holds everything it needs, drop the element and the
+        # finished siblings before it.
+        element.clear()
+        if elements:
+            elements[-1].clear()
+
+    if not figures:
+        raise ValueError('The xcsg document has no figures.')
+    root = Root(figures[0], secant_tolerance=secant_tolerance)
+    root.children = figures
+    return root
+
+
+def load_binary(path) -> Root:
+    """Loads a model saved with Root.save_binary(). The vertices and faces
+    are not copied but read from the memory-mapped file.
+    Arguments:
+        path: the snapshot file
+    """
+    figures, attributes = read_snapshot(path)
+    root = Root(figures[0], **attributes)
+    root.children = figures
+    return root
+
+
+def _figure(frame, parent_tag) -> Figure:
+    tag = frame.tag
+    if tag == 'vertices':
+        if parent_tag == 'polyhedron':
+            return Vertices3d(frame.values)
+        return Vertices2d(frame.values)
+    if tag == 'faces':
+        return Faces(frame.values, _offsets(frame.offsets))
+
+    attributes = [(a, _value(v)) for a, v in frame.attributes.items()]
+    return _restore(tag, attributes, frame.children, frame.matrix)
+
+
+def _offsets(offsets):
+    """The face offsets, or None when every face is a triangle."""
+    if len(offsets) - 1 == offsets[-1] // 3 and all(
+            offsets[i + 1] - offsets[i] == 3 for i in range(len(offsets) - 1)):
+        return None
+    return offsets
+
+
+def _value(text: str):
+    """Reads back an attribute written with str(): an int, a float or
+    text such as 'true'."""
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
@@ -0,0 +1,132 @@
+from collections import namedtuple
+
+from .bounds import disjoint
+from .figures import (
+    Difference2d, Difference3d, Intersection2d, Intersection3d, Union2d, Union3d)
+
+
+SimplifyReport = namedtuple('SimplifyReport', [
+    'dropped_subtrahends', 'empty_intersections', 'disjoint_unions', 'empty'])
+SimplifyReport.__doc__ = '''
+The result of Root.simplify().
+    dropped_subtrahends: the number of difference operands removed because
+        they do not overlap what they are subtracted from
+    empty_intersections: the number of intersections found to be empty
+    disjoint_unions: the unions of the simplified tree whose operands do not
+        overlap each other, which need no boolean evaluation
+    empty: whether the whole model was found to be empty; it is then left as
+        it was, since xcsg has no empty figure
+'''
+
+_DIFFERENCES = (Difference2d, Difference3d)
+_INTERSECTIONS = (Intersection2d, Intersection3d)
+_UNIONS = (Union2d, Union3d)
+
+# Marks a subtree found to be empty, for its parent to remove.
+_EMPTY = None
+
+
+class _Simplifier(object):
+    def __init__(self):
+        self.dropped_subtrahends = 0
+        self.empty_intersections = 0
+        self.disjoint_unions = []
+
+    def simplify(self, figure):
+        results = dict()
+        stack = [(figure, False)]
+        while stack:
+            f, ready = stack.pop()
+            if id(f) in results:
+                continue
+            if ready:
+                children = [results[id(c)] for c in f.children]
+                results[id(f)] = self._simplify(f, children)
+            else:
+                stack.append((f, True))
+                stack.extend((c, False) for c in f.children if id(c) not in results)
+        return results[id(figure)]
+
+    def _simplify(self, figure, children):
+        """Simplifies figure given its simplified children. Returns _EMPTY
+        when figure has no volume."""
+        if isinstance(figure, _DIFFERENCES):
+            return self._difference(figure, children)
+        if isinstance(figure, _INTERSECTIONS):
+            return self._intersection(figure, children)
+        if isinstance(figure, _UNIONS):
+            return self._union(figure, children)
+
+        # Other figures keep the original subtree of an empty child.
+        children = [c if c is not _EMPTY else o for c, o in zip(children, figure.children)]
+        return _rebuild(figure, children)
+
+    def _difference(self, figure, children):
+        base, subtrahends = children[0], children[1:]
+        if base is _EMPTY:
+            return _EMPTY
+
+        box = base.bounds
+        kept = [s for s in subtrahends
+                if s is not _EMPTY and (box is None or s.bounds is None or box.overlaps(s.bounds))]
+        self.dropped_subtrahends += len(subtrahends) - len(kept)
+        if not kept:
+            return _lift(figure, base)
+        return _rebuild(figure, [base] + kept)
+
+    def _intersection(self, figure, children):
+        if any(c is _EMPTY for c in children):
+            return _EMPTY
+
+        box = figure._local_bounds([c.bounds for c in children])
+        if box is not None and box.empty:
+            self.empty_intersections += 1
+            return _EMPTY
+        return _rebuild(figure, children)
+
+    def _union(self, figure, children):
+        kept = [c for c in children if c is not _EMPTY]
+        if not kept:
+            return _EMPTY
+        if len(kept) == 1:
+            return _lift(figure, kept[0])
+
+        union = _rebuild(figure, kept)
+        boxes = [c.bounds for c in kept]
+        if None not in boxes and disjoint(boxes):
+            self.disjoint_unions.append(union)
+        return union
+
+
+def _rebuild(figure, children):
+    if all(a is b for a, b in zip(children, figure.children)) and len(children) == len(figure.children):
+        return figure
+    return figure._with_children(children)
+
+
+def _lift(figure, child):
+    """Replaces figure by its only remaining operand."""
+    if figure.matrix is None:
+        return child
+    return child._transform(figure.matrix)
+
+
+def simplify(figures) -> tuple:
+    """Simplifies figures with their bounding boxes. Returns the simplified
+    figures and a SimplifyReport."""
+    simplifier = _Simplifier()
+    simplified = []
+    empty = False
+    for f in figures:
+        s = simplifier.simplify(f)
+        if s is _EMPTY:
+            s = f
+            empty = True
+        simplified.append(s)
+
+    report = SimplifyReport(
+        simplifier.dropped_subtrahends,
+        simplifier.empty_intersections,
+        simplifier.disjoint_unions,
+        empty)
+    return simplified, report
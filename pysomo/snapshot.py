@@ -0,0 +1,256 @@
+'''
+A compact binary format for figure trees, to pass models between processes
+without going through xcsg text.
+
+Layout, little-endian:
+    header: the magic bytes, the number of strings, nodes, roots and model
+        attributes, and the offset of the buffer section
+    strings: every type name, attribute name and text value, once each,
+        as a u16 length followed by utf8
+    nodes: the distinct subtrees, children first. A node is its type
+        string, flags, attributes as (name string, kind, 8 bytes) with
+        numbers stored as float64 or int64, child node indexes, then its
+        matrix as 16 float64 and its vertex, face or pattern matrix buffer
+        references
+    roots: the node indexes of the top-level figures
+    model attributes: the settings of the Root, such as its secant
+        tolerance and number format, stored like the node attributes
+    buffers: raw float64 vertices and pattern matrices, int64 face indices
+        and offsets, 8-byte aligned
+
+Subtrees with the same digest are stored once and shared again when the
+snapshot is loaded. Buffers are not copied on load: the vertices and faces
+are views over the memory-mapped file.
+'''
+import mmap
+import struct
+from array import array
+
+from .buffers import _as_bytes
+from .figures import Faces, Pattern, Vertices2d, Vertices3d, _restore
+
+
+MAGIC = b'PYSOMO\x00\x02'
+
+_HEADER = struct.Struct('<8sIIIIQ')
+_LENGTH = struct.Struct('<H')
+_NODE = struct.Struct('<IBHI')
+_ATTRIBUTE = struct.Struct('<IB8s')
+_MATRIX = struct.Struct('<16d')
+_VERTICES = struct.Struct('<BQQ')
+_FACES = struct.Struct('<QQqQB')
+_PATTERN = struct.Struct('<QQ')
+_INDEX = struct.Struct('<I')
+
+# Node flags.
+_MATRIX_FLAG = 1
+_CACHEABLE_FLAG = 2
+_VERTICES_FLAG = 4
+_FACES_FLAG = 8
+_PATTERN_FLAG = 16
+
+# Attribute kinds.
+_FLOAT, _INT, _TEXT, _BOOL = range(4)
+
+
+class _Strings(object):
+    def __init__(self):
+        self.indexes = dict()
+
+    def __call__(self, text) -> int:
+        return self.indexes.setdefault(text, len(self.indexes))
+
+
+def write_snapshot(figures, stream, attributes=None):
+    """Writes figures as a binary snapshot to a writable binary stream.
+    Arguments:
+        figures: the top-level figures
+        stream: the binary stream
+        attributes: the settings of the model, as a dict of numbers and
+            strings by name
+    """
+    attributes = attributes or dict()
+    strings = _Strings()
+    nodes = bytearray()
+    buffers = []
+    size = 0
+    indexes = dict()
+
+    def add_buffer(data) -> int:
+        nonlocal size
+        offset = size
+        data = _as_bytes(data)
+        buffers.append(data)
+        size += len(data)
+        padding = -size % 8
+        if padding:
+            buffers.append(bytes(padding))
+            size += padding
+        return offset
+
+    stack = [(f, False) for f in reversed(figures)]
+    while stack:
+        figure, ready = stack.pop()
+        if figure.digest in indexes:
+            continue
+        if not ready:
+            stack.append((figure, True))
+            stack.extend((c, False) for c in reversed(figure.children))
+            continue
+
+        flags = 0
+        if figure.matrix is not None:
+            flags |= _MATRIX_FLAG
+        if figure.cacheable:
+            flags |= _CACHEABLE_FLAG
+        if isinstance(figure, (Vertices2d, Vertices3d)):
+            flags |= _VERTICES_FLAG
+        elif isinstance(figure, Faces):
+            flags |= _FACES_FLAG
+        elif isinstance(figure, Pattern):
+            flags |= _PATTERN_FLAG
+
+        nodes += _NODE.pack(strings(figure.type_), flags, len(figure._attributes), len(figure.children))
+        for name, value in figure._attributes:
+            nodes += _ATTRIBUTE.pack(strings(name), *_pack(value, strings))
+        for c in figure.children:
+            nodes += _INDEX.pack(indexes[c.digest])
+        if figure.matrix is not None:
+            nodes += _MATRIX.pack(*figure.matrix)
+        if flags & _VERTICES_FLAG:
+            v = figure.vertices
+            nodes += _VERTICES.pack(v.dimension, add_buffer(v.data), len(v.data))
+        elif flags & _FACES_FLAG:
+            f = figure.faces
+            if f.offsets is None:
+                nodes += _FACES.pack(add_buffer(f.indices), len(f.indices), -1, 0, f.arity)
+            else:
+                nodes += _FACES.pack(add_buffer(f.indices), len(f.indices), add_buffer(f.offsets), len(f.offsets), 0)
+        elif flags & _PATTERN_FLAG:
+            nodes += _PATTERN.pack(add_buffer(figure.matrices), len(figure.matrices))
+
+        indexes[figure.digest] = len(indexes)
+
+    roots = b''.join(_INDEX.pack(indexes[f.digest]) for f in figures)
+    for name, value in attributes.items():
+        roots += _ATTRIBUTE.pack(strings(name), *_pack(value, strings))
+    table = bytearray()
+    for text in strings.indexes:
+        encoded = text.encode('utf8')
+        table += _LENGTH.pack(len(encoded)) + encoded
+
+    start = _HEADER.size + len(table) + len(nodes) + len(roots)
+    padding = -start % 8
+    stream.write(_HEADER.pack(
+        MAGIC, len(strings.indexes), len(indexes), len(figures), len(attributes), start + padding))
+    stream.write(table)
+    stream.write(nodes)
+    stream.write(roots)
+    stream.write(bytes(padding))
+    for data in buffers:
+        stream.write(data)
+
+
+def read_snapshot(path) -> tuple:
+    """Reads the figures of a binary snapshot. The file is memory-mapped and
+    stays mapped as long as the vertices and faces of the figures are in
+    use. Returns the top-level figures and the dict of model attributes."""
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ValueError('Not a pysomo snapshot: the file is empty.')
+
+    view = memoryview(data)
+    if len(data) < _HEADER.size:
+        raise ValueError('Not a pysomo snapshot.')
+    magic, string_count, node_count, root_count, setting_count, start = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not a pysomo snapshot.')
+    position = _HEADER.size
+
+    strings = []
+    for _ in range(string_count):
+        length, = _LENGTH.unpack_from(data, position)
+        position += _LENGTH.size
+        strings.append(bytes(view[position:position + length]).decode('utf8'))
+        position += length
+
+    def buffer(offset, count, typecode):
+        offset += start
+        return view[offset:offset + 8 * count].cast(typecode)
+
+    nodes = []
+    for _ in range(node_count):
+        type_, flags, attribute_count, child_count = _NODE.unpack_from(data, position)
+        position += _NODE.size
+
+        attributes = []
+        for _ in range(attribute_count):
+            name, kind, value = _ATTRIBUTE.unpack_from(data, position)
+            position += _ATTRIBUTE.size
+            attributes.append((strings[name], _unpack(kind, value, strings)))
+
+        children = []
+        for _ in range(child_count):
+            children.append(nodes[_INDEX.unpack_from(data, position)[0]])
+            position += _INDEX.size
+
+        matrix = None
+        if flags & _MATRIX_FLAG:
+            matrix = array('d', _MATRIX.unpack_from(data, position))
+            position += _MATRIX.size
+
+        if flags & _VERTICES_FLAG:
+            dimension, offset, count = _VERTICES.unpack_from(data, position)
+            position += _VERTICES.size
+            vertices = buffer(offset, count, 'd')
+            figure = Vertices3d(vertices) if dimension == 3 else Vertices2d(vertices)
+        elif flags & _FACES_FLAG:
+            offset, count, offsets, offset_count, arity = _FACES.unpack_from(data, position)
+            position += _FACES.size
+            indices = buffer(offset, count, 'q')
+            if offsets >= 0:
+                figure = Faces(indices, buffer(offsets, offset_count, 'q'))
+            else:
+                figure = Faces(indices, arity=arity)
+        elif flags & _PATTERN_FLAG:
+            offset, count = _PATTERN.unpack_from(data, position)
+            position += _PATTERN.size
+            figure = Pattern(children[0], buffer(offset, count, 'd'))
+            figure.matrix = matrix
+        else:
+            figure = _restore(strings[type_], attributes, children, matrix)
+        figure.cacheable = bool(flags & _CACHEABLE_FLAG)
+        nodes.append(figure)
+
+    roots = []
+    for _ in range(root_count):
+        roots.append(nodes[_INDEX.unpack_from(data, position)[0]])
+        position += _INDEX.size
+    attributes = dict()
+    for _ in range(setting_count):
+        name, kind, value = _ATTRIBUTE.unpack_from(data, position)
+        position += _ATTRIBUTE.size
+        attributes[strings[name]] = _unpack(kind, value, strings)
+    return roots, attributes
+
+
+def _pack(value, strings) -> tuple:
+    if isinstance(value, bool):
+        return _BOOL, struct.pack('<q', value)
+    if isinstance(value, int) and -1 << 63 <= value < 1 << 63:
+        return _INT, struct.pack('<q', value)
+    if isinstance(value, float):
+        return _FLOAT, struct.pack('<d', value)
+    return _TEXT, struct.pack('<Q', strings(str(value)))
+
+
+def _unpack(kind, value, strings):
+    if kind == _FLOAT:
+        return struct.unpack('<d', value)[0]
+    if kind == _INT:
+        return struct.unpack('<q', value)[0]
+    if kind == _BOOL:
+        return bool(struct.unpack('<q', value)[0])
+    return strings[struct.unpack('<Q', value)[0]]
@@ -0,0 +1,155 @@
+from collections import namedtuple
+
+from .figures import Faces, Pattern, Vertices2d, Vertices3d
+
+
+TreeStats = namedtuple('TreeStats', [
+    'nodes', 'types', 'depth', 'vertices', 'faces', 'transforms', 'transform_depth', 'cost', 'warnings'])
+TreeStats.__doc__ = '''
+The result of Root.stats(). Counts are those of the xcsg document: every
+reuse of a subtree and every instance of a pattern counts.
+    nodes: the number of figures
+    types: the number of figures of every xcsg type
+    depth: the number of levels of the tree
+    vertices: the number of polygon and polyhedron vertices
+    faces: the number of polyhedron faces
+    transforms: the number of figures placed by a transform, counting the
+        instances of patterns
+    transform_depth: the largest number of transforms stacked from the top
+        of the tree down to a figure
+    cost: a rough estimate of the work of xcsg, in arbitrary units, to
+        compare models with each other, see COSTS
+    warnings: the reasons the model may be very slow or fail to export
+'''
+
+# The weight of every operation in the cost estimate. An operation costs its
+# weight times the estimated number of vertices it works on.
+COSTS = {
+    'minkowski3d': 20,
+    'minkowski2d': 10,
+    'hull3d': 4,
+    'hull2d': 2,
+    'sweep': 10,
+    'offset2d': 8,
+    'rotate_extrude': 4,
+    'transform_extrude': 4,
+    'difference3d': 2,
+    'intersection3d': 2,
+}
+
+# The estimated vertices of the mesh of every primitive.
+PRIMITIVE_VERTICES = {
+    'sphere': 512,
+    'cylinder': 64,
+    'cone': 64,
+    'circle': 32,
+    'cube': 8,
+    'cuboid': 8,
+    'square': 4,
+    'rectangle': 4,
+}
+
+# The depth above which the tree is reported as too deep.
+MAX_DEPTH = 200
+# The estimated vertices above which a minkowski sum is reported.
+MAX_MINKOWSKI_VERTICES = 10 ** 6
+
+# The figures that are data of their parent rather than geometry.
+_DATA = frozenset(('vertices', 'vertex', 'faces', 'face', 'fv', 'tmatrix', 'trow'))
+# The data that has no vertices of its own.
+_NO_VERTICES = frozenset(('faces', 'face', 'fv', 'tmatrix', 'trow'))
+_MINKOWSKI = frozenset(('minkowski2d', 'minkowski3d'))
+# Operations whose result has about as many vertices as all their operands
+# times a number of segments.
+_REVOLVED = frozenset(('rotate_extrude', 'sweep'))
+_SEGMENTS = 32
+
+
+def tree_stats(figures) -> TreeStats:
+    """Computes the TreeStats of figures, without recursion."""
+    # Every distinct figure once, children before their parents.
+    order = []
+    visited = set()
+    stack = [(f, False) for f in reversed(figures)]
+    while stack:
+        figure, ready = stack.pop()
+        if ready:
+            order.append(figure)
+        elif id(figure) not in visited:
+            visited.add(id(figure))
+            stack.append((figure, True))
+            stack.extend((c, False) for c in reversed(figure.children) if id(c) not in visited)
+
+    depths = dict()
+    transform_depths = dict()
+    sizes = dict()
+    warnings = []
+    for figure in order:
+        children = figure.children
+        depths[id(figure)] = 1 + max((depths[id(c)] for c in children), default=0)
+        stacked = (figure.matrix is not None) + isinstance(figure, Pattern)
+        transform_depths[id(figure)] = stacked + max((transform_depths[id(c)] for c in children), default=0)
+        sizes[id(figure)] = size = _vertices(figure, [sizes[id(c)] for c in children])
+        if figure.type_ in _MINKOWSKI and size > MAX_MINKOWSKI_VERTICES:
+            operands = ' and '.join(str(sizes[id(c)]) for c in children)
+            warnings.append(f'{figure.type_} of figures of about {operands} vertices.')
+
+    # How many times every figure appears in the document, parents first.
+    counts = dict.fromkeys(visited, 0)
+    for f in figures:
+        counts[id(f)] += 1
+    for figure in reversed(order):
+        count = counts[id(figure)] * (len(figure) if isinstance(figure, Pattern) else 1)
+        for c in figure.children:
+            counts[id(c)] += count
+
+    nodes = vertices = faces = transforms = 0
+    cost = 0.0
+    types = dict()
+    for figure in order:
+        count = counts[id(figure)]
+        nodes += count
+        types[figure.type_] = types.get(figure.type_, 0) + count
+        transforms += count * (figure.matrix is not None)
+        if isinstance(figure, Pattern):
+            transforms += count * len(figure)
+        if isinstance(figure, (Vertices2d, Vertices3d)):
+            vertices += count * len(figure.vertices)
+        elif isinstance(figure, Faces):
+            faces += count * len(figure.faces)
+        elif figure.type_ == 'vertex':
+            vertices += count
+        elif figure.type_ == 'face':
+            faces += count
+        elif figure.type_ not in _DATA:
+            cost += count * COSTS.get(figure.type_, 1) * sizes[id(figure)]
+
+    depth = max((depths[id(f)] for f in figures), default=0)
+    if depth > MAX_DEPTH:
+        warnings.append(
+            f'The tree is {depth} levels deep. Operations nested this deep, such as unions built one figure at '
+            'a time, are slow to evaluate: build them with union_all().')
+    return TreeStats(
+        nodes, types, depth, vertices, faces, transforms,
+        max((transform_depths[id(f)] for f in figures), default=0), cost, warnings)
+
+
+def _vertices(figure, sizes) -> int:
+    """A rough estimate of the vertices of the mesh of figure, given the
+    estimates of its children."""
+    if isinstance(figure, (Vertices2d, Vertices3d)):
+        return len(figure.vertices)
+    if figure.type_ in _NO_VERTICES:
+        return 0
+    if not sizes:
+        return PRIMITIVE_VERTICES.get(figure.type_, 1)
+    if isinstance(figure, Pattern):
+        return sizes[0] * len(figure)
+    if figure.type_ in _MINKOWSKI:
+        product = 1
+        for s in sizes:
+            product *= s
+        return product
+    if figure.type_ in _REVOLVED:
+        return sizes[0] * _SEGMENTS
+    return sum(sizes)
@@ -1,19 +1,245 @@
+import copy
+import io
+import os
+import threading
 import xml.etree.ElementTree as ET
+from collections import namedtuple
 
-from .figures import Figure
+from .bake import BakeReport, bake_transforms
+from .buffers import NumberFormat
+from .figures import Figure, union_all
+from .simplify import SimplifyReport, simplify
+from .snapshot import write_snapshot
+from .stats import TreeStats, tree_stats
+from .writer import write_xcsg
+
+
+DedupeReport = namedtuple('DedupeReport', ['nodes', 'unique', 'duplicates'])
+DedupeReport.__doc__ = '''
+The result of Root.dedupe().
+    nodes: the number of nodes in the tree, counting every reuse of a subtree
+    unique: the number of distinct subtrees
+    duplicates: the number of references to a subtree identical to one seen
+        before, which now all point to the same figure
+'''
 
 
 class Root(object):
-    def __init__(self, child: Figure):
+    def __init__(self, child: Figure, precision=None, grid=None, secant_tolerance=None):
+        """
+        Arguments:
+            child: the model
+            precision: the number of significant digits of the floats in the
+                xcsg, all the digits needed to read them back by default
+            grid: a step such as 1e-6 that the floats in the xcsg are
+                rounded to a multiple of, see NumberFormat
+            secant_tolerance: the largest distance between the curved
+                surfaces of the model and the facets that approximate them,
+                xcsg's default when omitted. Figures can override it, see
+                Solid.resolution(), and the exporter can replace it with a
+                profile, see Exporter.
+        """
         self.children = [child]
+        self.numbers = NumberFormat(precision, grid)
+        self.secant_tolerance = secant_tolerance
+        # The named parts of an assembly, see Root.assembly().
+        self.parts = None
+
+    @staticmethod
+    def assembly(parts: dict, precision=None, grid=None, secant_tolerance=None) -> 'Root':
+        """A model made of named top-level parts that do not overlap, such
+        as the components of a product. The model is the union of the parts.
+        Exporter.export_assembly() exports every part separately and only
+        exports again the parts that changed since the previous export.
+        Arguments:
+            parts: the solids of the parts, by name
+            precision, grid, secant_tolerance: see Root
+        """
+        root = Root(union_all(parts.values()), precision, grid, secant_tolerance)
+        root.parts = dict(parts)
+        return root
+
+    def set_part(self, name: str, figure: Figure):
+        """Adds or replaces a part of an assembly."""
+        self._check_assembly()
+        self.parts[name] = figure
+        self.children = [union_all(self.parts.values())]
+
+    def remove_part(self, name: str):
+        """Removes a part of an assembly."""
+        self._check_assembly()
+        del self.parts[name]
+        self.children = [union_all(self.parts.values())]
+
+    def part_roots(self) -> dict:
+        """The model of every part of an assembly, as a Root with the
+        number format and resolution of the assembly."""
+        self._check_assembly()
+        roots = dict()
+        for name, figure in self.parts.items():
+            root = Root(figure, secant_tolerance=self.secant_tolerance)
+            root.numbers = self.numbers
+            roots[name] = root
+        return roots
+
+    def with_secant_tolerance(self, secant_tolerance) -> 'Root':
+        """Returns a copy of the model with another resolution. The figures
+        are shared."""
+        root = copy.copy(self)
+        root.secant_tolerance = secant_tolerance
+        return root
+
+    @property
+    def attributes(self) -> dict:
+        """The attributes of the xcsg element."""
+        attributes = {'version': '1.0'}
+        if self.secant_tolerance is not None:
+            attributes['secant_tolerance'] = self.secant_tolerance
+        return attributes
+
+    def _settings(self) -> dict:
+        """The arguments of Root that are set, to store with the figures."""
+        settings = {
+            'precision': self.numbers.precision,
+            'grid': self.numbers.grid,
+            'secant_tolerance': self.secant_tolerance,
+        }
+        return {name: value for name, value in settings.items() if value is not None}
+
+    def _check_assembly(self):
+        if self.parts is None:
+            raise ValueError('The model is not an assembly, see Root.assembly().')
 
     def to_xcsg(self) -> ET.Element:
         """Recursively builds the xml as xcsg.
         """
-        e = ET.Element('xcsg', {'version': '1.0'})
+        e = ET.Element('xcsg', {a: self.numbers.attribute(v, a) for a, v in self.attributes.items()})
         for c in self.children:
-            c.__sub_element__(e)
+            c.__sub_element__(e, self.numbers)
         return e
 
+    def write_xcsg(self, stream) -> int:
+        """Streams the xcsg document to a writable binary stream, element by
+        element, without building the xml tree in memory.
+        Arguments:
+            stream: a binary file, a socket file or any object with a write
+                method
+
+        Returns the number of figures written.
+        """
+        return write_xcsg(self.children, stream, self.attributes, self.numbers)
+
     def dump_xcsg(self) -> str:
-        return ET.tostring(self.to_xcsg(), encoding='utf8').decode('utf8')
+        stream = io.BytesIO()
+        self.write_xcsg(stream)
+        return stream.getvalue().decode('utf8')
+
+    def save_binary(self, path):
+        """Saves the model as a compact binary snapshot, see
+        pysomo.snapshot. Load it back with pysomo.load_binary().
+
+        The file is replaced rather than overwritten, so snapshots already
+        loaded from it stay valid.
+        """
+        temp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp, 'wb') as stream:
+            write_snapshot(self.children, stream, self._settings())
+        os.replace(temp, path)
+
+    def dedupe(self) -> DedupeReport:
+        """Finds identical subtrees and makes them share a single figure.
+
+        Every reference to a subtree that is structurally equal to one seen
+        before is replaced by that first figure. The xcsg output does not
+        change, but later passes (caching, simplification, export) only have
+        to look at each distinct subtree once. The figures are not modified:
+        the ones above a replaced subtree are copied.
+        """
+        canonical = dict()
+        results = dict()
+        # Children first, so every figure is rebuilt with the shared copies
+        # of its children.
+        stack = [(f, False) for f in reversed(self.children)]
+        while stack:
+            figure, ready = stack.pop()
+            if id(figure) in results:
+                continue
+            if ready:
+                children = [results[id(c)] for c in figure.children]
+                rebuilt = figure
+                if any(a is not b for a, b in zip(children, figure.children)):
+                    rebuilt = figure._with_children(children)
+                results[id(figure)] = canonical.setdefault(rebuilt.digest, rebuilt)
+            else:
+                stack.append((figure, True))
+                stack.extend((c, False) for c in reversed(figure.children) if id(c) not in results)
+        nodes = _size(self.children)
+        self.children = [results[id(f)] for f in self.children]
+
+        # Every reference to a figure seen before is a duplicate.
+        seen = set()
+        duplicates = 0
+        stack = [self.children]
+        while stack:
+            for c in stack.pop():
+                if id(c) in seen:
+                    duplicates += 1
+                else:
+                    seen.add(id(c))
+                    stack.append(c.children)
+
+        return DedupeReport(nodes, len(seen), duplicates)
+
+    def bake_transforms(self) -> BakeReport:
+        """Applies the transform of every polyhedron and polygon to its
+        vertices, so they are written without a tmatrix and xcsg does not
+        transform them again. Mirroring transforms reverse the faces, so
+        they keep pointing outwards.
+
+        This is opt-in: every placement of a shared polyhedron gets its own
+        vertex buffer. The parts of an assembly are baked too.
+        """
+        if self.parts is None:
+            self.children, report = bake_transforms(self.children)
+            return report
+        names = list(self.parts)
+        parts, report = bake_transforms([self.parts[n] for n in names])
+        self.parts = dict(zip(names, parts))
+        self.children = [union_all(parts)]
+        return report
+
+    def stats(self) -> TreeStats:
+        """Measures the model before it goes to xcsg: the figures by type,
+        the depth of the tree, the vertices and faces, the transforms and an
+        estimate of the cost of evaluating it, with warnings about what may
+        make xcsg very slow. See TreeStats.
+        """
+        return tree_stats(self.children)
+
+    def simplify(self) -> SimplifyReport:
+        """Simplifies the model with the bounding boxes of its figures,
+        before it goes to xcsg.
+
+        Difference operands that do not overlap what they are subtracted
+        from are dropped, intersections of operands that do not overlap are
+        removed as empty, and unions of operands that do not overlap are
+        reported. Only the figures that change are copied.
+        """
+        self.children, report = simplify(self.children)
+        return report
+
+
+def _size(figures) -> int:
+    """Number of nodes under figures, counting every reuse of a subtree."""
+    sizes = dict()
+    stack = [(f, False) for f in figures]
+    while stack:
+        figure, ready = stack.pop()
+        if id(figure) in sizes:
+            continue
+        if ready:
+            sizes[id(figure)] = 1 + sum(sizes[id(c)] for c in figure.children)
+        else:
+            stack.append((figure, True))
+            stack.extend((c, False) for c in figure.children)
+    return sum(sizes[id(f)] for f in figures)
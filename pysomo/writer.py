@@ -0,0 +1,171 @@
+import io
+
+from .buffers import CHUNK, NumberFormat
+from .figures import Figure, Pattern
+
+
+HEADER = "<?xml version='1.0' encoding='utf8'?>\n"
+
+_ESCAPES = {
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    '\n': '&#10;',
+    '\r': '&#13;',
+    '\t': '&#09;'
+}
+
+
+def _escape(value: str) -> str:
+    if any(c in value for c in _ESCAPES):
+        return ''.join(_ESCAPES.get(c, c) for c in value)
+    return value
+
+
+def _start_tag(figure: Figure, numbers: NumberFormat) -> str:
+    attributes = figure._attributes
+    if not attributes:
+        return f'<{figure.type_}'
+    attr = ''.join(f' {a}="{_escape(numbers.attribute(v, a))}"' for a, v in attributes)
+    return f'<{figure.type_}{attr}'
+
+
+_TMATRIX = '<tmatrix>' + '<trow c0="%s" c1="%s" c2="%s" c3="%s" />' * 4 + '</tmatrix>'
+
+
+def _tmatrix(values, numbers: NumberFormat) -> str:
+    values = numbers.format_matrix(values)
+    rows = ''.join(
+        f'<trow c0="{values[i]}" c1="{values[i + 1]}" c2="{values[i + 2]}" c3="{values[i + 3]}" />'
+        for i in range(0, 16, 4))
+    return f'<tmatrix>{rows}</tmatrix>'
+
+
+class XcsgWriter(object):
+    '''
+    Writes figures as xcsg straight to a binary stream, without building an
+    element tree. Elements are emitted in document order from an explicit
+    stack, so deep trees do not hit the recursion limit, and the output is
+    flushed every `chunk_size` characters so memory stays flat regardless of
+    the size of the model.
+    '''
+
+    def __init__(self, stream, chunk_size=1 << 16, numbers=NumberFormat.DEFAULT):
+        """
+        Arguments:
+            stream: the binary stream written to
+            chunk_size: the number of characters buffered between writes
+            numbers: the NumberFormat of the floats
+        """
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.numbers = numbers
+        self._parts = []
+        self._size = 0
+        # The number of figures written so far, counting every reuse of a
+        # subtree.
+        self.figures = 0
+
+    def write(self, text: str):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._parts:
+            self.stream.write(''.join(self._parts).encode('utf8'))
+            self._parts = []
+            self._size = 0
+
+    def write_document(self, figures, attributes=None):
+        """Writes a complete xcsg document with figures as the top-level
+        elements.
+        Arguments:
+            figures: the top-level figures
+            attributes: the attributes of the xcsg element
+        """
+        attributes = attributes if attributes else {'version': '1.0'}
+        self.write(HEADER)
+        self.write(_start_tag(Figure('xcsg', attributes), self.numbers) + '>')
+        for f in figures:
+            self.write_figure(f)
+        self.write('</xcsg>')
+        self.flush()
+
+    def write_figure(self, figure: Figure):
+        write = self.write
+        numbers = self.numbers
+        stack = [(None, iter((figure,)))]
+        while stack:
+            parent, children = stack[-1]
+            child = next(children, None)
+
+            if child is None:
+                stack.pop()
+                if parent is not None:
+                    if parent.matrix is not None:
+                        write(_tmatrix(parent.matrix, numbers))
+                    write(f'</{parent.type_}>')
+                continue
+
+            if isinstance(child, Pattern):
+                self.write_pattern(child)
+                continue
+
+            self.figures += 1
+            if child.bulk:
+                for chunk in child.xcsg_chunks(numbers):
+                    write(chunk)
+                continue
+
+            start = _start_tag(child, numbers)
+            if child.children or child.matrix is not None:
+                write(start + '>')
+                stack.append((child, iter(child.children)))
+            else:
+                write(start + ' />')
+
+    def write_pattern(self, pattern: Pattern):
+        """Writes a pattern as a union of instances. The solid is serialized
+        once, then the matrices of the instances are formatted into copies
+        of it a chunk at a time, without a figure per instance."""
+        numbers = self.numbers
+        stream = io.BytesIO()
+        writer = XcsgWriter(stream, numbers=numbers)
+        writer.write_figure(pattern.base)
+        writer.flush()
+        self.figures += 1 + writer.figures * len(pattern)
+
+        text = stream.getvalue().decode('utf8')
+        close = f'</{pattern.base.type_}>'
+        head = text[:-3] + '>' if text.endswith(' />') else text[:-len(close)]
+        template = head.replace('%', '%%') + _TMATRIX + close
+
+        # As many instances per chunk as fit in chunk_size, at least one.
+        size = 16 * max(1, min(CHUNK, self.chunk_size // len(template)))
+
+        self.write(_start_tag(pattern, numbers) + '>')
+        matrices = pattern.matrices
+        for i in range(0, len(matrices), size):
+            values = numbers.format_matrix(matrices[i:i + size])
+            self.write(template * (len(values) // 16) % tuple(values))
+        if pattern.matrix is not None:
+            self.write(_tmatrix(pattern.matrix, numbers))
+        self.write(f'</{pattern.type_}>')
+
+
+def write_xcsg(figures, stream, attributes=None, numbers=NumberFormat.DEFAULT) -> int:
+    """Writes figures as an xcsg document to a writable binary stream.
+    Arguments:
+        figures: the top-level figures
+        stream: a binary file, a socket file or any object with a write method
+        attributes: the attributes of the xcsg element
+        numbers: the NumberFormat of the floats
+
+    Returns the number of figures written.
+    """
+    writer = XcsgWriter(stream, numbers=numbers)
+    writer.write_document(figures, attributes)
+    return writer.figures
@@ -0,0 +1,18 @@
+from benchmarks import compare, run
+
+
+def test_benchmarks(tmp_path):
+    document = run.run(sizes=[10], repeat=1)
+    assert {r['model'] for r in document['results']} == set(run.MODELS)
+    for result in document['results']:
+        assert result['output_bytes'] > 0
+        assert result['peak_bytes'] > 0
+        assert result['export_s'] > 0
+
+    lines, regressions = compare.compare(document, document)
+    assert len(lines) == 1 + len(document['results'])
+    assert not regressions
+
+    output = tmp_path / 'results.json'
+    run.main(['--models', 'stairs', '--sizes', '5', '--repeat', '1', '--no-export', '--output', str(output)])
+    assert compare.main([str(output), str(output)]) == 0
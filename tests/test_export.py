@@ -0,0 +1,280 @@
+import pytest
+
+import pysomo as csg
+from benchmarks.run import STUB
+from pysomo.cache import ExportCache
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('XCSG_STUB_LOG', str(tmp_path / 'xcsg.log'))
+    return tmp_path
+
+
+def invocations(workdir):
+    log = workdir / 'xcsg.log'
+    return log.read_text().splitlines() if log.exists() else []
+
+
+def test_export(workdir):
+    csg.Exporter('cube.obj', executable=STUB).export_obj(csg.Root(csg.Cube(1)))
+
+    assert (workdir / 'cube.obj').read_text().startswith('# ')
+    assert len(invocations(workdir)) == 1
+
+
+def test_export_cache(workdir):
+    cache = ExportCache(workdir / 'cache')
+    cube = csg.Root(csg.Cube(1))
+
+    csg.Exporter('a.obj', cache=cache, executable=STUB).export_obj(cube)
+    csg.Exporter('b.obj', cache=cache, executable=STUB).export_obj(csg.Root(csg.Cube(1)))
+    assert len(invocations(workdir)) == 1
+    assert (workdir / 'a.obj').read_bytes() == (workdir / 'b.obj').read_bytes()
+
+    csg.Exporter('c.obj', cache=cache, executable=STUB).export_obj(csg.Root(csg.Cube(2)))
+    csg.Exporter('d.stl', cache=cache, executable=STUB).export(cube, 'stl')
+    assert len(invocations(workdir)) == 3
+
+
+def test_export_cache_eviction(workdir):
+    import os
+
+    cache = ExportCache(workdir / 'cache')
+    entries = []
+    for i in range(2):
+        csg.Exporter(f'{i}.obj', cache=cache, executable=STUB).export_obj(csg.Root(csg.Cube(i + 1)))
+        entries += set((workdir / 'cache').iterdir()) - set(entries)
+        os.utime(entries[-1], (i, i))
+
+    cache.max_size = sum(e.stat().st_size for e in entries)
+    csg.Exporter('2.obj', cache=cache, executable=STUB).export_obj(csg.Root(csg.Cube(3)))
+    assert len(list((workdir / 'cache').iterdir())) == 2
+    assert not entries[0].exists()
+
+    csg.Exporter('again.obj', cache=cache, executable=STUB).export_obj(csg.Root(csg.Cube(2)))
+    assert len(invocations(workdir)) == 3
+    csg.Exporter('again.obj', cache=cache, executable=STUB).export_obj(csg.Root(csg.Cube(1)))
+    assert len(invocations(workdir)) == 4
+
+    # The mesh cache lives in a subdirectory by default.
+    (workdir / 'cache' / 'meshes').mkdir()
+    cache.max_size = 0
+    csg.Exporter('3.obj', cache=cache, executable=STUB).export_obj(csg.Root(csg.Cube(4)))
+    assert list((workdir / 'cache').iterdir()) == [workdir / 'cache' / 'meshes']
+    cache.clear()
+    assert (workdir / 'cache' / 'meshes').is_dir()
+
+
+def test_export_cache_concurrent_writes(workdir):
+    from concurrent.futures import ThreadPoolExecutor
+
+    cache = ExportCache(workdir / 'cache')
+    meshes = [bytes([i]) * (1 << 20) for i in range(8)]
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda mesh: cache.write('key', 'obj', mesh), meshes))
+    assert cache.read('key', 'obj') in meshes
+    assert [e.name for e in (workdir / 'cache').iterdir()] == ['key.obj']
+
+
+def test_export_many(workdir):
+    jobs = [(csg.Root(csg.Cube(i + 1)), f'parts/{i}.obj', 'obj') for i in range(6)]
+    jobs.append((csg.Root(csg.figures.Figure('fail')), 'parts/failed.obj', 'obj'))
+
+    reports = []
+    results = csg.Exporter.export_many(jobs, workers=4, executable=STUB, callbacks=[reports.append],
+                                       profile='draft', profiles={'draft': 0.5})
+
+    assert [r.path.name for r in results] == [f'{i}.obj' for i in range(6)] + ['failed.obj']
+    assert all(r.ok for r in results[:6])
+    assert not results[6].ok
+    assert b'failing on request' in results[6].error.args[1]['stderr']
+    # Failed jobs keep their report, and every report reaches the callbacks.
+    assert results[6].report.error is results[6].error and 'xcsg' in results[6].report.phases
+    assert reports == [r.report for r in results]
+    assert sorted(p.name for p in (workdir / 'parts').iterdir()) == [f'{i}.obj' for i in range(6)]
+    assert not (workdir / 'temp.xcsg').exists()
+
+
+def test_export_async(workdir):
+    import asyncio
+
+    async def export_all():
+        semaphore = asyncio.Semaphore(2)
+        await asyncio.gather(*[
+            csg.Exporter(f'{i}.obj', executable=STUB).export_async(csg.Root(csg.Cube(i + 1)), 'obj', semaphore=semaphore)
+            for i in range(4)])
+
+    asyncio.run(export_all())
+    assert all((workdir / f'{i}.obj').exists() for i in range(4))
+    assert len(invocations(workdir)) == 4
+
+
+def test_export_async_timeout(workdir):
+    import asyncio
+    import time
+
+    exporter = csg.Exporter('slow.obj', executable=STUB)
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(exporter.export_async(csg.Root(csg.figures.Figure('sleep')), 'obj', timeout=0.5))
+    assert time.monotonic() - start < 10
+    assert not (workdir / 'slow.obj').exists()
+    assert not any(p.name.startswith('.pysomo') for p in workdir.iterdir())
+
+
+def test_export_formats(workdir):
+    cache = ExportCache(workdir / 'cache')
+    exporter = csg.Exporter('model.obj', cache=cache, executable=STUB)
+    exporter.export(csg.Root(csg.Cube(1)), 'stl')
+    exporter.export(csg.Root(csg.Cube(1)), formats=['obj', 'stl', 'amf'])
+
+    assert [p.name for p in sorted(workdir.glob('model.*'))] == ['model.amf', 'model.obj', 'model.stl']
+    # The stl mesh comes from the cache, obj and amf from a single run.
+    assert invocations(workdir)[1].split()[:2] == ['--obj', '--amf']
+    assert len(invocations(workdir)) == 2
+
+    with pytest.raises(ValueError):
+        exporter.export(csg.Root(csg.Cube(1)))
+
+
+def test_export_bytes(workdir):
+    exporter = csg.Exporter(executable=STUB)
+    meshes = exporter.export_bytes(csg.Root(csg.Cube(1)), ['obj', 'stl'])
+    assert meshes['obj'].startswith(b'# ')
+    assert len(meshes['stl']) == 84 + 4 * 50
+
+    mapped = exporter.export_bytes(csg.Root(csg.Cube(1)), ['obj'], mmap=True)['obj']
+    assert mapped[:] == meshes['obj']
+    mapped.close()
+    assert len(invocations(workdir)) == 2
+    assert sorted(p.name for p in workdir.iterdir()) == ['xcsg.log']
+
+
+def test_mesh_cache(workdir):
+    from pysomo.cache import MeshCache
+
+    mesh_cache = MeshCache(workdir / 'meshes')
+    bracket = csg.Cube(10).minkowski(csg.Sphere(1)).cached()
+    model = bracket.translate(0, 0, 5) + bracket.translate(20, 0, 0) - csg.Cylinder(1, 50)
+
+    exporter = csg.Exporter('model.obj', executable=STUB, mesh_cache=mesh_cache)
+    spliced = mesh_cache.splice(csg.Root(model), exporter)
+    document = spliced.dump_xcsg()
+    assert '<minkowski3d>' not in document
+    assert document.count('<polyhedron>') == 2
+    assert '<faces><face><fv index="0" /><fv index="2" /><fv index="1" /></face>' in document
+    assert '<trow c0="1" c1="0" c2="0" c3="20" />' in document
+
+    exporter.export_obj(csg.Root(model))
+    csg.Exporter('other.obj', executable=STUB, mesh_cache=MeshCache(workdir / 'meshes')).export_obj(csg.Root(bracket + csg.Cube(1)))
+    # One run for the bracket, then one per model.
+    assert len(invocations(workdir)) == 3
+
+    # The bracket is evaluated again at another resolution or number format.
+    exporter.export(csg.Root(model), 'obj', profile='preview')
+    assert len(invocations(workdir)) == 5
+    exporter.export_obj(csg.Root(model, grid=1e-3))
+    assert len(invocations(workdir)) == 7
+    exporter.export_obj(csg.Root(model, grid=1e-3))
+    assert len(invocations(workdir)) == 8
+
+
+def test_export_report(workdir):
+    reports = []
+    cache = ExportCache(workdir / 'cache')
+    exporter = csg.Exporter('model.obj', cache=cache, executable=STUB, callbacks=[reports.append])
+
+    report = exporter.export(csg.Root(csg.Cube(1) + csg.Sphere(1)), formats=['obj', 'stl'])
+    assert report.ok and reports == [report]
+    assert set(report.phases) == {'serialize', 'cache', 'xcsg', 'place'}
+    assert report.nodes == 3
+    assert report.document_bytes == len(csg.Root(csg.Cube(1) + csg.Sphere(1)).dump_xcsg())
+    assert report.output_bytes['stl'] == (workdir / 'model.stl').stat().st_size
+    assert report.returncode == 0
+    assert b'xcsg stub' in report.stdout
+    assert report.as_dict()['returncode'] == 0
+
+    cached = exporter.export(csg.Root(csg.Cube(1) + csg.Sphere(1)), 'obj')
+    assert cached.cached == ['obj'] and 'xcsg' not in cached.phases
+
+    with pytest.raises(csg.export.ExportError):
+        exporter.export(csg.Root(csg.figures.Figure('fail')), 'obj')
+    assert not reports[-1].ok
+    assert reports[-1].returncode == 1
+    assert b'failing on request' in reports[-1].stderr
+
+
+def test_export_assembly(workdir):
+    pytest.importorskip('numpy')
+    reports = []
+    cache = ExportCache(workdir / 'cache')
+    exporter = csg.Exporter('assembly.obj', cache=cache, executable=STUB, callbacks=[reports.append])
+    wheel = csg.Cylinder(1, 0.2)
+    root = csg.Root.assembly({
+        'frame': csg.Cuboid(4, 2, 0.2),
+        'front': wheel.translate(3.5, 0, 0),
+        'back': wheel.translate(-3.5, 0, 0),
+    })
+    assert root.dump_xcsg() == csg.Root(root.parts['frame'] + root.parts['front'] + root.parts['back']).dump_xcsg()
+
+    report = exporter.export_assembly(root, formats=['obj', 'stl'])
+    assert report.parts == {'frame': 'exported', 'front': 'exported', 'back': 'exported'}
+    assert len(invocations(workdir)) == 3 and reports == [report]
+    merged = csg.Polyhedron.from_obj(str(workdir / 'assembly.obj'))
+    assert len(merged.children[0].vertices) == 3 * 4
+    assert len(merged.children[1].faces) == 3 * 4
+    assert csg.Polyhedron.from_stl(str(workdir / 'assembly.stl'), weld=False).bounds == merged.bounds
+
+    root.set_part('front', wheel.translate(4, 0, 0))
+    report = exporter.export_assembly(root, 'obj')
+    assert report.parts == {'frame': 'reused', 'front': 'exported', 'back': 'reused'}
+    assert len(invocations(workdir)) == 4
+
+    root.remove_part('back')
+    fresh = csg.Exporter('again.obj', cache=cache, executable=STUB).export_assembly(root, 'obj')
+    assert fresh.parts == {'frame': 'cached', 'front': 'cached'}
+    assert len(invocations(workdir)) == 4
+
+    root.set_part('broken', csg.Cube(1).translate(0, 5, 0) - csg.figures.Figure('fail'))
+    with pytest.raises(csg.export.ExportError):
+        exporter.export_assembly(root, 'obj')
+    assert reports[-1].parts == {'frame': 'reused', 'front': 'reused'}
+    root.remove_part('broken')
+
+    # Other models and formats go through a single xcsg run.
+    assert exporter.export_assembly(csg.Root(csg.Cube(1)), 'obj').parts == {}
+    assert exporter.export_assembly(root, 'amf').parts == {}
+    # Parts that overlap are joined by xcsg.
+    root.set_part('front', wheel.translate(2, 0, 0))
+    count = len(invocations(workdir))
+    report = exporter.export_assembly(root, 'obj')
+    assert report.parts == {} and len(invocations(workdir)) == count + 1
+    with pytest.raises(ValueError):
+        csg.Root(csg.Cube(1)).set_part('cube', csg.Cube(2))
+
+
+def test_export_profiles(workdir):
+    documents = []
+
+    class Recorder(csg.Exporter):
+        def _write_source(self, root, destinations, workdir, report):
+            documents.append(root.dump_xcsg())
+            return super()._write_source(root, destinations, workdir, report)
+
+    exporter = Recorder('model.obj', executable=STUB, profiles={'preview': 0.5, 'final': 0.001})
+    root = csg.Root(csg.Sphere(10) + csg.Cylinder(1, 5).resolution(0.01), secant_tolerance=0.05)
+    exporter.export(root, 'obj')
+    exporter.export(root, 'obj', profile='preview')
+    exporter.export_bytes(root, ['stl'], profile='final')
+    assert [d.split('>', 2)[1] for d in documents] == [
+        '\n<xcsg version="1.0" secant_tolerance="0.05"',
+        '\n<xcsg version="1.0" secant_tolerance="0.5"',
+        '\n<xcsg version="1.0" secant_tolerance="0.001"',
+    ]
+    assert all('<cylinder r="1" h="5" center="true" secant_tolerance="0.01" />' in d for d in documents)
+    assert root.secant_tolerance == 0.05
+
+    with pytest.raises(ValueError):
+        exporter.export(root, 'obj', profile='draft')
@@ -0,0 +1,91 @@
+import math
+
+import pytest
+
+import pysomo as csg
+from pysomo.mesh import fast_mesh
+
+numpy = pytest.importorskip('numpy')
+
+
+def volume(mesh):
+    corners = mesh.vertices[mesh.triangles]
+    return numpy.einsum('ij,ij->i', corners[:, 0], numpy.cross(corners[:, 1], corners[:, 2])).sum() / 6
+
+
+def test_primitives():
+    assert volume(fast_mesh(csg.Root(csg.Cuboid(1, 2, 3)))) == pytest.approx(6)
+    assert volume(fast_mesh(csg.Root(csg.Cube(2, center='false')))) == pytest.approx(8)
+    assert volume(fast_mesh(csg.Root(csg.Cylinder(1, 2)), segments=256)) == pytest.approx(2 * math.pi, rel=1e-3)
+    assert volume(fast_mesh(csg.Root(csg.Cone(1, 0, 3)), segments=256)) == pytest.approx(math.pi, rel=1e-3)
+    assert volume(fast_mesh(csg.Root(csg.Sphere(1)), segments=256)) == pytest.approx(4 / 3 * math.pi, rel=1e-3)
+
+    vertices = [(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1)]
+    faces = [(0, 2, 1), (0, 1, 3), (1, 2, 3), (0, 3, 2)]
+    assert volume(fast_mesh(csg.Root(csg.Polyhedron(vertices, faces)))) == pytest.approx(1 / 6)
+
+
+def test_instances():
+    step = csg.Cuboid(1, 0.5, 1, center='false')
+    stairs = csg.union_all(step.translate(0, 0.6 * i, 1.1 * i) for i in range(1000))
+    mirrored = csg.Sphere(1).translate(0, -5, 0).scale(-1, 1, 1)
+    mesh = fast_mesh(csg.Root(stairs + mirrored))
+
+    assert len(mesh.triangles) == 1000 * 12 + len(fast_mesh(csg.Root(csg.Sphere(1))).triangles)
+    assert volume(mesh) == pytest.approx(1000 * 0.5 + volume(fast_mesh(csg.Root(csg.Sphere(1)))))
+    assert mesh.vertices[:, 2].max() == pytest.approx(1.1 * 999 + 1)
+
+
+def test_not_eligible():
+    assert fast_mesh(csg.Root(csg.Cube(1) + csg.Cube(1).translate(0.5, 0, 0))) is None
+    assert fast_mesh(csg.Root(csg.Cube(1) + csg.Cube(1).translate(1, 0, 0))) is None
+    assert fast_mesh(csg.Root(csg.Cube(1) - csg.Sphere(1))) is None
+    assert fast_mesh(csg.Root(csg.Polyhedron([(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1)]))) is None
+
+
+def test_export_fast_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    model = csg.Root(csg.Cube(1) + csg.Sphere(1).translate(5, 0, 0))
+    csg.Exporter('model.obj', executable='missing-xcsg', fast_path=True).export(model, formats=['obj', 'stl'])
+
+    obj = (tmp_path / 'model.obj').read_text().splitlines()
+    assert sum(line.startswith('f ') for line in obj) == 12 + len(fast_mesh(csg.Root(csg.Sphere(1))).triangles)
+    stl = (tmp_path / 'model.stl').read_bytes()
+    assert len(stl) == 84 + 50 * int.from_bytes(stl[80:84], 'little')
+
+    import asyncio
+    report = asyncio.run(
+        csg.Exporter('async.obj', executable='missing-xcsg', fast_path=True).export_async(model, 'obj'))
+    assert report.fast_path
+    assert (tmp_path / 'async.obj').read_text().splitlines() == obj
+
+
+def test_export_fast_path_keeps_cache(tmp_path, monkeypatch):
+    from benchmarks.run import STUB as stub
+    from pysomo.cache import ExportCache
+
+    monkeypatch.chdir(tmp_path)
+    cache = ExportCache(tmp_path / 'cache')
+    model = csg.Root(csg.Cube(1) - csg.Sphere(1))
+    csg.Exporter('model.obj', cache=cache, executable=stub).export_obj(model)
+    entry, = (tmp_path / 'cache').iterdir()
+    cached = entry.read_bytes()
+
+    # The fast path replaces the destination, which is a link to the entry.
+    csg.Exporter('model.obj', cache=cache, executable=stub, fast_path=True).export_obj(csg.Root(csg.Cube(1)))
+    assert entry.read_bytes() == cached
+    assert (tmp_path / 'model.obj').read_bytes() != cached
+    csg.Exporter('parts/cube.obj', executable=stub, fast_path=True).export_obj(csg.Root(csg.Cube(1)))
+    assert (tmp_path / 'parts' / 'cube.obj').exists()
+
+
+def test_resolution():
+    sphere = fast_mesh(csg.Root(csg.Sphere(10)))
+    fine = fast_mesh(csg.Root(csg.Sphere(10), secant_tolerance=0.001))
+    assert len(fine.triangles) > len(sphere.triangles)
+    exact = 4 / 3 * math.pi * 1000
+    assert abs(volume(fine) - exact) < abs(volume(sphere) - exact) / 10
+
+    # The tolerance of a primitive wins over the one of the model.
+    coarse = fast_mesh(csg.Root(csg.Cylinder(1, 1).resolution(1), secant_tolerance=0.001))
+    assert len(coarse.vertices) == 2 * 3 + 2
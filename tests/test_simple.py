@@ -1,6 +1,8 @@
 import inspect
 import math
 
+import pytest
+
 import pysomo as csg
 
 export_enabled = False
@@ -249,3 +251,604 @@ def test_hull3d():
     expected = f'<xcsg version="1.0"><hull3d><cube size="10" center="true" /><sphere r="5">{expected_tmatrix}</sphere></hull3d></xcsg>'
 
     assert_and_export(expected, actual)
+
+
+def test_chained_union_is_flattened():
+    cubes = [csg.Cube(i + 1) for i in range(4)]
+    u = cubes[0]
+    for c in cubes[1:]:
+        u += c
+    actual = csg.Root(u)
+
+    expected_cubes = ''.join([f'<cube size="{i + 1}" center="true" />' for i in range(4)])
+    expected = f'<xcsg version="1.0"><union3d>{expected_cubes}</union3d></xcsg>'
+    assert_and_export(expected, actual)
+
+
+def test_long_chained_union():
+    import time
+
+    cube = csg.Cube(1)
+    start = time.monotonic()
+    u = cube
+    for _ in range(100000):
+        u += cube
+    # Every + extends the operands of the previous union instead of copying
+    # them, so the loop takes linear time.
+    assert time.monotonic() - start < 10
+    assert len(u.children) == 100001 and isinstance(u.children, tuple)
+
+    # Extending a union twice leaves both results intact.
+    pair = csg.Cube(1) + csg.Cube(2)
+    first, second = pair + csg.Cube(3), pair + csg.Cube(4)
+    assert [c.attributes['size'] for c in pair.children] == [1, 2]
+    assert [c.attributes['size'] for c in first.children] == [1, 2, 3]
+    assert [c.attributes['size'] for c in second.children] == [1, 2, 4]
+    assert [c.attributes['size'] for c in (first - csg.Cube(5)).children[0].children] == [1, 2, 3]
+
+
+def test_chained_difference_is_flattened():
+    c = csg.Cube(10)
+    s = csg.Sphere(5)
+    cy = csg.Cylinder(1, 20)
+    actual = csg.Root(c - s - cy)
+
+    expected = '<xcsg version="1.0"><difference3d><cube size="10" center="true" /><sphere r="5" /><cylinder r="1" h="20" center="true" /></difference3d></xcsg>'
+    assert_and_export(expected, actual)
+
+    nested = csg.Root(c - (s - cy))
+    expected = '<difference3d><cube size="10" center="true" /><difference3d><sphere r="5" />'
+    assert_and_export(expected, nested, 'nested')
+
+
+def test_union_all():
+    steps = [csg.Cube(1).translate(0, i, i) for i in range(5000)]
+    u = csg.union_all(steps)
+    assert len(u.children) == 5000
+    assert csg.Root(u).dump_xcsg().count('<cube') == 5000
+
+    balanced = csg.union(*steps[:9], fanout=3)
+    assert len(balanced.children) == 3
+    assert all(len(c.children) == 3 for c in balanced.children)
+
+    shapes = csg.union(csg.Circle(1), csg.Square(1))
+    assert isinstance(shapes, csg.figures.Union2d)
+
+
+def test_composed_transforms():
+    c = csg.Cube(10).translate(1, 2, 3).scale(2, 2, 2).translate(-1, 0, 0)
+    actual = csg.Root(c)
+
+    expected_tmatrix = '<trow c0="2" c1="0" c2="0" c3="1" /><trow c0="0" c1="2" c2="0" c3="4" /><trow c0="0" c1="0" c2="2" c3="6" /><trow c0="0" c1="0" c2="0" c3="1" />'
+    expected = f'<xcsg version="1.0"><cube size="10" center="true"><tmatrix>{expected_tmatrix}</tmatrix></cube></xcsg>'
+    assert_and_export(expected, actual)
+    assert actual.dump_xcsg().count('<tmatrix>') == 1
+
+
+def test_transformed_union_is_not_flattened():
+    u = (csg.Cube(1) + csg.Sphere(1)).translate(1, 0, 0) + csg.Cylinder(1, 1)
+    actual = csg.Root(u)
+
+    expected = '<xcsg version="1.0"><union3d><union3d><cube size="1" center="true" /><sphere r="1" /><tmatrix>'
+    assert_and_export(expected, actual)
+
+
+def test_streamed_xcsg_matches_element_tree():
+    import io
+    import xml.etree.ElementTree as ET
+
+    coin = csg.Circle(30).linear_extrude(2)
+    rim = csg.Circle(30).offset(-5, True).linear_extrude(1)
+    model = coin - rim.translate(0, 0, 1.5) - rim.translate(0, 0, -0.5) + csg.Polyhedron([(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1)]).rotate(z=1)
+    root = csg.Root(model)
+
+    expected = ET.tostring(root.to_xcsg(), encoding='utf8')
+    stream = io.BytesIO()
+    root.write_xcsg(stream)
+    assert stream.getvalue() == expected
+
+
+def test_streamed_xcsg_deep_tree():
+    import io
+
+    solid = csg.Cube(1)
+    for i in range(5000):
+        solid = solid.hull(csg.Sphere(i))
+    stream = io.BytesIO()
+    csg.Root(solid).write_xcsg(stream)
+    assert stream.getvalue().count(b'</hull3d>') == 5000
+
+
+def test_polyhedron_from_buffer():
+    from array import array
+
+    vertices = [(0, 0, 0), (1.5, 0, 0), (0, 1, 0), (0, 0, 1)]
+    flat = array('d', [c for v in vertices for c in v])
+    p = csg.Polyhedron(flat)
+    assert p.children[0].vertices.data is flat
+    assert list(p.children[0].vertices) == vertices
+
+    expected_vertices = ''.join([f'<vertex x="{x}" y="{y}" z="{z}" />' for x, y, z in vertices])
+    expected = f'<xcsg version="1.0"><polyhedron><vertices>{expected_vertices}</vertices></polyhedron></xcsg>'
+    assert_and_export(expected, csg.Root(p))
+    assert_and_export(expected, csg.Root(csg.Polyhedron(memoryview(flat.tobytes()))), 'bytes')
+
+
+def test_polygon_from_numpy():
+    numpy = pytest.importorskip('numpy')
+
+    vertices = numpy.array([(0, 0), (4, 0), (4, 3.5)], dtype=float)
+    p = csg.Polygon(vertices)
+    assert numpy.shares_memory(p.children[0].vertices.data, vertices)
+
+    expected = '<polygon><vertices><vertex x="0" y="0" /><vertex x="4" y="0" /><vertex x="4" y="3.5" /></vertices></polygon>'
+    assert_and_export(expected, csg.Root(p))
+
+
+def test_polyhedron_faces():
+    import io
+    import xml.etree.ElementTree as ET
+    from array import array
+
+    vertices = [(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1)]
+    faces = [(0, 2, 1), (0, 1, 3), (1, 2, 3), (0, 3, 2)]
+    p = csg.Polyhedron(vertices, faces)
+    actual = csg.Root(p)
+
+    expected_faces = ''.join(['<face>' + ''.join(f'<fv index="{i}" />' for i in f) + '</face>' for f in faces])
+    expected = f'</vertices><faces>{expected_faces}</faces></polyhedron>'
+    assert_and_export(expected, actual)
+
+    flat = array('q', [i for f in faces for i in f])
+    assert csg.Polyhedron(vertices, flat).children[1].faces.indices is flat
+    assert_and_export(expected, csg.Root(csg.Polyhedron(vertices, flat)), 'flat')
+
+    stream = io.BytesIO()
+    actual.write_xcsg(stream)
+    assert stream.getvalue() == ET.tostring(actual.to_xcsg(), encoding='utf8')
+
+    for invalid in ([(0, 1, 4)], [(0, 1, -1)]):
+        with pytest.raises(ValueError):
+            csg.Polyhedron(vertices, invalid)
+
+
+def test_polyhedron_faces_with_offsets():
+    vertices = [(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (0.5, 0.5, 1)]
+    indices = [0, 1, 2, 3, 0, 1, 4, 1, 2, 4, 2, 3, 4, 3, 0, 4]
+    p = csg.Polyhedron(vertices, indices, offsets=[0, 4, 7, 10, 13])
+
+    faces = list(p.children[1].faces)
+    assert faces == [(0, 1, 2, 3), (0, 1, 4), (1, 2, 4), (2, 3, 4), (3, 0, 4)]
+    assert list(csg.Polyhedron(vertices, faces).children[1].faces) == faces
+
+    expected = '<faces><face><fv index="0" /><fv index="1" /><fv index="2" /><fv index="3" /></face><face><fv index="0" />'
+    assert_and_export(expected, csg.Root(p))
+
+
+def test_polyhedron_faces_from_numpy():
+    numpy = pytest.importorskip('numpy')
+
+    vertices = numpy.zeros((4, 3))
+    faces = numpy.array([(0, 2, 1), (0, 1, 3), (1, 2, 3), (0, 3, 2)], dtype=numpy.int64)
+    p = csg.Polyhedron(vertices, faces)
+    assert numpy.shares_memory(p.children[1].faces.indices, faces)
+    assert len(p.children[1].faces) == 4
+
+    with pytest.raises(ValueError):
+        csg.Polyhedron(vertices, faces + 1)
+
+
+def test_structural_equality():
+    a = csg.Cube(10).translate(1, 2, 3) - csg.Sphere(4)
+    b = csg.Cube(10).translate(1, 2, 3) - csg.Sphere(4)
+    c = csg.Cube(10).translate(1, 2, 4) - csg.Sphere(4)
+    assert a is not b
+    assert a == b and hash(a) == hash(b)
+    assert a != c
+    assert len({a, b, c}) == 2
+
+    p = csg.Polyhedron([(0, 0, 0), (1, 0, 0), (0, 1, 0)])
+    q = csg.Polyhedron([(0, 0, 0), (1, 0, 0), (0, 1, 1)])
+    assert p == csg.Polyhedron([(0, 0, 0), (1, 0, 0), (0, 1, 0)])
+    assert p != q
+
+
+def test_dedupe():
+    bolts = [(csg.Cylinder(1, 10) + csg.Cylinder(2, 1)).translate(i, 0, 0) for i in range(3)]
+    panel = csg.Cuboid(10, 10, 1) - bolts[0] - bolts[1] - bolts[2]
+    root = csg.Root(panel + panel.translate(0, 0, 5))
+    before = root.dump_xcsg()
+    other = csg.Root(panel)
+    children = panel.children
+
+    report = root.dedupe()
+    assert root.dump_xcsg() == before
+    # The three bolts share their two cylinders, and the second panel shares
+    # its children with the first one.
+    assert report.duplicates == 4 + 4
+    assert report.nodes == 23
+    assert report.unique == 9
+    assert root.children[0].children[1].children[1] is panel.children[1]
+    # The figures, and the other models sharing them, are left untouched.
+    assert panel.children is children
+    assert panel.children[2].children[0] is not panel.children[1].children[0]
+    assert other.children[0] is panel
+
+    # The cache mark is part of the identity of a subtree.
+    hub = csg.Cylinder(1, 10) + csg.Cylinder(2, 1)
+    root = csg.Root(csg.figures.Union3d(hub, hub.cached(), flatten=False))
+    # Only the cylinders, reached through both hubs, are shared.
+    assert root.dedupe().duplicates == 2
+    assert not root.children[0].children[0].cacheable and root.children[0].children[1].cacheable
+
+
+def test_slotted_figures():
+    solid = (csg.Cube(1) + csg.Sphere(1)).translate(1, 2, 3).rotate(z=0.5)
+    polygon = csg.Polygon([(0, 0), (1, 0), (0, 1)])
+    for figure in (solid, solid.children[0], polygon, polygon.children[0]):
+        assert not hasattr(figure, '__dict__')
+
+    assert isinstance(solid.children, tuple)
+    assert len(solid.matrix) == 16
+    assert solid.children[0].attributes == {'size': 1, 'center': 'true'}
+    with pytest.raises(TypeError):
+        solid.children[0].attributes['size'] = 2
+
+    moved = solid.translate(1, 0, 0)
+    assert moved.children is solid.children
+    assert moved.cacheable is False and solid.cached().cacheable is True
+    assert solid.cached() != solid
+
+    # Operations marked for the mesh cache are not merged into their parent.
+    hub = (csg.Cylinder(1, 10) + csg.Cylinder(2, 1)).cached()
+    assert len((hub + csg.Cube(1)).children) == 2
+    assert len((hub - csg.Cube(1)).children) == 2
+
+
+def test_bounds():
+    assert csg.Cube(2).bounds == ((-1, -1, -1), (1, 1, 1))
+    assert csg.Cube(2, center='false').bounds == ((0, 0, 0), (2, 2, 2))
+    assert csg.Cylinder(1, 4, center='false').bounds == ((-1, -1, 0), (1, 1, 4))
+    assert csg.Circle(2).linear_extrude(3).bounds == ((-2, -2, 0), (2, 2, 3))
+    assert csg.Polyhedron([(0, 0, 0), (1, 2, 3), (-1, 0, 5)]).bounds == ((-1, 0, 0), (1, 2, 5))
+    assert csg.Sphere(1).translate(10, 0, 0).scale(2, 1, 1).bounds == ((18, -1, -1), (22, 1, 1))
+    assert csg.Cube(2).rotate(z=math.pi / 4).bounds.max[0] == pytest.approx(math.sqrt(2))
+    assert (csg.Cube(2) + csg.Sphere(1).translate(5, 0, 0)).bounds == ((-1, -1, -1), (6, 1, 1))
+    assert (csg.Cube(2) - csg.Sphere(5)).bounds == ((-1, -1, -1), (1, 1, 1))
+    assert (csg.Cube(2) & csg.Sphere(1).translate(5, 0, 0)).bounds.empty
+    assert csg.Cube(2).minkowski(csg.Sphere(1)).bounds == ((-2, -2, -2), (2, 2, 2))
+    assert csg.Circle(1).sweep(csg.figures.Figure('spline_path')).bounds is None
+
+
+def test_simplify():
+    plate = csg.Cuboid(10, 10, 1)
+    holes = [csg.Cylinder(1, 2).translate(x, 0, 0) for x in (0, 3, 20, 30)]
+    empty = csg.Cube(1) & csg.Cube(1).translate(5, 0, 0)
+    far = csg.Sphere(1).translate(0, 50, 0)
+    root = csg.Root((plate - holes[0] - holes[1] - holes[2] - holes[3]) + empty + far)
+
+    report = root.simplify()
+    assert report.dropped_subtrahends == 2
+    assert report.empty_intersections == 1
+    assert len(report.disjoint_unions) == 1
+    assert not report.empty
+
+    expected = '<union3d><difference3d><cuboid dx="10" dy="10" dz="1" center="true" /><cylinder r="1" h="2" center="true"><tmatrix>'
+    assert_and_export(expected, root)
+    document = root.dump_xcsg()
+    assert document.count('<cylinder') == 2
+    assert '<intersection3d>' not in document
+
+    everything = csg.Root(csg.Cube(1) - csg.Cube(5).translate(20, 0, 0))
+    assert everything.simplify().dropped_subtrahends == 1
+    assert_and_export('<xcsg version="1.0"><cube size="1" center="true" /></xcsg>', everything, 'lifted')
+
+    # Shapes are flat in z, which does not make them disjoint.
+    washer = csg.Root(csg.Square(10) - csg.Circle(2) - csg.Circle(1).translate(20, 0))
+    report = washer.simplify()
+    assert report.dropped_subtrahends == 1
+    assert '<difference2d><square size="10" center="true" /><circle r="2" />' in washer.dump_xcsg()
+    overlapping = csg.Root(csg.Square(10) + csg.Circle(2)).simplify()
+    assert overlapping.disjoint_unions == []
+    apart = csg.Root(csg.Square(1) + csg.Circle(2).translate(20, 0)).simplify()
+    assert len(apart.disjoint_unions) == 1
+
+    # The sharp corners of an offset that is not round reach past delta.
+    blade = csg.Polygon([(0, 0), (10, 0), (0, 1)])
+    hole = csg.Circle(0.2).translate(11.6, 0)
+    assert csg.Root(blade.offset(1, False) - hole).simplify().dropped_subtrahends == 0
+    assert csg.Root(blade.offset(1, True) - hole).simplify().dropped_subtrahends == 1
+
+
+def test_load_xcsg(tmp_path):
+    import io
+
+    profile = csg.Polygon([(0, 0), (2, 0), (1, 1.5)]).offset(0.5, True).linear_extrude(3)
+    tetrahedron = csg.Polyhedron([(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1)], [(0, 2, 1), (0, 1, 3), (0, 3, 2), (1, 2, 3)])
+    pyramid = csg.Polyhedron([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (0.5, 0.5, 1)],
+                             [(0, 3, 2, 1), (0, 1, 4), (1, 2, 4), (2, 3, 4), (3, 0, 4)])
+    model = (profile - csg.Cylinder(0.25, 10).rotate(x=0.5) + tetrahedron.scale(2, 2, 2) + pyramid.translate(5, 0, 0))
+    document = csg.Root(model).dump_xcsg()
+
+    root = csg.load_xcsg(io.BytesIO(document.encode('utf8')))
+    assert root.dump_xcsg() == document
+    assert root.children[0] == model
+    loaded = root.children[0]
+    assert isinstance(loaded, csg.figures.Union3d)
+    assert isinstance(loaded.children[0].children[0], csg.figures.LinearExtrude)
+    assert loaded.children[0].children[0].attributes == {'dz': 3}
+    assert loaded.children[1].children[0].vertices.data.typecode == 'd'
+    assert loaded.children[1].children[1].faces.arity == 3
+    assert loaded.children[2].children[1].faces.arity is None
+
+    path = tmp_path / 'model.xcsg'
+    path.write_text(document)
+    assert csg.load_xcsg(str(path)).dump_xcsg() == document
+
+    with pytest.raises(ValueError):
+        csg.load_xcsg(io.BytesIO(b'<svg />'))
+
+    rows = '<trow c0="{}" c1="{}" c2="{}" c3="{}" />' * 4
+    scale = '<tmatrix>' + rows.format(2, 0, 0, 0, 0, 2, 0, 0, 0, 0, 2, 0, 0, 0, 0, 1) + '</tmatrix>'
+    shift = '<tmatrix>' + rows.format(1, 0, 0, 1, 0, 1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1) + '</tmatrix>'
+    stacked = '<xcsg version="1.0"><cube size="1" center="true">' + scale + shift + '</cube></xcsg>'
+    cube = csg.load_xcsg(io.BytesIO(stacked.encode('utf8'))).children[0]
+    assert cube == csg.Cube(1).scale(2, 2, 2).translate(1, 0, 0)
+
+
+def test_binary_snapshot(tmp_path):
+    bolt = csg.Cylinder(1, 10) + csg.Cone(2, 1, 1.5, center='false')
+    tetrahedron = csg.Polyhedron([(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1)], [(0, 2, 1), (0, 1, 3), (0, 3, 2), (1, 2, 3)])
+    quads = csg.Polyhedron([(0, 0, 0)] * 4, [(0, 1, 2, 3)])
+    profile = csg.Polygon([(0, 0), (2, 0), (1, 1.5)]).offset(0.5, True).linear_extrude(3.0)
+    model = csg.Cuboid(10, 10, 1) - bolt.translate(2, 2, 0) - bolt.translate(-2, 2, 0) + tetrahedron.cached() + quads + profile
+    root = csg.Root(model)
+    path = tmp_path / 'model.pysomo'
+    root.save_binary(path)
+
+    loaded = csg.load_binary(path)
+    assert loaded.dump_xcsg() == root.dump_xcsg()
+    assert loaded.children[0] == model
+    # Shared subtrees are stored once.
+    difference = loaded.children[0].children[0]
+    assert difference.children[1].children[0] is difference.children[2].children[0]
+    polyhedron = loaded.children[0].children[1]
+    assert polyhedron.cacheable
+    assert isinstance(polyhedron.children[0].vertices.data, memoryview)
+
+    # The resolution and number format of the model are kept.
+    root = csg.Root(model, precision=4, grid=0.01, secant_tolerance=0.002)
+    root.save_binary(path)
+    loaded = csg.load_binary(path)
+    assert loaded.dump_xcsg() == root.dump_xcsg()
+    assert loaded.secant_tolerance == 0.002 and loaded.numbers.precision == 4 and loaded.numbers.grid == 0.01
+
+    path.write_bytes(b'<xcsg />')
+    with pytest.raises(ValueError):
+        csg.load_binary(path)
+
+
+def test_number_format():
+    import io
+    import xml.etree.ElementTree as ET
+
+    riser = 0.0254 * 7.5
+    model = csg.Cuboid(1.0, riser, 2.5).translate(0, riser * 3, 0) + csg.Polyhedron([(0.1 * 3, 1.0, 2 / 3), (1, 0, 0), (0, 1, 0)])
+    assert 'dx="1"' in csg.Root(model).dump_xcsg()
+    assert f'dy="{riser!r}"' in csg.Root(model).dump_xcsg()
+
+    root = csg.Root(model, precision=6)
+    document = root.dump_xcsg()
+    assert 'dy="0.1905"' in document
+    assert 'c3="0.5715"' in document
+    assert '<vertex x="0.3" y="1" z="0.666667" />' in document
+
+    snapped = csg.Root(model, grid=0.001).dump_xcsg()
+    assert 'dy="0.19"' in snapped
+    assert '<vertex x="0.3" y="1" z="0.667" />' in snapped
+
+    for r in (root, csg.Root(model, grid=0.25)):
+        stream = io.BytesIO()
+        r.write_xcsg(stream)
+        assert stream.getvalue() == ET.tostring(r.to_xcsg(), encoding='utf8')
+
+    # Only lengths are snapped: rotations and scales keep their value.
+    turned = csg.Cube(1).scale(1.05, 1, 1).rotate(z=0.4).translate(0.26, 0, 0)
+    coarse = csg.Root(turned + csg.Cube(1).pattern([turned.matrix]) + turned.translate(0, 0, 1), grid=0.1)
+    document = coarse.dump_xcsg()
+    assert document.count(f'c0="{1.05 * math.cos(0.4)!r}"') == 3
+    assert document.count('c3="0.3"') == 3
+    assert document.count(f'c0="{math.cos(0.4)!r}"') == 0
+    stream = io.BytesIO()
+    coarse.write_xcsg(stream)
+    assert stream.getvalue() == ET.tostring(coarse.to_xcsg(), encoding='utf8')
+    assert csg.load_xcsg(io.BytesIO(stream.getvalue())).children[0].children[0].matrix[0] != 1
+    assert 'angle="0.4"' in csg.Root(csg.Circle(1).translate(2, 0).rotate_extrude(0.4, 0), grid=1).dump_xcsg()
+
+    with pytest.raises(ValueError):
+        csg.Root(model, grid=0)
+
+
+def test_patterns(tmp_path):
+    import io
+    import xml.etree.ElementTree as ET
+
+    bolt = (csg.Cylinder(1, 10) + csg.Sphere(1.5)).rotate(x=0.5)
+    row = bolt.linear_array(5, 3, 0, 1)
+    expected = csg.union_all(bolt.translate(3 * i, 0, i) for i in range(5))
+    assert csg.Root(row).dump_xcsg() == csg.Root(expected).dump_xcsg()
+    assert row.bounds.min == pytest.approx(expected.bounds.min)
+    assert row.bounds.max == pytest.approx(expected.bounds.max)
+    assert len(row) == 5 and row.base.matrix is None
+
+    grid = csg.Cube(1).grid_array(4, 3, 2, 2, nz=2, dz=5)
+    assert len(grid) == 24
+    assert grid.bounds == ((-0.5, -0.5, -0.5), (6.5, 4.5, 5.5))
+
+    wheel = csg.Cuboid(1, 0.2, 0.2).translate(5, 0, 0).polar_array(8).translate(0, 0, 1)
+    document = csg.Root(wheel).dump_xcsg()
+    assert document.count('<cuboid') == 8
+    assert wheel.bounds.max[0] == pytest.approx(5.5)
+    stream = io.BytesIO()
+    csg.Root(wheel).write_xcsg(stream)
+    assert stream.getvalue() == ET.tostring(csg.Root(wheel).to_xcsg(), encoding='utf8')
+    path = tmp_path / 'wheel.bin'
+    csg.Root(wheel).save_binary(str(path))
+    assert csg.load_binary(str(path)).children == [wheel]
+
+    numpy = pytest.importorskip('numpy')
+    transforms = numpy.tile(numpy.eye(4), (3, 1, 1))
+    transforms[:, 0, 3] = [0, 10, 20]
+    patterned = csg.Sphere(1).pattern(transforms)
+    assert patterned == csg.Sphere(1).linear_array(3, 10)
+    assert patterned != csg.Sphere(1).linear_array(3, 11)
+
+    with pytest.raises(ValueError):
+        csg.Cube(1).pattern([(1, 0, 0)])
+    with pytest.raises(ValueError):
+        csg.Cube(1).polar_array(0)
+
+
+@pytest.mark.parametrize('bulk', [True, False])
+def test_mesh_import(tmp_path, monkeypatch, bulk):
+    import struct
+    from pysomo import meshio
+
+    if not bulk:
+        monkeypatch.setattr(meshio, 'numpy', None)
+    triangles = [
+        ((0, 0, 0), (1, 0, 0), (0, 1, 0)),
+        ((1, 0, 0), (1, 1, 0), (0, 1, 0)),
+        ((0, 0, 0), (0, 1, 0), (-0.0, 0, 1)),
+    ]
+    vertices = [(0, 0, 0), (1, 0, 0), (0, 1, 0), (1, 1, 0), (0, 0, 1)]
+    expected = csg.Polyhedron(vertices, [(0, 1, 2), (1, 3, 2), (0, 2, 4)])
+
+    binary = tmp_path / 'mesh.stl'
+    records = b''.join(struct.pack('<12x9f2x', *(c for v in t for c in v)) for t in triangles)
+    binary.write_bytes(b'solid made by a binary exporter'.ljust(80) + struct.pack('<I', 3) + records)
+    assert csg.Polyhedron.from_stl(str(binary)) == expected
+    unwelded = csg.Polyhedron.from_stl(str(binary), weld=False)
+    assert len(unwelded.children[0].vertices) == 9
+    assert unwelded.bounds == expected.bounds
+
+    ascii = tmp_path / 'ascii.stl'
+    ascii.write_text('solid test\n' + ''.join(
+        'facet normal 0 0 1\n  outer loop\n' + ''.join(f'    vertex {x} {y} {z}\n' for x, y, z in t) +
+        '  endloop\nendfacet\n' for t in triangles) + 'endsolid test\n')
+    assert csg.Polyhedron.from_stl(str(ascii)) == expected
+
+    obj = tmp_path / 'mesh.obj'
+    obj.write_text('# quad and triangle\n' + ''.join(f'v {x} {y} {z}\n' for x, y, z in vertices) +
+                   'vt 0 0\nf 1/1 2/1 4/1 3/1\nf 1//1 3//1 5//1\n')
+    quad = csg.Polyhedron.from_obj(str(obj))
+    assert list(quad.children[1].faces) == [(0, 1, 3, 2), (0, 2, 4)]
+    obj.write_text('v 0 0 0\nv 1 0 0\nv 0 1 0\nf -3 -2 -1\nv 0 0 1\nv 0 0 0\nf 1 3 -2\n')
+    relative = csg.Polyhedron.from_obj(str(obj), weld=True)
+    assert list(relative.children[1].faces) == [(0, 1, 2), (0, 2, 3)]
+    assert len(relative.children[0].vertices) == 4
+
+    obj.write_text('v 0 0 0\nv 1 0 0\nv 0 1 0\nf 0 1 2\n')
+    with pytest.raises(ValueError):
+        csg.Polyhedron.from_obj(str(obj))
+
+    empty = tmp_path / 'empty.stl'
+    empty.write_bytes(b'')
+    with pytest.raises(ValueError):
+        csg.Polyhedron.from_stl(str(empty))
+
+
+def test_stats():
+    bolt = csg.Cylinder(1, 10).translate(0, 0, 1)
+    model = (csg.Cube(5) - bolt - bolt.translate(2, 0, 0)).translate(1, 0, 0)
+    stats = csg.Root(model + csg.Polyhedron([(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1)], [(0, 1, 2)])).stats()
+    assert stats.types == {
+        'cube': 1, 'cylinder': 2, 'difference3d': 1, 'vertices': 1, 'faces': 1, 'polyhedron': 1, 'union3d': 1}
+    assert stats.nodes == 8
+    assert stats.depth == 3
+    assert (stats.vertices, stats.faces) == (4, 1)
+    assert (stats.transforms, stats.transform_depth) == (3, 2)
+    assert stats.warnings == []
+
+    # Patterns and shared subtrees count once per instance.
+    grid = csg.Root(csg.Sphere(1).grid_array(10, 10, 3, 3).translate(0, 0, 1)).stats()
+    assert grid.types == {'union3d': 1, 'sphere': 100}
+    assert (grid.transforms, grid.transform_depth) == (101, 2)
+    assert grid.cost == 100 * csg.stats.PRIMITIVE_VERTICES['sphere'] * 2
+
+    hull = csg.Root(csg.Sphere(1).hull(csg.Sphere(1).translate(5, 0, 0))).stats()
+    union = csg.Root(csg.Sphere(1) + csg.Sphere(1).translate(5, 0, 0)).stats()
+    assert hull.cost > union.cost
+
+    scan = csg.Polyhedron([(i, i % 7, i % 11) for i in range(2000)])
+    assert 'minkowski3d' in csg.Root(scan.minkowski(scan)).stats().warnings[0]
+
+    deep = csg.Cube(1)
+    for i in range(csg.stats.MAX_DEPTH):
+        deep = deep.translate(1, 0, 0) + csg.Sphere(1)
+    deep = csg.Root(deep).stats()
+    assert deep.depth == csg.stats.MAX_DEPTH + 1
+    assert 'levels deep' in deep.warnings[0]
+
+
+def test_resolution():
+    import io
+    import xml.etree.ElementTree as ET
+
+    sphere = csg.Sphere(2).translate(1, 0, 0).resolution(0.01)
+    assert sphere.attributes['secant_tolerance'] == 0.01
+    assert sphere != csg.Sphere(2).translate(1, 0, 0)
+    assert sphere.resolution(0.1) == csg.Sphere(2).translate(1, 0, 0).resolution(0.1)
+    assert csg.Circle(1).resolution(0.05).attributes['secant_tolerance'] == 0.05
+    with pytest.raises(ValueError):
+        csg.Cube(1).resolution(0.01)
+    with pytest.raises(ValueError):
+        csg.Sphere(1).resolution(0)
+
+    root = csg.Root(sphere + csg.Cylinder(1, 2), grid=0.1, secant_tolerance=0.002)
+    document = root.dump_xcsg()
+    assert '<xcsg version="1.0" secant_tolerance="0.002">' in document
+    assert '<sphere r="2" secant_tolerance="0.01">' in document
+    assert ET.tostring(root.to_xcsg(), encoding='unicode') in document
+    assert csg.load_xcsg(io.BytesIO(document.encode('utf8'))).secant_tolerance == 0.002
+
+    coarse = root.with_secant_tolerance(0.5)
+    assert coarse.children is root.children
+    assert '<xcsg version="1.0" secant_tolerance="0.5">' in coarse.dump_xcsg()
+    assert 'secant_tolerance' not in csg.Root(csg.Sphere(1)).dump_xcsg()
+
+
+@pytest.mark.parametrize('vectorized', [True, False])
+def test_bake_transforms(monkeypatch, vectorized):
+    from pysomo import bake
+
+    if not vectorized:
+        monkeypatch.setattr(bake, 'numpy', None)
+    vertices = [(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1)]
+    faces = [(0, 2, 1), (0, 1, 3), (1, 2, 3), (0, 3, 2)]
+    tetrahedron = csg.Polyhedron(vertices, faces)
+    placed = tetrahedron.rotate(z=math.pi / 2).translate(5, 0, 0)
+    mirrored = tetrahedron.scale(-2, 1, 1)
+    triangle = csg.Polygon([(0, 0), (1, 0), (0, 1)])
+    model = (placed + mirrored + tetrahedron.cached().translate(0, 9, 0)
+             + triangle.scale(-1, 1).translate(0, 3).linear_extrude(1)
+             + triangle._transform(csg.figures._rotation_x(0.5)).linear_extrude(2)
+             + csg.Polyhedron(vertices).translate(0, 0, 7) + tetrahedron.linear_array(3, 2))
+    root = csg.Root(model)
+    bounds = root.children[0].bounds
+    report = root.bake_transforms()
+    assert report == (4, 15, 2)
+    assert root.children[0].bounds.min == pytest.approx(bounds.min)
+    assert root.children[0].bounds.max == pytest.approx(bounds.max)
+
+    document = root.dump_xcsg()
+    # The cached tetrahedron, the tilted triangle and the 3 instances of the
+    # pattern keep their tmatrix.
+    assert document.count('<tmatrix>') == 5
+    baked = root.children[0].children
+    assert baked[0].matrix is None
+    assert list(baked[0].children[0].vertices.data) == pytest.approx([5, 0, 0, 5, 1, 0, 4, 0, 0, 5, 0, 1])
+    assert list(baked[1].children[0].vertices)[1] == (-2, 0, 0)
+    assert list(baked[1].children[1].faces) == [f[::-1] for f in faces]
+    assert list(baked[3].children[0].children[0].vertices) == [(0, 4), (-1, 3), (0, 3)]
+    assert list(baked[5].children[0].vertices)[0] == (0, 0, 7)